@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Normalization Benchmark
+Measures each utils stage and the full normalize_post on synthetic corpora
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from normalize import STAGES, normalize_post
+from utils import corpus
+from utils.document import Document
+
+RESULTS_DIR = Path(__file__).parent.parent / 'logs' / 'benchmarks'
+
+
+def parse_mix(value):
+    """Parse 'captions=0.5,iframes=0.2' into a mix dict based on the default mix"""
+    mix = dict(corpus.DEFAULT_MIX)
+    if value:
+        for item in value.split(','):
+            feature, _, probability = item.partition('=')
+            if feature not in mix:
+                raise argparse.ArgumentTypeError(f"Unknown feature '{feature}' (known: {', '.join(mix)})")
+            mix[feature] = float(probability)
+    return mix
+
+
+def git_commit():
+    """Short hash of the current commit (with '+' if the tree is dirty), or 'unknown'"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('+' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_stages(count, seed, size, mix):
+    """
+    Time each stage over an in-memory corpus
+
+    Stages run in pipeline order on each post, so every stage sees the
+    output of the previous one, as in normalize_post.
+
+    Returns:
+        tuple: (stage_seconds_dict, total_bytes)
+    """
+    seconds = {'parse': 0.0}
+    seconds.update({key: 0.0 for key, _, _, _ in STAGES})
+    total_bytes = 0
+
+    for filename, content in corpus.iter_corpus(count, seed, size, mix):
+        total_bytes += len(content.encode('utf-8'))
+        filepath = Path('/nonexistent') / filename
+
+        started = time.perf_counter()
+        doc = Document.parse(content)
+        seconds['parse'] += time.perf_counter() - started
+
+        for key, _, _, module in STAGES:
+            started = time.perf_counter()
+            if key == 'images':
+                doc, _ = module.normalize(doc, filepath)
+            else:
+                doc, _ = module.normalize(doc)
+            seconds[key] += time.perf_counter() - started
+
+    return seconds, total_bytes
+
+
+def bench_pipeline(count, seed, size, mix):
+    """
+    Time normalize_post over an on-disk corpus (dry run, no cache, no output)
+
+    Returns:
+        float: Wall time in seconds
+    """
+    config = {key: True for key, _, _, _ in STAGES}
+    config['dry_run'] = True
+
+    with tempfile.TemporaryDirectory(prefix='normalize-bench-') as tmp:
+        corpus.write_corpus(Path(tmp), count, seed, size, mix)
+        paths = sorted(Path(tmp).glob('*.md'))
+
+        started = time.perf_counter()
+        for path in paths:
+            normalize_post(path, config, log=lambda line: None)
+        return time.perf_counter() - started
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'post_size': args.post_size,
+        'mix': mix,
+        'repeat': args.repeat,
+        'runs': [],
+    }
+
+    for count in sizes:
+        print(f"📊 {count} posts (best of {args.repeat})")
+
+        best_stages, best_pipeline, total_bytes = None, None, 0
+        for _ in range(args.repeat):
+            stage_seconds, total_bytes = bench_stages(count, args.seed, args.post_size, mix)
+            if best_stages is None:
+                best_stages = stage_seconds
+            else:
+                best_stages = {key: min(value, stage_seconds[key]) for key, value in best_stages.items()}
+
+            if not args.stages_only:
+                pipeline = bench_pipeline(count, args.seed, args.post_size, mix)
+                best_pipeline = pipeline if best_pipeline is None else min(best_pipeline, pipeline)
+
+        for key, value in best_stages.items():
+            print(f"   {key:<18} {value:>9.3f} s  {value / count * 1e6:>9.1f} µs/post")
+        if best_pipeline is not None:
+            print(f"   {'normalize_post':<18} {best_pipeline:>9.3f} s  {count / best_pipeline:>9.1f} posts/s")
+        print()
+
+        report['runs'].append({
+            'posts': count,
+            'bytes': total_bytes,
+            'stages': best_stages,
+            'pipeline_seconds': best_pipeline,
+        })
+
+    results_dir = Path(args.results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    out_path = results_dir / f"{stamp}-{report['commit'].replace('+', '-dirty')}.json"
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"📝 Results saved to: {out_path}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, 'r', encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    print(f"Baseline:  {baseline['commit']} ({baseline['timestamp']})")
+    print(f"Candidate: {candidate['commit']} ({candidate['timestamp']})\n")
+
+    regressions = 0
+    baseline_runs = {run_data['posts']: run_data for run_data in baseline['runs']}
+
+    for run_data in candidate['runs']:
+        old = baseline_runs.get(run_data['posts'])
+        if not old:
+            continue
+
+        print(f"📊 {run_data['posts']} posts")
+        rows = list(run_data['stages'].items()) + [('normalize_post', run_data['pipeline_seconds'])]
+        old_values = dict(old['stages'], normalize_post=old['pipeline_seconds'])
+
+        for key, new_value in rows:
+            old_value = old_values.get(key)
+            if not old_value or new_value is None:
+                continue
+            delta = (new_value - old_value) / old_value * 100
+            flag = ''
+            if delta > args.threshold:
+                flag = '  ⚠ regression'
+                regressions += 1
+            elif delta < -args.threshold:
+                flag = '  ✓ faster'
+            print(f"   {key:<18} {old_value:>9.3f} s → {new_value:>9.3f} s  {delta:>+7.1f}%{flag}")
+        print()
+
+    if regressions:
+        print(f"⚠️  {regressions} timing(s) regressed by more than {args.threshold:.0f}%")
+        return 1
+
+    print("✓ No regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the normalization stages on synthetic WordPress corpora',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Benchmark 1k and 10k posts, results saved under _migration/logs/benchmarks/
+  python benchmark.py run --sizes 1000,10000
+
+  # Heavier posts with more embeds
+  python benchmark.py run --post-size 20000 --mix iframes=0.9,tweets=0.5
+
+  # Write a corpus to disk to use with normalize.py
+  python benchmark.py generate /tmp/corpus --count 1000
+
+  # Compare two saved runs (exit code 1 on regression)
+  python benchmark.py compare old.json new.json --threshold 10
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark and save results')
+    run_parser.add_argument('--sizes', default='1000', help='Comma-separated corpus sizes (default: 1000)')
+    run_parser.add_argument('--repeat', type=int, default=1, help='Keep the best of N runs (default: 1)')
+    run_parser.add_argument('--stages-only', action='store_true', help='Skip the on-disk normalize_post run')
+    run_parser.add_argument('--results-dir', default=str(RESULTS_DIR), help='Where result JSON files are saved')
+
+    generate_parser = subparsers.add_parser('generate', help='Write a synthetic corpus to a directory')
+    generate_parser.add_argument('output', help='Output directory')
+    generate_parser.add_argument('--count', type=int, default=1000, help='Number of posts (default: 1000)')
+
+    for sub in (run_parser, generate_parser):
+        sub.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        sub.add_argument('--post-size', type=int, default=4000, help='Approximate body size in characters (default: 4000)')
+        sub.add_argument('--mix', help='Feature probabilities, e.g. captions=0.5,iframes=0.2')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two saved results')
+    compare_parser.add_argument('baseline', help='Baseline results JSON')
+    compare_parser.add_argument('candidate', help='Candidate results JSON')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent (default: 10)')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'compare':
+        return compare(args)
+
+    total = corpus.write_corpus(Path(args.output), args.count, args.seed, args.post_size, parse_mix(args.mix))
+    print(f"✓ Wrote {args.count} posts ({total / (1024 * 1024):.1f} MB) to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
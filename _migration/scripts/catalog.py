@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Frontmatter Catalog
+Builds a SQLite index of post frontmatter and answers corpus-wide questions
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import discovery
+from utils.catalog import Catalog, COLUMNS
+
+DEFAULT_DB = Path(__file__).parent.parent / 'logs' / 'frontmatter_catalog.sqlite'
+
+
+def print_rows(rows, as_json=False):
+    """Print query rows as tab-separated text or one JSON object per line"""
+    for row in rows:
+        if as_json:
+            print(json.dumps(dict(row), ensure_ascii=False))
+        else:
+            print('\t'.join('' if value is None else str(value) for value in row))
+
+
+def build(catalog, args):
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"❌ Error: {input_path} does not exist")
+        return 1
+
+    started = time.perf_counter()
+    if input_path.is_file():
+        counts = catalog.update([input_path])
+    else:
+        files = discovery.iter_markdown_files(
+            input_path,
+            recursive=not args.no_recursive,
+            include=args.include,
+            exclude=args.exclude,
+            exclude_generated=not args.generated
+        )
+        counts = catalog.update(files, prune_under=input_path)
+    elapsed = time.perf_counter() - started
+
+    print(f"✓ Catalog updated in {elapsed:.2f}s: {catalog.db_path}")
+    print(f"   Added: {counts['added']}  Updated: {counts['updated']}  "
+          f"Unchanged: {counts['unchanged']}  Removed: {counts['removed']}")
+    if counts['errors']:
+        print(f"⚠ {counts['errors']} file(s) could not be read")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Index post frontmatter into SQLite and query it',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Examples:
+  # Build or incrementally update the catalog
+  python catalog.py build _posts/
+
+  # Index the normalized outputs instead of the sources
+  python catalog.py build test_articles/ --generated --include '*.NORMALIZED.md'
+
+  # Posts without a description
+  python catalog.py missing description
+
+  # original_url values shared by several posts
+  python catalog.py duplicates original_url
+
+  # All posts tagged 'transport' in 2019, as JSON lines
+  python catalog.py tagged transport --year 2019 --json
+
+  # Any read-only SQL (tables: posts, post_tags, post_categories)
+  python catalog.py sql "SELECT lang, count(*) FROM posts GROUP BY lang"
+
+Columns: {', '.join(COLUMNS.values())}
+        """
+    )
+    parser.add_argument('--db', default=str(DEFAULT_DB), help=f'Catalog file (default: {DEFAULT_DB})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Index a file or directory (incremental)')
+    build_parser.add_argument('input', help='Input markdown file or directory')
+    build_parser.add_argument('--no-recursive', action='store_true', help='Only index files at the top level of a directory')
+    build_parser.add_argument('--include', action='append', metavar='GLOB', help='Only index files matching this glob (repeatable, default: *.md)')
+    build_parser.add_argument('--exclude', action='append', metavar='GLOB', help='Skip files or directories matching this glob (repeatable)')
+    build_parser.add_argument('--generated', action='store_true', help='Also index *.NORMALIZED.md outputs')
+
+    missing_parser = subparsers.add_parser('missing', help='Posts with an empty column')
+    missing_parser.add_argument('column', choices=list(COLUMNS.values()))
+
+    duplicates_parser = subparsers.add_parser('duplicates', help='Column values shared by several posts')
+    duplicates_parser.add_argument('column', nargs='?', default='original_url', choices=list(COLUMNS.values()))
+
+    tagged_parser = subparsers.add_parser('tagged', help='Posts with a tag')
+    tagged_parser.add_argument('tag')
+    tagged_parser.add_argument('--year', type=int, help='Only posts dated in this year')
+
+    sql_parser = subparsers.add_parser('sql', help='Run a read-only SQL query')
+    sql_parser.add_argument('query')
+
+    for sub in (missing_parser, duplicates_parser, tagged_parser, sql_parser):
+        sub.add_argument('--json', action='store_true', help='Print one JSON object per row')
+
+    args = parser.parse_args()
+
+    catalog = Catalog(Path(args.db))
+    try:
+        if args.command == 'build':
+            return build(catalog, args)
+
+        started = time.perf_counter()
+        if args.command == 'missing':
+            rows = catalog.missing(args.column)
+        elif args.command == 'duplicates':
+            rows = catalog.duplicates(args.column)
+        elif args.command == 'tagged':
+            rows = catalog.tagged(args.tag, args.year)
+        else:
+            try:
+                rows = catalog.query(args.query)
+            except sqlite3.Error as e:
+                print(f"❌ SQL error: {e}", file=sys.stderr)
+                return 1
+        elapsed = time.perf_counter() - started
+
+        print_rows(rows, args.json)
+        print(f"\n{len(rows)} row(s) in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        return 0
+    finally:
+        catalog.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,6 +13,9 @@ from pathlib import Path
 from datetime import datetime
 from urllib.parse import urlparse
 
+sys.path.insert(0, str(Path(__file__).parent))
+from utils import discovery, fileio
+
 
 def check_and_fix_links(filepath, config):
     """
@@ -104,8 +107,7 @@ def check_and_fix_links(filepath, config):
         # Write updated file
         if not config.get('dry_run', False):
             try:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(normalized_content)
+                fileio.write_if_changed(filepath, normalized_content)
                 results['status'] = 'updated'
                 print(f"  ✓ File updated with {results['replaced_links']} replacement(s)")
             except Exception as e:
@@ -206,6 +208,9 @@ Examples:
     parser.add_argument('--dry-run', action='store_true', help='Show changes without writing files')
     parser.add_argument('--no-wayback', action='store_true', help='Skip Wayback Machine lookup')
     parser.add_argument('--timeout', type=int, default=5, help='Request timeout in seconds (default: 5)')
+    parser.add_argument('--no-recursive', action='store_true', help='Only check files at the top level of a directory')
+    parser.add_argument('--include', action='append', metavar='GLOB', help='Only check files matching this glob (repeatable, default: *.md)')
+    parser.add_argument('--exclude', action='append', metavar='GLOB', help='Skip files or directories matching this glob (repeatable)')
 
     args = parser.parse_args()
 
@@ -234,20 +239,27 @@ Examples:
         results_summary.append(results)
 
     elif input_path.is_dir():
-        md_files = list(input_path.glob('*.md'))
-        if not md_files:
-            print(f"❌ No markdown files found in {input_path}")
-            sys.exit(1)
+        # Normalized posts are what this script checks, so keep *.NORMALIZED.md
+        md_files = discovery.iter_markdown_files(
+            input_path,
+            recursive=not args.no_recursive,
+            include=args.include,
+            exclude=args.exclude,
+            exclude_generated=False
+        )
 
-        print(f"📁 Processing directory: {input_path}")
-        print(f"   Found {len(md_files)} markdown file(s)\n")
+        print(f"📁 Processing directory: {input_path}\n")
 
         for md_file in md_files:
-            print(f"📄 Processing: {md_file.name}")
+            print(f"📄 Processing: {md_file.relative_to(input_path)}")
             results = check_and_fix_links(md_file, config)
             results_summary.append(results)
             print()
 
+        if not results_summary:
+            print(f"❌ No markdown files found in {input_path}")
+            sys.exit(1)
+
     # Summary
     print(f"\n{'='*60}")
     print("Summary")
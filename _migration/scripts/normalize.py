@@ -11,28 +11,88 @@ Features implemented:
 - E: Embed detection & conversion (TODO)
 - F: Image processing (TODO)
 - G: Link checking & Wayback integration (TODO)
+- H: Tag inference from _data/tags.yml
 """
 
 import os
 import sys
+import time
+import signal
 import argparse
+import cProfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Import feature modules
 sys.path.insert(0, str(Path(__file__).parent))
-from utils import frontmatter, headings, markdown_cleanup, code_blocks, embeds, images, links
-
-
-def normalize_post(filepath, config):
+from utils import frontmatter, headings, markdown_cleanup, code_blocks, embeds, images, links, tags
+from utils import attachments, cache, discovery, fileio, profiling, reporting, safety, watch
+from utils.document import Document
+
+
+# Pipeline stages in execution order: (config key, feature letter, label, module).
+# Markdown cleanup runs before heading normalization: it converts WordPress
+# <h2>-<h6> to '##' headings, which then get their anchors and outline entry.
+STAGES = [
+    ('frontmatter', 'A', 'Frontmatter standardization', frontmatter),
+    ('markdown_cleanup', 'C', 'Markdown cleanup', markdown_cleanup),
+    ('headings', 'B', 'Heading normalization', headings),
+    ('code_blocks', 'D', 'Code block standardization', code_blocks),
+    ('embeds', 'E', 'Embed detection & conversion', embeds),
+    ('images', 'F', 'Image processing', images),
+    ('links', 'G', 'Link checking', links),
+    ('tags', 'H', 'Tag inference', tags),
+]
+
+# Stages reading the attachment index (galleries, alt text): its fingerprint
+# is part of their cache version, so a changed export re-runs them
+ATTACHMENT_STAGES = frozenset(('markdown_cleanup', 'images'))
+
+# Stages whose cached output can go stale without a version change (export
+# fingerprint, local image files). The cache stores the output of the stage
+# before each of them, and the final output: the points a run resumes from
+STALE_STAGES = ATTACHMENT_STAGES | {'images'}
+
+
+def stage_version(key, module):
+    """Cache version of a stage's output (see utils/cache.py)"""
+    if key in ATTACHMENT_STAGES and attachments.fingerprint():
+        return f"{module.STAGE_VERSION}-{attachments.fingerprint()}"
+    return module.STAGE_VERSION
+
+
+def report_feature_results(feature_results, log=print):
+    """Print the changes, warnings and issues of one stage"""
+    if feature_results['changes']:
+        log(f"    ✓ Changes: {len(feature_results['changes'])}")
+        for change in feature_results['changes']:
+            log(f"      - {change}")
+
+    if feature_results['warnings']:
+        log(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
+        for warning in feature_results['warnings']:
+            log(f"      - {warning}")
+
+    if feature_results['issues']:
+        log(f"    ✗ Issues: {len(feature_results['issues'])}")
+        for issue in feature_results['issues']:
+            log(f"      - {issue}")
+
+
+def normalize_post(filepath, config, log=print, cached=None):
     """
     Normalize a single WordPress-exported markdown post
 
     Args:
         filepath: Path to markdown file
         config: Configuration dict with feature flags
+        log: Callable receiving each console line (default: print)
+        cached: Previous cache manifest entry for this file (or None)
 
     Returns:
         dict: Results with status and any issues found
+              ('cache_entry' holds the updated manifest entry when caching)
     """
     results = {
         'file': str(filepath),
@@ -51,175 +111,135 @@ def normalize_post(filepath, config):
         return results
 
     original_content = content
+    output_path = filepath.parent / f"{filepath.stem}.NORMALIZED.md"
+
+    enabled = [stage for stage in STAGES if config.get(stage[0], True)]
+    cache_dir = config.get('cache_dir')
+
+    # Work out how many leading stages can be reused from the cache
+    reused = 0
+    if cache_dir:
+        input_hash = cache.content_hash(content)
+        versions = [{'name': key, 'version': stage_version(key, module)} for key, _, _, module in enabled]
+        reused = cache.valid_stage_prefix(cached, input_hash, versions, base_dir=filepath.parent)
+        entry = {
+            'input': input_hash,
+            'features': [stage['name'] for stage in versions],
+            'stages': cached['stages'][:reused] if reused else [],
+            'output': cached['output'] if reused == len(enabled) else None,
+        }
+
+        # Resume from the output of the last valid stage that was stored
+        # (entries written before outputs were selected stored them all)
+        while 0 < reused < len(enabled) and not entry['stages'][reused - 1].get('stored', True):
+            reused -= 1
+        entry['stages'] = entry['stages'][:reused]
+
+        if 0 < reused < len(enabled):
+            restored = cache.load_object(cache_dir, entry['stages'][-1]['output'])
+            if restored is None:
+                reused = 0
+                entry['stages'] = []
+            else:
+                content = restored
+
+    if reused:
+        results['cached'] = [key for key, _, _, _ in enabled[:reused]]
+
+    profile = config.get('profile', False)
+    if profile:
+        results['pid'] = os.getpid()
+        results['timings'] = {}
+
+    # Parse once; every stage works on the same document. A file that takes
+    # longer than the deadline is abandoned rather than stalling the batch.
+    running = 'parsing'
+    try:
+        with safety.deadline(config.get('timeout')):
+            started = time.perf_counter()
+            doc = Document.parse(content)
+            doc.attachments = attachments.active()
+            if profile:
+                results['timings']['parse'] = {'start': started, 'seconds': time.perf_counter() - started}
+
+            for index, (key, letter, label, module) in enumerate(enabled):
+                if index < reused:
+                    log(f"  → Feature {letter}: {label} (cached)")
+                    feature_results = entry['stages'][index]['results']
+                else:
+                    log(f"  → Running Feature {letter}: {label}...")
+                    running = f"Feature {letter} ({label})"
+                    started = time.perf_counter()
+                    files = None
+                    if key == 'images':
+                        # Its output depends on which local images exist
+                        files = module.local_sources(doc, filepath) if cache_dir else None
+                        doc, feature_results = module.normalize(doc, filepath)
+                    else:
+                        doc, feature_results = module.normalize(doc)
+                    if profile:
+                        results['timings'][key] = {'start': started, 'seconds': time.perf_counter() - started}
+
+                    if cache_dir:
+                        # Outputs nothing resumes from are neither serialized nor stored
+                        stage_input = entry['stages'][-1]['output'] if entry['stages'] else entry['input']
+                        stored = index == len(enabled) - 1 or enabled[index + 1][0] in STALE_STAGES
+                        stage_output = doc.serialize() if stored else None
+                        entry['stages'].append({
+                            'name': key,
+                            'version': stage_version(key, module),
+                            'input': stage_input,
+                            'output': cache.store_object(cache_dir, stage_output) if stored else None,
+                            'stored': stored,
+                            'results': feature_results,
+                        })
+                        if files:
+                            entry['stages'][-1]['files'] = files
+
+                results['features'][key] = feature_results
+                report_feature_results(feature_results, log)
+    except safety.Timeout as e:
+        results['status'] = 'timeout'
+        results['issues'].append(f"Timed out after {e.seconds:g}s in {running} - no output written")
+        log(f"  ⏱ Timed out after {e.seconds:g}s in {running}")
+        return results
 
-    # Feature A: Frontmatter standardization
-    if config.get('frontmatter', True):
-        print("  → Running Feature A: Frontmatter standardization...")
-        content, feature_results = frontmatter.normalize(content)
-        results['features']['frontmatter'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
-
-    # Feature B: Heading normalization
-    if config.get('headings', True):
-        print("  → Running Feature B: Heading normalization...")
-        content, feature_results = headings.normalize(content)
-        results['features']['headings'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
-
-    # Feature C: Markdown cleanup
-    if config.get('markdown_cleanup', True):
-        print("  → Running Feature C: Markdown cleanup...")
-        content, feature_results = markdown_cleanup.normalize(content)
-        results['features']['markdown_cleanup'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
-
-    # Feature D: Code block standardization
-    if config.get('code_blocks', True):
-        print("  → Running Feature D: Code block standardization...")
-        content, feature_results = code_blocks.normalize(content)
-        results['features']['code_blocks'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
-
-    # Feature E: Embed detection & conversion
-    if config.get('embeds', True):
-        print("  → Running Feature E: Embed detection & conversion...")
-        content, feature_results = embeds.normalize(content)
-        results['features']['embeds'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
-
-    # Feature F: Image processing
-    if config.get('images', True):
-        print("  → Running Feature F: Image processing...")
-        content, feature_results = images.normalize(content, filepath)
-        results['features']['images'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
-
-    # Feature G: Link checking & Wayback integration
-    if config.get('links', True):
-        print("  → Running Feature G: Link checking...")
-        content, feature_results = links.normalize(content)
-        results['features']['links'] = feature_results
-
-        # Display results
-        if feature_results['changes']:
-            print(f"    ✓ Changes: {len(feature_results['changes'])}")
-            for change in feature_results['changes']:
-                print(f"      - {change}")
-
-        if feature_results['warnings']:
-            print(f"    ⚠ Warnings: {len(feature_results['warnings'])}")
-            for warning in feature_results['warnings']:
-                print(f"      - {warning}")
-
-        if feature_results['issues']:
-            print(f"    ✗ Issues: {len(feature_results['issues'])}")
-            for issue in feature_results['issues']:
-                print(f"      - {issue}")
+    if cache_dir:
+        if reused == len(enabled) and entry['output'] is not None:
+            content = None
+        else:
+            # When the last stage ran, its stored output is the final content
+            content = stage_output if reused < len(enabled) else doc.serialize()
+            entry['output'] = cache.content_hash(content)
+        results['cache_entry'] = entry
+    else:
+        content = doc.serialize()
 
     # Write normalized content
     if not config.get('dry_run', False):
-        output_path = filepath.parent / f"{filepath.stem}.NORMALIZED.md"
-        try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+        if content is None and fileio.file_hash(output_path) == entry['output']:
+            # Fully cached and the previous output is still on disk
             results['output'] = str(output_path)
-            print(f"  ✓ Written to: {output_path.name}")
-        except Exception as e:
-            results['issues'].append(f"Failed to write file: {e}")
-            results['status'] = 'error'
-            return results
+            log(f"  ✓ Unchanged (cached): {output_path.name}")
+        else:
+            if content is None:
+                content = cache.load_object(cache_dir, entry['output'])
+                if content is None:
+                    # Object store lost the output: redo this file from scratch
+                    return normalize_post(filepath, config, log=log)
+            try:
+                # Identical output is not rewritten, so mtimes only move on real changes
+                if fileio.write_if_changed(output_path, content):
+                    log(f"  ✓ Written to: {output_path.name}")
+                else:
+                    log(f"  ✓ Unchanged: {output_path.name}")
+                results['output'] = str(output_path)
+            except Exception as e:
+                results['issues'].append(f"Failed to write file: {e}")
+                results['status'] = 'error'
+                return results
     else:
-        print("  (Dry run - no files written)")
+        log("  (Dry run - no files written)")
         results['output'] = '(dry run)'
 
     # Overall status
@@ -242,6 +262,57 @@ def normalize_post(filepath, config):
     return results
 
 
+def _normalize_worker(filepath, config, cached=None):
+    """
+    Run normalize_post in a pool worker, buffering its console output
+
+    Returns:
+        tuple: (results_dict, list_of_output_lines)
+    """
+    lines = []
+    log = _discard if config.get('quiet') else lines.append
+    results = normalize_post(filepath, config, log=log, cached=cached)
+    return results, lines
+
+
+def _init_worker(attachments_path=None):
+    """
+    Pool initializer: Ctrl-C is handled by the main process, which shuts the
+    pool down; the attachment index is loaded once per worker, not sent with
+    every file
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if attachments_path:
+        attachments.activate(attachments.AttachmentIndex.load(attachments_path))
+
+
+def _discard(line):
+    """Log sink used when per-file output is disabled"""
+
+
+def _ordered_map(executor, md_files, config, cached_entry, window):
+    """
+    Normalize files in a process pool, yielding results in input order
+
+    At most `window` files are in flight, so the input iterator is consumed
+    lazily and memory stays bounded however many files there are.
+
+    Yields:
+        tuple: (filepath, (results_dict, list_of_output_lines))
+    """
+    pending = deque()
+
+    for md_file in md_files:
+        pending.append((md_file, executor.submit(_normalize_worker, md_file, config, cached_entry(md_file))))
+        if len(pending) >= window:
+            md_file, future = pending.popleft()
+            yield md_file, future.result()
+
+    while pending:
+        md_file, future = pending.popleft()
+        yield md_file, future.result()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Normalize WordPress-exported markdown posts for Jekyll',
@@ -259,6 +330,31 @@ Examples:
 
   # Normalize all posts in directory
   python normalize.py test_articles/
+
+  # Normalize a directory using 4 worker processes
+  python normalize.py test_articles/ --jobs 4
+
+  # Only the top level, skipping drafts
+  python normalize.py test_articles/ --no-recursive --exclude 'draft-*'
+
+  # Stream one JSON record per file to results.ndjson, summary only on the console
+  python normalize.py test_articles/ --format ndjson --output results.ndjson
+
+  # Per-stage timings (p50/p95/max, slowest files) plus a Chrome trace
+  python normalize.py test_articles/ --profile --trace trace.json --no-cache
+
+  # Re-run every stage, ignoring cached results
+  python normalize.py test_articles/ --no-cache
+
+  # Give up on any file that takes more than 10 seconds
+  python normalize.py test_articles/ --timeout 10
+
+  # Expand [gallery] shortcodes and fill in alt text from a WordPress export
+  # (indexed once, then reused from attachments.json until the export changes)
+  python normalize.py test_articles/ --wxr export.xml
+
+  # Keep running and re-normalize posts as they are saved (Ctrl-C to stop)
+  python normalize.py test_articles/ --watch --jobs 4
         """
     )
     parser.add_argument(
@@ -267,17 +363,124 @@ Examples:
     )
     parser.add_argument(
         '--feature',
-        choices=['A', 'B', 'C', 'D', 'E', 'F', 'G'],
-        help='Run only specific feature (A-G)'
+        choices=['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'],
+        help='Run only specific feature (A-H)'
     )
     parser.add_argument(
         '--dry-run',
         action='store_true',
         help='Show what would be done without writing files'
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Number of worker processes for directory input (0 = one per CPU, default: 1)'
+    )
+    parser.add_argument(
+        '--no-recursive',
+        action='store_true',
+        help='Only process markdown files at the top level of a directory'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        metavar='GLOB',
+        help='Only process files matching this glob (repeatable, default: *.md)'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        metavar='GLOB',
+        help='Skip files or directories matching this glob (repeatable)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['text', 'ndjson'],
+        default='text',
+        help='Per-file output: human-readable text or one JSON record per file (default: text)'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        default='-',
+        metavar='FILE',
+        help='Where NDJSON records are written (default: - for stdout)'
+    )
+    parser.add_argument(
+        '--quiet', '-q',
+        action='store_true',
+        help='Only print the final summary (and files with errors)'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Record wall time per stage and file, and report the slowest files and stages'
+    )
+    parser.add_argument(
+        '--profile-stats',
+        metavar='FILE',
+        help='With --profile, also dump cProfile stats of the main process to FILE (pstats format)'
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='With --profile, also write stage timings as Chrome trace JSON to FILE'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help=f'Incremental cache location (default: {cache.DEFAULT_CACHE_DIRNAME}/ next to the input)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable the incremental cache and re-run every stage'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=60,
+        metavar='SECONDS',
+        help='Give up on a file after this long and mark it as timed out (0 = no limit, default: 60)'
+    )
+    parser.add_argument(
+        '--wxr',
+        metavar='FILE',
+        help='WordPress export (WXR) whose media attachments expand galleries and fill in alt text'
+    )
+    parser.add_argument(
+        '--attachments',
+        metavar='FILE',
+        help=f'Saved attachment index, built from --wxr when missing or outdated '
+             f'(default: {attachments.DEFAULT_INDEX_FILENAME} in the cache directory, or next to the export)'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='After the initial run, keep watching the input and re-normalize changed posts'
+    )
+    parser.add_argument(
+        '--debounce',
+        type=float,
+        default=0.5,
+        metavar='SECONDS',
+        help='With --watch, wait until changes settle for this long before a re-run (default: 0.5)'
+    )
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help='With --watch, poll modification times instead of using inotify'
+    )
 
     args = parser.parse_args()
 
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    # Keep stdout clean when NDJSON records are streamed to it
+    def say(*parts):
+        records_on_stdout = args.format == 'ndjson' and args.output == '-'
+        print(*parts, file=sys.stderr if records_on_stdout else sys.stdout)
+
     # Configuration (enable/disable features)
     config = {
         'frontmatter': True,
@@ -287,6 +490,7 @@ Examples:
         'embeds': True,
         'images': True,
         'links': True,
+        'tags': True,
         'dry_run': args.dry_run
     }
 
@@ -305,64 +509,223 @@ Examples:
             'E': 'embeds',
             'F': 'images',
             'G': 'links',
+            'H': 'tags',
         }
         if args.feature in feature_map:
             config[feature_map[args.feature]] = True
-            print(f"\n🎯 Running Feature {args.feature} only\n")
+            say(f"\n🎯 Running Feature {args.feature} only\n")
+
+    config['profile'] = args.profile or bool(args.profile_stats or args.trace)
+    config['timeout'] = args.timeout
 
     # Process file(s)
     input_path = Path(args.input)
 
     if not input_path.exists():
-        print(f"❌ Error: {input_path} does not exist")
+        say(f"❌ Error: {input_path} does not exist")
         sys.exit(1)
 
-    print(f"\n{'='*60}")
-    print(f"WordPress to Jekyll Normalization")
-    print(f"{'='*60}\n")
-
-    results_summary = []
-
-    if input_path.is_file():
-        print(f"📄 Processing: {input_path.name}\n")
-        results = normalize_post(input_path, config)
-        results_summary.append(results)
-
-    elif input_path.is_dir():
-        md_files = list(input_path.glob('*.md'))
-        if not md_files:
-            print(f"❌ No markdown files found in {input_path}")
+    # Per-file output: human-readable text, NDJSON records, or nothing (--quiet)
+    ndjson = reporting.NDJSONWriter(args.output) if args.format == 'ndjson' else None
+    verbose = not (args.quiet or ndjson)
+    config['quiet'] = not verbose
+
+    def file_log(line):
+        if verbose:
+            print(line)
+
+    summary = reporting.RunSummary()
+
+    # Stage profiling: timings aggregated here, optional trace/cProfile output
+    stage_profiler = profiling.StageProfiler() if config['profile'] else None
+    trace = profiling.ChromeTraceWriter(args.trace) if args.trace else None
+    main_profiler = cProfile.Profile() if args.profile_stats else None
+    if main_profiler:
+        if jobs > 1:
+            say("⚠ --profile-stats only covers the main process; use --jobs 1 to profile the stages\n")
+        main_profiler.enable()
+
+    # Incremental cache (skips stages whose input and version are unchanged)
+    result_cache = None
+    if not args.no_cache:
+        base_dir = input_path if input_path.is_dir() else input_path.parent
+        config['cache_dir'] = Path(args.cache_dir) if args.cache_dir else base_dir / cache.DEFAULT_CACHE_DIRNAME
+        result_cache = cache.NormalizeCache(config['cache_dir'])
+
+    def cached_entry(md_file):
+        return result_cache.get(md_file) if result_cache else None
+
+    def record(md_file, results):
+        entry = results.pop('cache_entry', None)
+        if result_cache:
+            result_cache.put(md_file, entry)
+        if ndjson:
+            ndjson.write(results)
+        elif args.quiet and results['status'] in ('error', 'timeout'):
+            say(f"✗ {md_file}: {'; '.join(results['issues']) or 'stage error'}")
+        summary.add(results)
+        if stage_profiler:
+            stage_profiler.add(results)
+        if trace:
+            trace.add(results)
+
+    say(f"\n{'='*60}")
+    say(f"WordPress to Jekyll Normalization")
+    say(f"{'='*60}\n")
+
+    # Attachment index of the WordPress export, built by streaming it once
+    attachments_path = None
+    if args.wxr or args.attachments:
+        wxr_path = Path(args.wxr) if args.wxr else None
+        if args.attachments:
+            attachments_path = Path(args.attachments)
+        elif config.get('cache_dir'):
+            attachments_path = config['cache_dir'] / attachments.DEFAULT_INDEX_FILENAME
+        else:
+            attachments_path = wxr_path.with_suffix('.attachments.json')
+
+        started = time.perf_counter()
+        try:
+            index, built = attachments.load_or_build(attachments_path, wxr_path)
+        except (OSError, ValueError) as e:
+            say(f"❌ Error: cannot index WordPress export {wxr_path}: {e}")
             sys.exit(1)
+        if index is None:
+            say(f"❌ Error: no attachment index at {attachments_path} (pass --wxr to build it)")
+            sys.exit(1)
+        attachments.activate(index)
+        if built:
+            say(f"🗂  Indexed {len(index)} attachments from {wxr_path} in {time.perf_counter() - started:.2f}s")
+        else:
+            say(f"🗂  Using {len(index)} attachments from {attachments_path}")
+        say()
+
+    # Pool kept for the whole run, so watch mode re-uses warm workers
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(attachments_path,)) if jobs > 1 and input_path.is_dir() else None
+    display_root = input_path if input_path.is_dir() else input_path.parent
+
+    def process(md_files):
+        """Normalize files, printing and recording results in input order"""
+        if executor:
+            # Workers buffer their output; print it per file, in input order
+            outcomes = _ordered_map(executor, md_files, config, cached_entry, window=jobs * 4)
+        else:
+            outcomes = ((md_file, None) for md_file in md_files)
+
+        for md_file, outcome in outcomes:
+            file_log(f"📄 Processing: {md_file.relative_to(display_root)}")
+            if outcome:
+                results, lines = outcome
+                for line in lines:
+                    file_log(line)
+            else:
+                results = normalize_post(md_file, config, log=file_log, cached=cached_entry(md_file))
+            record(md_file, results)
+            file_log('')
 
-        print(f"📁 Processing directory: {input_path}")
-        print(f"   Found {len(md_files)} markdown file(s)\n")
-
-        for md_file in md_files:
-            print(f"📄 Processing: {md_file.name}")
-            results = normalize_post(md_file, config)
-            results_summary.append(results)
-            print()
-
-    else:
-        print(f"❌ Error: {input_path} is not a valid file or directory")
-        sys.exit(1)
-
-    # Summary
-    print(f"\n{'='*60}")
-    print("Summary")
-    print(f"{'='*60}\n")
-
-    success_count = sum(1 for r in results_summary if r['status'] == 'success')
-    warning_count = sum(1 for r in results_summary if r['status'] == 'warning')
-    error_count = sum(1 for r in results_summary if r['status'] == 'error')
-
-    print(f"✓ Success: {success_count}")
-    print(f"⚠ Warnings: {warning_count}")
-    print(f"✗ Errors: {error_count}")
-    print(f"\nTotal processed: {len(results_summary)}")
+    try:
+        if input_path.is_file():
+            file_log(f"📄 Processing: {input_path.name}\n")
+            results = normalize_post(input_path, config, log=file_log, cached=cached_entry(input_path))
+            record(input_path, results)
+
+        elif input_path.is_dir():
+            md_files = discovery.iter_markdown_files(
+                input_path,
+                recursive=not args.no_recursive,
+                include=args.include,
+                exclude=args.exclude
+            )
+
+            say(f"📁 Processing directory: {input_path}")
+            if jobs > 1:
+                say(f"   Using {jobs} worker processes")
+            say()
+
+            process(md_files)
+
+            if not summary.total and not args.watch:
+                say(f"❌ No markdown files found in {input_path}")
+                sys.exit(1)
+
+        else:
+            say(f"❌ Error: {input_path} is not a valid file or directory")
+            sys.exit(1)
 
-    if error_count > 0:
-        print("\n⚠️  Some files had errors. Review the output above.")
+        if ndjson:
+            ndjson.flush()
+        if result_cache:
+            result_cache.prune()
+            result_cache.save()
+        if main_profiler:
+            main_profiler.disable()
+            main_profiler.dump_stats(args.profile_stats)
+
+        # Summary
+        say(f"\n{'='*60}")
+        say("Summary")
+        say(f"{'='*60}\n")
+
+        error_count = summary.count('error') + summary.count('timeout')
+
+        say(f"✓ Success: {summary.count('success')}")
+        say(f"⚠ Warnings: {summary.count('warning')}")
+        say(f"✗ Errors: {summary.count('error')}")
+        if summary.count('timeout'):
+            say(f"⏱ Timeouts: {summary.count('timeout')} (raise --timeout or check these files for malformed markup)")
+        say(f"\nTotal processed: {summary.total}")
+
+        if stage_profiler:
+            say(f"\n{'='*60}")
+            say("Stage Profile")
+            say(f"{'='*60}\n")
+            stage_profiler.report(say)
+            if args.trace:
+                say(f"\n📝 Chrome trace written to: {args.trace}")
+            if args.profile_stats:
+                say(f"📝 cProfile stats written to: {args.profile_stats}")
+
+        if args.watch:
+            # A single file is watched through its directory, limited to that file
+            if input_path.is_file():
+                watch_root, watch_options = input_path.parent, {'recursive': False, 'include': [input_path.name]}
+            else:
+                watch_root, watch_options = input_path, {
+                    'recursive': not args.no_recursive,
+                    'include': args.include,
+                    'exclude': args.exclude,
+                }
+            watcher = watch.open_watcher(watch_root, polling=args.poll, **watch_options)
+
+            say(f"\n👀 Watching {watch_root} ({watcher.name}), press Ctrl-C to stop\n")
+            try:
+                for batch in watch.iter_batches(watcher, args.debounce):
+                    before = Counter(summary.statuses)
+                    process(batch)
+                    if ndjson:
+                        ndjson.flush()
+                    if result_cache:
+                        result_cache.save()
+                    counts = summary.statuses - before
+                    say(f"🔁 {time.strftime('%H:%M:%S')} Re-normalized {len(batch)} file(s): "
+                        f"✓ {counts['success']}  ⚠ {counts['warning']}  ✗ {counts['error'] + counts['timeout']}")
+            except KeyboardInterrupt:
+                say("\n👋 Stopped watching")
+            finally:
+                watcher.close()
+                if result_cache:
+                    result_cache.prune()
+                    result_cache.save()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if ndjson:
+            ndjson.close()
+        if trace:
+            trace.close()
+
+    if error_count > 0 and not args.watch:
+        say("\n⚠️  Some files had errors. Review the output above.")
         sys.exit(1)
 
 
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Attachment Index
+Media attachments of a WordPress export (id -> file URL, caption, alt text)
+
+Built by streaming the WXR file with iterparse: each <item> is read and then
+cleared, so memory is bounded by the index, not by the size of the export.
+The index is saved as JSON and rebuilt only when the export changes; the
+pipeline activates it once per process (see normalize.py) and stages reach
+it through Document.attachments.
+"""
+
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from .fileio import atomic_write
+
+# Bump when the indexed fields change; saved indexes are rebuilt
+INDEX_FORMAT = 1
+
+DEFAULT_INDEX_FILENAME = 'attachments.json'
+
+# Size suffix WordPress adds to resized copies ('photo-300x200.jpg')
+SIZE_SUFFIX = re.compile(r'-\d+x\d+(?=\.[A-Za-z0-9]+$)')
+
+# Index activated in this process (see activate())
+_active = None
+
+
+def _local(tag: str) -> str:
+    """Tag name without its namespace ('{http://wordpress.org/export/1.2/}post_id' -> 'post_id')"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _clean(text: Optional[str]) -> str:
+    return ' '.join((text or '').split())
+
+
+def _filename(url: str) -> str:
+    """Lookup key of an image URL or path: its file name without WordPress size suffix"""
+    name = url.split('?')[0].split('#')[0].rstrip('/').rsplit('/', 1)[-1]
+    return SIZE_SUFFIX.sub('', name).lower()
+
+
+def _attachment(item: ET.Element) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    Read one WXR <item>
+
+    Returns:
+        tuple or None: (post id, record) if the item is an attachment with a URL
+    """
+    fields = {}
+    meta = {}
+    for child in item:
+        name = _local(child.tag)
+        if name == 'postmeta':
+            values = {_local(part.tag): part.text or '' for part in child}
+            meta[values.get('meta_key', '')] = values.get('meta_value', '')
+        elif name == 'encoded':
+            # content:encoded and excerpt:encoded; the excerpt is the caption
+            fields['excerpt' if '/excerpt/' in child.tag else 'content'] = child.text or ''
+        else:
+            fields[name] = child.text or ''
+
+    if fields.get('post_type') != 'attachment':
+        return None
+    post_id = fields.get('post_id', '').strip()
+    url = (fields.get('attachment_url') or fields.get('guid') or '').strip()
+    if not post_id or not url:
+        return None
+
+    record = {
+        'url': url,
+        'caption': _clean(fields.get('excerpt')),
+        'alt': _clean(meta.get('_wp_attachment_image_alt')),
+        'title': _clean(fields.get('title')),
+        'parent': fields.get('post_parent', '').strip(),
+    }
+    return post_id, {key: value for key, value in record.items() if value and value != '0'}
+
+
+def iter_attachments(wxr_path: Path) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Stream the attachments of a WXR export
+
+    Every finished <item> is cleared and dropped from the channel, so
+    posts already read (and their content) do not stay in memory.
+
+    Yields:
+        tuple: (post id, record with 'url' and optional 'caption', 'alt', 'title', 'parent')
+
+    Raises:
+        ET.ParseError: If the export is not well-formed XML
+    """
+    channel = None
+    for event, element in ET.iterparse(str(wxr_path), events=('start', 'end')):
+        if event == 'start':
+            if channel is None and _local(element.tag) == 'channel':
+                channel = element
+            continue
+        if element.tag != 'item':
+            continue
+        attachment = _attachment(element)
+        if attachment:
+            yield attachment
+        element.clear()
+        if channel is not None:
+            channel.clear()
+
+
+class AttachmentIndex:
+    """
+    Attachments by post id, with lookup by file URL
+
+    Attributes:
+        records: post id -> {'url', 'caption', 'alt', 'title', 'parent'} (empty fields omitted)
+        source: Identity of the export it was built from (path, size, mtime_ns)
+        fingerprint: Short hash of the records, part of the cache version of
+                     the stages using the index
+    """
+
+    def __init__(self, records: Dict[str, Dict[str, str]], source: Optional[Dict] = None,
+                 fingerprint: Optional[str] = None):
+        self.records = records
+        self.source = source or {}
+        self.fingerprint = fingerprint or self._fingerprint(records)
+        self._by_url = None
+        self._by_filename = None
+
+    @staticmethod
+    def _fingerprint(records: Dict) -> str:
+        canonical = json.dumps(records, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, post_id) -> Optional[Dict[str, str]]:
+        """Record of an attachment id ('123' or 'attachment_123'), or None"""
+        key = str(post_id).strip()
+        if key.startswith('attachment_'):
+            key = key[len('attachment_'):]
+        return self.records.get(key)
+
+    def find(self, url: str) -> Optional[Dict[str, str]]:
+        """
+        Record of an image URL or path: exact URL first, then file name
+
+        File names are compared without WordPress size suffixes, so
+        'images/photo-300x200.jpg' finds the attachment of 'photo.jpg'.
+        A file name shared by several attachments matches none of them.
+
+        Returns:
+            dict or None: The attachment record
+        """
+        if self._by_url is None:
+            self._by_url = {record['url']: record for record in self.records.values()}
+            self._by_filename = {}
+            for record in self.records.values():
+                key = _filename(record['url'])
+                self._by_filename[key] = None if key in self._by_filename else record
+        record = self._by_url.get(url)
+        if record is None:
+            record = self._by_filename.get(_filename(url))
+        return record
+
+    @classmethod
+    def from_wxr(cls, wxr_path: Path) -> "AttachmentIndex":
+        """
+        Build the index by streaming a WXR export (see iter_attachments)
+
+        Raises:
+            ValueError: If the export is not well-formed XML
+        """
+        source = _source(wxr_path)
+        try:
+            records = dict(iter_attachments(wxr_path))
+        except ET.ParseError as e:
+            raise ValueError(f"Invalid WXR export: {e}") from e
+        return cls(records, source=source)
+
+    @classmethod
+    def load(cls, index_path: Path) -> Optional["AttachmentIndex"]:
+        """
+        Read a saved index
+
+        Returns:
+            AttachmentIndex or None: None if missing, unreadable or of another format
+        """
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('format') != INDEX_FORMAT:
+            return None
+        return cls(data.get('attachments') or {}, data.get('source'), data.get('fingerprint'))
+
+    def save(self, index_path: Path):
+        """Write the index as JSON (atomically)"""
+        data = {
+            'format': INDEX_FORMAT,
+            'source': self.source,
+            'fingerprint': self.fingerprint,
+            'attachments': self.records,
+        }
+        Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(Path(index_path), json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+
+def _source(wxr_path: Path) -> Dict:
+    stat = os.stat(wxr_path)
+    return {'path': str(Path(wxr_path).resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_or_build(index_path: Path, wxr_path: Optional[Path] = None) -> Tuple[Optional[AttachmentIndex], bool]:
+    """
+    Reuse the saved index, rebuilding and saving it when the export changed
+
+    Without wxr_path the saved index is used as is.
+
+    Returns:
+        tuple: (index or None if there is none, True if it was (re)built)
+
+    Raises:
+        OSError: If the export cannot be read or the index written
+        ValueError: If the export is not well-formed XML
+    """
+    index = AttachmentIndex.load(index_path)
+    if wxr_path is None or (index is not None and index.source == _source(wxr_path)):
+        return index, False
+    index = AttachmentIndex.from_wxr(wxr_path)
+    index.save(index_path)
+    return index, True
+
+
+def activate(index: Optional[AttachmentIndex]):
+    """Make an index the one of this process (pool initializer, serial runs)"""
+    global _active
+    _active = index
+
+
+def active() -> Optional[AttachmentIndex]:
+    """Index activated in this process, or None"""
+    return _active
+
+
+def fingerprint() -> str:
+    """Fingerprint of the active index ('' when there is none)"""
+    return _active.fingerprint if _active else ''
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Block structure index of a markdown body
+Locates fenced code blocks, raw HTML blocks and inline code spans once per
+version of the body, so stages can skip these protected regions
+"""
+
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from typing import Iterator, Tuple
+
+from .safety import compile_linear
+
+FENCE = 'fence'
+HTML = 'html'
+CODE_SPAN = 'code_span'
+
+# Region kinds whose content must be kept verbatim
+ALL = frozenset((FENCE, HTML, CODE_SPAN))
+
+# Code only: raw HTML blocks stay visible to the stages that convert them (<pre>)
+CODE = frozenset((FENCE, CODE_SPAN))
+
+# Line-level blocks (for line scanners, where code spans do not matter)
+BLOCKS = frozenset((FENCE, HTML))
+
+# A protected range of the body: [start, end), end excludes the final newline
+Region = namedtuple('Region', 'start end kind')
+
+# Fenced code block: opening marker ('```', '~~~~', ...), info string, content
+# range and start of the closing line (None when the fence is never closed)
+Fence = namedtuple('Fence', 'start end marker info content_start content_end closing')
+
+# Block starts, matched at a line start: code fences, and HTML blocks whose
+# content is raw text (CommonMark HTML block types 1 and 2)
+BLOCK_START = re.compile(
+    r'[ ]{0,3}(?:(?P<fence>`{3,}|~{3,})'
+    r'|<(?P<tag>pre|script|style|textarea)(?=[\s>]|$)'
+    r'|(?P<comment><!--))',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# Substrings every block start contains; the body is searched for these with
+# str.find, and BLOCK_START is only tried on the lines where they occur
+BLOCK_NEEDLES = ('```', '~~~', '<')
+
+HTML_END = {
+    'pre': re.compile(r'</pre>', re.IGNORECASE),
+    'script': re.compile(r'</script>', re.IGNORECASE),
+    'style': re.compile(r'</style>', re.IGNORECASE),
+    'textarea': re.compile(r'</textarea>', re.IGNORECASE),
+    'comment': re.compile(r'-->'),
+}
+
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+
+@lru_cache(maxsize=None)
+def _closing_line(char: str, length: int):
+    return re.compile(rf'[ ]{{0,3}}{re.escape(char)}{{{length},}}[ \t]*$', re.MULTILINE)
+
+
+def _line_end(body: str, pos: int) -> int:
+    end = body.find('\n', pos)
+    return len(body) if end < 0 else end
+
+
+def _line_start(body: str, pos: int):
+    """Start of the line holding pos, or None if pos is indented by more than 3 spaces"""
+    start = body.rfind('\n', 0, pos) + 1
+    if pos - start > 3 or body[start:pos].strip(' '):
+        return None
+    return start
+
+
+def _next_block(body: str, pos: int, found: dict):
+    """
+    Find the next BLOCK_START match at or after a line start
+
+    found caches the next offset of each needle, so every needle is searched
+    for only once per occurrence.
+    """
+    while True:
+        for needle in BLOCK_NEEDLES:
+            hit = found.get(needle, -1)
+            if hit is not None and hit < pos:
+                hit = body.find(needle, pos)
+                found[needle] = hit if hit >= 0 else None
+        hits = [hit for hit in found.values() if hit is not None]
+        if not hits:
+            return None
+        hit = min(hits)
+        start = _line_start(body, hit)
+        if start is not None and start >= pos:
+            match = BLOCK_START.match(body, start)
+            if match:
+                return match
+        pos = hit + 1
+
+
+def _closing_fence(body: str, marker: str, pos: int):
+    """Find the line closing a fence opened with marker"""
+    pattern = _closing_line(marker[0], len(marker))
+    hit = body.find(marker, pos)
+    while hit >= 0:
+        start = _line_start(body, hit)
+        if start is not None and start >= pos:
+            match = pattern.match(body, start)
+            if match:
+                return match
+        hit = body.find(marker, _line_end(body, hit))
+    return None
+
+
+def _code_spans(body: str, start: int, end: int, regions: list):
+    """Append the code spans found in body[start:end] to regions"""
+    runs = []
+    hit = body.find('`', start, end)
+    while hit >= 0:
+        run_end = hit + 1
+        while run_end < end and body[run_end] == '`':
+            run_end += 1
+        runs.append((hit, run_end))
+        hit = body.find('`', run_end, end)
+
+    i = 0
+    while i < len(runs):
+        opener_start, opener_end = runs[i]
+        i += 1
+        if opener_start > 0 and body[opener_start - 1] == '\\':
+            continue
+
+        # The closing run has the same length and is in the same paragraph
+        paragraph = PARAGRAPH_BREAK.search(body, opener_end, end)
+        limit = paragraph.start() if paragraph else end
+        size = opener_end - opener_start
+        for j in range(i, len(runs)):
+            closer_start, closer_end = runs[j]
+            if closer_start >= limit:
+                break
+            if closer_end - closer_start == size:
+                regions.append(Region(opener_start, closer_end, CODE_SPAN))
+                i = j + 1
+                break
+
+
+def scan(body: str) -> Tuple[list, list]:
+    """
+    Locate the protected regions of a body in one pass
+
+    Fences and raw HTML blocks start at a line start (up to 3 spaces of
+    indentation) and run to the end of their closing line, or to the end of
+    the body when they are never closed. Code spans are only looked for
+    between blocks. Candidates are located with str.find, so text without
+    backticks, tildes or '<' costs next to nothing.
+
+    Returns:
+        tuple: (regions, fences) sorted by start offset
+    """
+    regions = []
+    fences = []
+    found = {}
+    pos = 0
+    gap_start = 0
+    length = len(body)
+
+    while pos < length:
+        match = _next_block(body, pos, found)
+        if not match:
+            break
+
+        line_end = _line_end(body, match.end())
+        marker = match.group('fence')
+        if marker:
+            info = body[match.end():line_end].strip()
+            if marker[0] == '`' and '`' in info:
+                # ```code``` on one line is a code span, not a fence
+                pos = match.end()
+                continue
+            content_start = min(line_end + 1, length)
+            close = _closing_fence(body, marker, content_start)
+            end = close.end() if close else length
+            block_start = match.start()
+            _code_spans(body, gap_start, block_start, regions)
+            regions.append(Region(block_start, end, FENCE))
+            fences.append(Fence(block_start, end, marker, info, content_start,
+                                close.start() if close else length,
+                                close.start() if close else None))
+        else:
+            key = (match.group('tag') or 'comment').lower()
+            close = HTML_END[key].search(body, match.start())
+            end = _line_end(body, close.end()) if close else length
+            block_start = match.start()
+            _code_spans(body, gap_start, block_start, regions)
+            regions.append(Region(block_start, end, HTML))
+
+        pos = gap_start = end
+
+    _code_spans(body, gap_start, length, regions)
+    return regions, fences
+
+
+def _compile(pattern, flags: int, linear: bool):
+    """Compile a pattern given as a string (or recompile it for the linear-time engine)"""
+    if linear:
+        if not isinstance(pattern, str):
+            pattern, flags = pattern.pattern, pattern.flags
+        return compile_linear(pattern, flags)
+    if isinstance(pattern, str):
+        return re.compile(pattern, flags)
+    return pattern
+
+
+class BlockIndex:
+    """
+    Protected regions of one version of a body, queried by binary search
+
+    Stages match and substitute through the index (finditer, sub) so their
+    patterns only ever run on the free text between protected regions.
+    sub() returns the new body and keeps the index in step with it, so a
+    Document only re-scans after edits made some other way.
+
+    Attributes:
+        body: The body this index describes
+        regions: Sorted, non-overlapping Region tuples
+        fences: Fence tuples, in body order
+    """
+
+    def __init__(self, body: str):
+        self._index(body)
+
+    def _index(self, body: str):
+        self.body = body
+        self.regions, self.fences = scan(body)
+        self._starts = [region.start for region in self.regions]
+
+    def region_at(self, pos: int, kinds=ALL):
+        """
+        Find the region of one of the given kinds containing an offset
+
+        Returns:
+            Region or None
+        """
+        i = bisect_right(self._starts, pos) - 1
+        if i >= 0:
+            region = self.regions[i]
+            if pos < region.end and region.kind in kinds:
+                return region
+        return None
+
+    def protected(self, pos: int, kinds=ALL) -> bool:
+        """Check whether an offset lies in a region of one of the given kinds"""
+        return self.region_at(pos, kinds) is not None
+
+    def segments(self, kinds=ALL) -> Iterator[Tuple[int, int]]:
+        """
+        Yield the (start, end) ranges of free text between the given kinds of regions
+        """
+        pos = 0
+        for region in self.regions:
+            if region.kind in kinds:
+                if region.start > pos:
+                    yield pos, region.start
+                pos = region.end
+        if pos < len(self.body):
+            yield pos, len(self.body)
+
+    def _check(self, body: str):
+        if body is not self.body and body != self.body:
+            raise ValueError("BlockIndex does not describe this body")
+
+    def finditer(self, pattern, body: str, kinds=ALL, flags: int = 0,
+                 linear: bool = False) -> Iterator[re.Match]:
+        """
+        Like re.finditer, but only matches inside free text
+
+        A match never spans a protected region; '^' still only matches at
+        real line starts. With linear=True the pattern runs on the
+        linear-time engine when available (see utils/safety.py).
+        """
+        self._check(body)
+        pattern = _compile(pattern, flags, linear)
+        for start, end in self.segments(kinds):
+            yield from pattern.finditer(body, start, end)
+
+    def sub(self, pattern, repl, body: str, kinds=ALL, flags: int = 0,
+            linear: bool = False) -> Tuple[str, int]:
+        """
+        Like re.subn, but protected regions are copied unchanged
+
+        The index is updated to describe the returned body: regions are
+        shifted when all of them were protected, re-scanned otherwise.
+        linear is as for finditer().
+
+        Returns:
+            tuple: (new_body, count_of_replacements)
+        """
+        pattern = _compile(pattern, flags, linear)
+        expand = repl if callable(repl) else (lambda match: match.expand(repl))
+
+        pieces = []
+        edits = []
+        last = 0
+        for match in self.finditer(pattern, body, kinds):
+            replacement = expand(match)
+            pieces.append(body[last:match.start()])
+            pieces.append(replacement)
+            edits.append((match.start(), len(replacement) - (match.end() - match.start())))
+            last = match.end()
+
+        if not edits:
+            return body, 0
+
+        pieces.append(body[last:])
+        new_body = ''.join(pieces)
+
+        if all(region.kind in kinds for region in self.regions):
+            self._shift(new_body, edits)
+        else:
+            self._index(new_body)
+        return new_body, len(edits)
+
+    def _shift(self, body: str, edits: list):
+        """Move regions past the edits of a substitution (none of them touched a region)"""
+        shifts = {}
+        delta = 0
+        i = 0
+        for start in self._starts:
+            while i < len(edits) and edits[i][0] < start:
+                delta += edits[i][1]
+                i += 1
+            shifts[start] = delta
+
+        self.body = body
+        self.regions = [Region(r.start + shifts[r.start], r.end + shifts[r.start], r.kind)
+                        for r in self.regions]
+        self.fences = [
+            Fence(*(value + shifts[f.start] if isinstance(value, int) else value for value in f))
+            for f in self.fences
+        ]
+        self._starts = [region.start for region in self.regions]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Incremental Normalization Cache
+Content-hash manifest so unchanged posts skip the normalization stages
+
+Layout of the cache directory:
+    manifest.json   one entry per input file (hashes, stage versions, results)
+    objects/        zlib-compressed stage outputs, addressed by SHA-256
+
+Each stage entry records the stage version (STAGE_VERSION in its module),
+the hash of its input and output, and its results dict. Only the outputs
+a later run can resume from are stored ('stored': True, otherwise the
+output hash is None): the final one and those chosen by the pipeline (see
+normalize.py). A stage whose
+output depends on other files (Feature F checks that images exist) also
+records them as 'files': path relative to the post -> existed. When a stage
+version changes, or one of its files appeared or disappeared, only that
+stage and the ones after it are re-run, from the output of the last valid
+stored stage (restored from the object store).
+
+Objects no manifest entry refers to any more are deleted after each run
+(see NormalizeCache.prune).
+"""
+
+import hashlib
+import json
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .fileio import atomic_write
+
+# Bump when the manifest layout changes
+CACHE_FORMAT = 1
+
+DEFAULT_CACHE_DIRNAME = '.normalize_cache'
+
+# zlib level of stored objects: fast, most of the size gain of the default
+OBJECT_COMPRESSION = 1
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash text content
+
+    Returns:
+        str: Hex SHA-256 digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def store_object(cache_dir: Path, text: str, digest: Optional[str] = None) -> str:
+    """
+    Store text in the object store (no-op if already present)
+
+    Returns:
+        str: Digest of the stored text
+    """
+    digest = digest or content_hash(text)
+    object_path = Path(cache_dir) / 'objects' / digest[:2] / digest[2:]
+
+    if not object_path.exists():
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        # Concurrent workers never read a partial object. No fsync: after a
+        # crash a torn object fails its hash check and is just a cache miss
+        atomic_write(object_path, zlib.compress(text.encode('utf-8'), OBJECT_COMPRESSION), sync=False)
+
+    return digest
+
+
+def load_object(cache_dir: Path, digest: str) -> Optional[str]:
+    """
+    Load text from the object store
+
+    Returns:
+        str: Stored text, or None if missing or corrupt
+    """
+    object_path = Path(cache_dir) / 'objects' / digest[:2] / digest[2:]
+
+    try:
+        with open(object_path, 'rb') as f:
+            text = zlib.decompress(f.read()).decode('utf-8')
+    except (OSError, zlib.error, UnicodeDecodeError):
+        return None
+
+    return text if content_hash(text) == digest else None
+
+
+def valid_stage_prefix(entry: Optional[Dict], input_hash: str, stages: List[Dict],
+                       base_dir: Optional[Path] = None) -> int:
+    """
+    Count how many leading stages of a cached entry can be reused
+
+    Args:
+        entry: Manifest entry for the file (or None)
+        input_hash: Hash of the current input file content
+        stages: Enabled stages as dicts with 'name' and 'version'
+        base_dir: Directory of the input file, against which the recorded
+                  'files' of a stage are checked
+
+    Returns:
+        int: Number of leading stages whose cached results are still valid
+    """
+    if not entry or entry.get('input') != input_hash:
+        return 0
+
+    if entry.get('features') != [stage['name'] for stage in stages]:
+        return 0
+
+    count = 0
+    for stage, cached in zip(stages, entry.get('stages', [])):
+        if cached.get('name') != stage['name'] or cached.get('version') != stage['version']:
+            break
+        files = cached.get('files')
+        if files and any((Path(base_dir or '.') / path).exists() != existed for path, existed in files.items()):
+            break
+        count += 1
+
+    return count
+
+
+class NormalizeCache:
+    """
+    Persistent manifest of per-file normalization results
+
+    Only the main process reads and writes the manifest; pool workers
+    receive their file's entry and return the updated one.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.manifest_path = self.cache_dir / 'manifest.json'
+        self.entries = {}
+        self.dirty = False
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('format') == CACHE_FORMAT:
+                self.entries = manifest.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(filepath: Path) -> str:
+        return str(Path(filepath).resolve())
+
+    def get(self, filepath: Path) -> Optional[Dict]:
+        return self.entries.get(self.key(filepath))
+
+    def put(self, filepath: Path, entry: Optional[Dict]):
+        if entry is not None and self.entries.get(self.key(filepath)) != entry:
+            self.entries[self.key(filepath)] = entry
+            self.dirty = True
+
+    def prune(self) -> int:
+        """
+        Delete stored objects that no manifest entry refers to
+
+        Entries of input files that no longer exist are dropped first, so
+        the outputs of deleted posts go too. Objects replaced by a newer
+        stage output become unreferenced once their entry is updated.
+
+        Returns:
+            int: Number of objects deleted
+        """
+        for key in [key for key in self.entries if not Path(key).exists()]:
+            del self.entries[key]
+            self.dirty = True
+
+        referenced = set()
+        for entry in self.entries.values():
+            referenced.add(entry.get('output'))
+            referenced.update(stage.get('output') for stage in entry.get('stages', []) if stage.get('stored', True))
+
+        removed = 0
+        for object_path in (self.cache_dir / 'objects').glob('*/*'):
+            # Dot files are temp files of an atomic write in progress
+            if object_path.name.startswith('.') or object_path.parent.name + object_path.name in referenced:
+                continue
+            try:
+                object_path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def save(self):
+        """Write the manifest if any entry changed"""
+        if not self.dirty:
+            return
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {'format': CACHE_FORMAT, 'files': self.entries}
+        atomic_write(self.manifest_path, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+        self.dirty = False
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Frontmatter Catalog
+Indexes each post's frontmatter into SQLite for corpus-wide metadata queries
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import fileio
+from .frontmatter import normalize_date, read_frontmatter
+
+# Bump when the schema or the indexed values change; the catalog is rebuilt
+CATALOG_FORMAT = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS posts (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    title TEXT,
+    date TEXT,
+    description TEXT,
+    lang TEXT,
+    original_url TEXT,
+    cover_image TEXT,
+    frontmatter TEXT
+);
+CREATE TABLE IF NOT EXISTS post_tags (
+    path TEXT NOT NULL REFERENCES posts(path) ON DELETE CASCADE,
+    tag TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS post_categories (
+    path TEXT NOT NULL REFERENCES posts(path) ON DELETE CASCADE,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_date ON posts(date);
+CREATE INDEX IF NOT EXISTS posts_original_url ON posts(original_url);
+CREATE INDEX IF NOT EXISTS post_tags_tag ON post_tags(tag, path);
+CREATE INDEX IF NOT EXISTS post_tags_path ON post_tags(path);
+CREATE INDEX IF NOT EXISTS post_categories_category ON post_categories(category, path);
+CREATE INDEX IF NOT EXISTS post_categories_path ON post_categories(path);
+"""
+
+# Frontmatter key -> posts column, for the scalar fields
+COLUMNS = {
+    'title': 'title',
+    'date': 'date',
+    'description': 'description',
+    'lang': 'lang',
+    'original_url': 'original_url',
+    'coverImage': 'cover_image',
+}
+
+
+def _as_list(value) -> List[str]:
+    """Tags/categories may be a list or a comma-separated string"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if item is not None and str(item).strip()]
+    return [str(value)]
+
+
+def _text(value) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def index_values(frontmatter: Optional[Dict]) -> Tuple[Dict, List[str], List[str]]:
+    """
+    Normalize frontmatter into catalog values
+
+    Dates use the same YYYY-MM-DD HH:MM:SS form as normalize.py, so they sort
+    and compare as text; tags and categories are always lists.
+
+    Returns:
+        tuple: (column_values, tags, categories)
+    """
+    frontmatter = frontmatter if isinstance(frontmatter, dict) else {}
+
+    values = {column: _text(frontmatter.get(key)) for key, column in COLUMNS.items()}
+    if 'date' in frontmatter:
+        values['date'] = normalize_date(frontmatter['date']) or _text(frontmatter['date'])
+    values['frontmatter'] = json.dumps(frontmatter, ensure_ascii=False, default=str) if frontmatter else None
+
+    return values, _as_list(frontmatter.get('tags')), _as_list(frontmatter.get('categories'))
+
+
+class Catalog:
+    """
+    SQLite index of post frontmatter
+
+    update() is incremental: files whose mtime and size are unchanged are
+    skipped without being opened, touched files are hashed and only re-read
+    when their content changed, and rows of deleted files are removed.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        row = None
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+        except sqlite3.OperationalError:
+            pass
+
+        if row is not None and row['value'] != str(CATALOG_FORMAT):
+            with self.conn:
+                for table in ('post_tags', 'post_categories', 'posts', 'meta'):
+                    self.conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('format', ?)", (str(CATALOG_FORMAT),))
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, files: Iterable[Path], prune_under: Optional[Path] = None) -> Dict[str, int]:
+        """
+        Bring the catalog up to date with a set of files
+
+        Args:
+            files: Markdown files to index
+            prune_under: Remove catalog rows below this directory whose file
+                         was not in `files` (None = keep other rows)
+
+        Returns:
+            dict: Counts of 'added', 'updated', 'unchanged', 'removed' and 'errors'
+        """
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'errors': 0}
+        known = {row['path']: (row['mtime_ns'], row['size'], row['hash'])
+                 for row in self.conn.execute('SELECT path, mtime_ns, size, hash FROM posts')}
+        seen = set()
+
+        with self.conn:
+            for filepath in files:
+                path = str(Path(filepath).resolve())
+                seen.add(path)
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    counts['errors'] += 1
+                    continue
+
+                previous = known.get(path)
+                if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                    counts['unchanged'] += 1
+                    continue
+
+                digest = fileio.file_hash(path)
+                if digest is None:
+                    counts['errors'] += 1
+                    continue
+                if previous and previous[2] == digest:
+                    # Touched but identical: only refresh the stat fields
+                    self.conn.execute('UPDATE posts SET mtime_ns = ?, size = ? WHERE path = ?',
+                                      (stat.st_mtime_ns, stat.st_size, path))
+                    counts['unchanged'] += 1
+                    continue
+
+                try:
+                    frontmatter = read_frontmatter(path)
+                except (OSError, UnicodeDecodeError):
+                    counts['errors'] += 1
+                    continue
+
+                self._store(path, stat, digest, frontmatter)
+                counts['updated' if previous else 'added'] += 1
+
+            if prune_under is not None:
+                prefix = str(Path(prune_under).resolve()) + os.sep
+                for path in known.keys() - seen:
+                    if path.startswith(prefix):
+                        self.conn.execute('DELETE FROM posts WHERE path = ?', (path,))
+                        counts['removed'] += 1
+
+        return counts
+
+    def _store(self, path: str, stat: os.stat_result, digest: str, frontmatter: Optional[Dict]):
+        values, tags, categories = index_values(frontmatter)
+
+        self.conn.execute('DELETE FROM posts WHERE path = ?', (path,))
+        self.conn.execute(
+            'INSERT INTO posts (path, mtime_ns, size, hash, title, date, description, lang,'
+            ' original_url, cover_image, frontmatter) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, stat.st_mtime_ns, stat.st_size, digest, values['title'], values['date'],
+             values['description'], values['lang'], values['original_url'], values['cover_image'],
+             values['frontmatter'])
+        )
+        self.conn.executemany('INSERT INTO post_tags (path, tag) VALUES (?, ?)',
+                              [(path, tag) for tag in dict.fromkeys(tags)])
+        self.conn.executemany('INSERT INTO post_categories (path, category) VALUES (?, ?)',
+                              [(path, category) for category in dict.fromkeys(categories)])
+
+    def missing(self, column: str) -> List[sqlite3.Row]:
+        """Posts with no value for a catalog column (e.g. 'description')"""
+        if column not in COLUMNS.values():
+            raise ValueError(f"Unknown column '{column}' (known: {', '.join(COLUMNS.values())})")
+        return self.conn.execute(
+            f"SELECT path, title, date FROM posts WHERE {column} IS NULL OR trim({column}) = '' ORDER BY path"
+        ).fetchall()
+
+    def duplicates(self, column: str = 'original_url') -> List[sqlite3.Row]:
+        """Values shared by more than one post, with the posts that share them"""
+        if column not in COLUMNS.values():
+            raise ValueError(f"Unknown column '{column}' (known: {', '.join(COLUMNS.values())})")
+        return self.conn.execute(
+            f"SELECT {column} AS value, path, title FROM posts WHERE {column} IN ("
+            f"  SELECT {column} FROM posts WHERE {column} IS NOT NULL GROUP BY {column} HAVING count(*) > 1"
+            f") ORDER BY {column}, path"
+        ).fetchall()
+
+    def tagged(self, tag: str, year: Optional[int] = None) -> List[sqlite3.Row]:
+        """Posts carrying a tag, optionally limited to one year"""
+        query = ('SELECT p.path, p.title, p.date FROM post_tags t JOIN posts p ON p.path = t.path'
+                 ' WHERE t.tag = ?')
+        params = [tag]
+        if year is not None:
+            query += ' AND p.date >= ? AND p.date < ?'
+            params += [f'{year}-01-01', f'{year + 1}-01-01']
+        return self.conn.execute(query + ' ORDER BY p.date, p.path', params).fetchall()
+
+    def query(self, sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+        """Run a read-only SQL query against the catalog"""
+        self.conn.execute('PRAGMA query_only = ON')
+        try:
+            return self.conn.execute(sql, tuple(params)).fetchall()
+        finally:
+            self.conn.execute('PRAGMA query_only = OFF')
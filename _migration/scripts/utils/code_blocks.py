@@ -5,80 +5,96 @@ Converts all code blocks to fenced format with language hints
 """
 
 import re
+import html
 from typing import Tuple, Dict
 
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 3
 
-def normalize(content: str) -> Tuple[str, Dict]:
+# Regions that already hold code or raw HTML (see utils/blocks.py)
+BLOCK_KINDS = frozenset(('fence', 'html'))
+CODE_KINDS = frozenset(('fence', 'code_span'))
+
+# List item marker and the spaces after it ('- ', '12. ')
+LIST_ITEM = re.compile(r'( *)(?:[-*+]|\d{1,9}[.)])(?: +|$)')
+
+BACKTICK_FENCE = re.compile(r'^[ ]{0,3}(`{3,})', re.MULTILINE)
+
+
+def normalize(doc: "Document") -> Tuple["Document", Dict]:
     """
     Normalize code blocks in markdown content
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (body is updated in place)
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Separate frontmatter from body
-    frontmatter, body = extract_frontmatter(content)
-
-    if not body:
+    if not doc.body:
         results['issues'].append("No body content found")
         results['status'] = 'error'
-        return content, results
+        return doc, results
 
     # 1. Convert indented code blocks to fenced
-    body, indented_count = convert_indented_to_fenced(body)
-    if indented_count > 0:
-        results['changes'].append(f"Converted {indented_count} indented code blocks to fenced format")
+    if doc.has('indented'):
+        doc.body, indented_count = convert_indented_to_fenced(doc.body, doc.blocks())
+        if indented_count > 0:
+            results['changes'].append(f"Converted {indented_count} indented code blocks to fenced format")
+            results['counts']['indented_converted'] = indented_count
+    else:
+        results['skipped'].append('indented')
 
     # 2. Convert <pre> tags to fenced
-    body, pre_count = convert_pre_to_fenced(body)
-    if pre_count > 0:
-        results['changes'].append(f"Converted {pre_count} <pre> tags to fenced format")
+    if doc.has('pre'):
+        doc.body, pre_count = convert_pre_to_fenced(doc.body, doc.blocks())
+        if pre_count > 0:
+            results['changes'].append(f"Converted {pre_count} <pre> tags to fenced format")
+            results['counts']['pre_converted'] = pre_count
+    else:
+        results['skipped'].append('pre')
 
     # 3. Convert tilde fences (~~~) to backtick fences (```)
-    body, tilde_count = convert_tilde_to_backtick(body)
-    if tilde_count > 0:
-        results['changes'].append(f"Converted {tilde_count} tilde fences to backtick fences")
+    if doc.has('tilde'):
+        doc.body, tilde_count = convert_tilde_to_backtick(doc.body, doc.blocks())
+        if tilde_count > 0:
+            results['changes'].append(f"Converted {tilde_count} tilde fences to backtick fences")
+            results['counts']['tilde_fences_converted'] = tilde_count
+    else:
+        results['skipped'].append('tilde_fences')
 
     # 4. Add language hints where detectable
-    body, hint_count = add_language_hints(body)
-    if hint_count > 0:
-        results['changes'].append(f"Added {hint_count} language hints to code blocks")
-
-    # Reconstruct content
-    normalized_content = frontmatter + body if frontmatter else body
+    if doc.has('fence'):
+        doc.body, hint_count = add_language_hints(doc.body, doc.blocks())
+        if hint_count > 0:
+            results['changes'].append(f"Added {hint_count} language hints to code blocks")
+            results['counts']['language_hints_added'] = hint_count
+    else:
+        results['skipped'].append('language_hints')
 
     results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
-
+    return doc, results
 
-def extract_frontmatter(content: str) -> Tuple[str, str]:
-    """
-    Extract frontmatter and body from markdown content
 
-    Returns:
-        tuple: (frontmatter_with_delimiters, body_content)
-    """
-    pattern = r'^(---\s*\n.*?\n---\s*\n\n)(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
-
-    if match:
-        return match.group(1), match.group(2)
-    return '', content
-
-
-def convert_indented_to_fenced(body: str) -> Tuple[str, int]:
+def convert_indented_to_fenced(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Convert indented code blocks (4 spaces or tab) to fenced format
 
+    Lines inside existing fences and raw HTML blocks are never code lines,
+    nor are indented lines inside a list: nested items and item
+    continuations are indented relative to their item, not code. A list
+    ends at a blank line followed by a line indented less than its item's
+    content.
+
     Returns:
         tuple: (converted_body, count_of_conversions)
     """
@@ -87,13 +103,30 @@ def convert_indented_to_fenced(body: str) -> Tuple[str, int]:
     result_lines = []
     in_code_block = False
     code_buffer = []
+    offset = 0
+    list_column = None  # Content column of the list item the text is in
+    previous_blank = True
 
     i = 0
     while i < len(lines):
         line = lines[i]
+        line_start = offset
+        offset += len(line) + 1
+
+        # Track list items, whose indented lines are not code
+        if not in_code_block and line.strip() and not blocks.protected(line_start, BLOCK_KINDS):
+            expanded = line.expandtabs(4)
+            width = len(expanded) - len(expanded.lstrip(' '))
+            item = LIST_ITEM.match(expanded)
+            if item and width < (list_column or 0) + 4:
+                list_column = item.end() if expanded[item.end():].strip() else width + 2
+            elif list_column is not None and width < list_column and previous_blank:
+                list_column = None
+        previous_blank = not line.strip()
 
         # Check if line is indented code (4 spaces or tab)
-        is_code_line = (line.startswith('    ') or line.startswith('\t')) and line.strip()
+        is_code_line = (line.startswith('    ') or line.startswith('\t')) and line.strip() \
+            and list_column is None and not blocks.protected(line_start, BLOCK_KINDS)
 
         if is_code_line and not in_code_block:
             # Start of indented code block
@@ -145,96 +178,97 @@ def convert_indented_to_fenced(body: str) -> Tuple[str, int]:
     return '\n'.join(result_lines), count
 
 
-def convert_pre_to_fenced(body: str) -> Tuple[str, int]:
+def convert_pre_to_fenced(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Convert <pre> and <code> tags to fenced code blocks
 
+    <pre> blocks are left alone by the entity decoding of Feature C, so
+    their entities are decoded here, once. <pre> tags inside fences or code
+    spans are not converted.
+
     Returns:
         tuple: (converted_body, count_of_conversions)
     """
-    count = 0
-
-    # Pattern for <pre><code>...</code></pre>
-    def replace_pre_code(match):
-        nonlocal count
-        count += 1
-        code_content = match.group(1)
-        # Decode HTML entities
-        code_content = code_content.replace('&lt;', '<')
-        code_content = code_content.replace('&gt;', '>')
-        code_content = code_content.replace('&amp;', '&')
-        code_content = code_content.replace('&quot;', '"')
+    def replace_pre(match):
+        code_content = html.unescape(match.group(1)).replace('\xa0', ' ')
         return f"```\n{code_content}\n```"
 
-    body = re.sub(r'<pre><code>(.*?)</code></pre>', replace_pre_code, body, flags=re.DOTALL | re.IGNORECASE)
+    # Pattern for <pre><code>...</code></pre>
+    body, count = blocks.sub(r'<pre><code>(.*?)</code></pre>', replace_pre, body,
+                             kinds=CODE_KINDS, flags=re.DOTALL | re.IGNORECASE, linear=True)
 
     # Pattern for <pre>...</pre> without <code>
-    def replace_pre(match):
-        nonlocal count
-        count += 1
-        code_content = match.group(1)
-        code_content = code_content.replace('&lt;', '<')
-        code_content = code_content.replace('&gt;', '>')
-        code_content = code_content.replace('&amp;', '&')
-        code_content = code_content.replace('&quot;', '"')
-        return f"```\n{code_content}\n```"
+    body, pre_count = blocks.sub(r'<pre>(.*?)</pre>', replace_pre, body,
+                                 kinds=CODE_KINDS, flags=re.DOTALL | re.IGNORECASE, linear=True)
 
-    body = re.sub(r'<pre>(.*?)</pre>', replace_pre, body, flags=re.DOTALL | re.IGNORECASE)
+    return body, count + pre_count
 
-    return body, count
 
+def _replace_lines(body: str, edits: list) -> str:
+    """Apply sorted (start, end, text) edits to body"""
+    pieces = []
+    last = 0
+    for start, end, text in edits:
+        pieces.append(body[last:start])
+        pieces.append(text)
+        last = end
+    pieces.append(body[last:])
+    return ''.join(pieces)
 
-def convert_tilde_to_backtick(body: str) -> Tuple[str, int]:
+
+def convert_tilde_to_backtick(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Convert tilde code fences (~~~) to backtick fences (```)
 
+    Only the opening and closing lines of tilde fences are rewritten, so
+    '~~~' lines inside other code blocks stay as they are. The new fence is
+    longer than any backtick fence it contains, so the content is kept whole.
+
     Returns:
         tuple: (converted_body, count_of_conversions)
     """
-    count = 0
-
-    # Count tilde fence blocks
-    tilde_pattern = r'^~~~.*?$'
-    matches = re.findall(tilde_pattern, body, re.MULTILINE)
-    count = len(matches)
+    edits = []
+    for fence in blocks.fences:
+        if fence.marker[0] != '~':
+            continue
+        inner = [len(run) for run in BACKTICK_FENCE.findall(body, fence.content_start, fence.content_end)]
+        marker = '`' * max([len(fence.marker)] + [size + 1 for size in inner])
 
-    if count > 0:
-        # Replace opening and closing tilde fences
-        body = re.sub(r'^~~~(.*)$', r'```\1', body, flags=re.MULTILINE)
+        opening = body[fence.start:fence.content_start].rstrip('\n')
+        edits.append((fence.start, fence.start + len(opening), opening.replace(fence.marker, marker, 1)))
+        if fence.closing is not None:
+            closing = body[fence.closing:fence.end]
+            edits.append((fence.closing, fence.end, closing.replace(closing.strip(), marker, 1)))
 
-    return body, count
+    if not edits:
+        return body, 0
+    return _replace_lines(body, edits), len(edits)
 
 
-def add_language_hints(body: str) -> Tuple[str, int]:
+def add_language_hints(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Add language hints to fenced code blocks where detectable
 
     Returns:
         tuple: (body_with_hints, count_of_hints_added)
     """
-    count = 0
-
-    # Pattern to find fenced code blocks without language hints
-    # Matches: ```\n or ```  \n (with optional whitespace)
-    pattern = r'^```\s*\n(.*?)^```'
+    edits = []
 
-    def analyze_and_add_hint(match):
-        nonlocal count
-        code_content = match.group(1)
+    # Closed backtick fences without a language hint
+    for fence in blocks.fences:
+        if fence.marker[0] != '`' or fence.info or fence.closing is None:
+            continue
 
         # Detect language based on content
-        language = detect_language(code_content)
-
+        language = detect_language(body[fence.content_start:fence.content_end])
         if language:
-            count += 1
-            return f"```{language}\n{code_content}```"
-        else:
-            # No language detected, keep as-is
-            return match.group(0)
+            opening = body[fence.start:fence.content_start - 1]
+            marker_end = opening.index(fence.marker) + len(fence.marker)
+            edits.append((fence.start, fence.content_start - 1, opening[:marker_end] + language))
 
-    body = re.sub(pattern, analyze_and_add_hint, body, flags=re.MULTILINE | re.DOTALL)
-
-    return body, count
+    if not edits:
+        return body, 0
+    return _replace_lines(body, edits), len(edits)
 
 
 def detect_language(code: str) -> str:
@@ -282,6 +316,11 @@ def detect_language(code: str) -> str:
 
 
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test
@@ -309,6 +348,6 @@ echo "test"
 ```
 """
 
-    normalized, results = normalize(sample)
+    doc, results = normalize(Document.parse(sample))
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
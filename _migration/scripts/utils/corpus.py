@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Synthetic WordPress Corpus
+Generates reproducible WordPress-export style posts for benchmarking
+"""
+
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+# Probability that a post contains each feature (used by the default mix)
+DEFAULT_MIX = {
+    'captions': 0.3,
+    'figures': 0.1,
+    'iframes': 0.2,
+    'tweets': 0.1,
+    'pre': 0.15,
+    'indented_code': 0.05,
+    'entities': 0.6,
+    'images': 0.7,
+    'links': 0.8,
+    'lists': 0.4,
+    'setext': 0.05,
+    'h1': 0.1,
+    'gallery': 0.05,
+}
+
+WORDS = (
+    "la ville mobilité transport vélo tramway métro bus piéton rue quartier "
+    "espace public urbanisme aménagement voiture stationnement réseau ligne "
+    "gare trajet usager politique données étude carte territoire périurbain "
+    "déplacement logistique infrastructure projet commune métropole accès "
+    "et de du des le les un une pour dans avec sur par mais aussi plus très"
+).split()
+
+ENTITIES = ['&nbsp;', '&amp;', '&rsquo;', '&laquo;', '&raquo;', '&hellip;', '&#8217;', '&#8211;', '&eacute;']
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def _paragraph(rng: random.Random, entities: bool) -> str:
+    text = ' '.join(_sentence(rng) for _ in range(rng.randint(2, 5)))
+    if entities:
+        words = text.split(' ')
+        for _ in range(rng.randint(1, 4)):
+            position = rng.randrange(len(words))
+            words[position] = words[position] + rng.choice(ENTITIES)
+        text = ' '.join(words)
+    return text
+
+
+def _blocks(rng: random.Random, mix: Dict[str, float]) -> Iterator[str]:
+    """Yield feature blocks present in this post according to the mix"""
+    has = {feature: rng.random() < probability for feature, probability in mix.items()}
+    slug = rng.randrange(10 ** 6)
+
+    if has.get('h1'):
+        yield f"# {_sentence(rng)[:-1]}"
+    if has.get('setext'):
+        yield f"{_sentence(rng)[:-1]}\n{'=' * 12}"
+    if has.get('images'):
+        yield f"![](images/{slug:x}-photo-{rng.randint(1, 99)}.jpg)"
+    if has.get('captions'):
+        yield (f'[caption id="attachment_{slug}" align="aligncenter" width="640"]'
+               f'![{rng.choice(WORDS)}](images/{slug:x}-carte.png) {_sentence(rng)}[/caption]')
+    if has.get('figures'):
+        yield f"<figure>\n\n![](images/{slug:x}-figure.jpg)\n\n<figcaption>{_sentence(rng)}</figcaption>\n\n</figure>"
+    if has.get('links'):
+        yield f"Voir [{rng.choice(WORDS)}](https://example.org/{slug}/{rng.choice(WORDS)}) pour {_sentence(rng).lower()}"
+    if has.get('lists'):
+        yield '\n'.join(f"{rng.choice('*+-')} {_sentence(rng)}" for _ in range(rng.randint(2, 6)))
+    if has.get('iframes'):
+        kind = rng.choice(['youtube', 'vimeo', 'other'])
+        if kind == 'youtube':
+            yield f'<iframe width="560" height="315" src="https://www.youtube.com/embed/{slug:x}" frameborder="0" allowfullscreen></iframe>'
+        elif kind == 'vimeo':
+            yield f'<iframe src="https://player.vimeo.com/video/{slug}" width="640" height="360"></iframe>'
+        else:
+            yield f'<iframe src="https://www.google.com/maps/embed?pb={slug}" width="600" height="450"></iframe>'
+    if has.get('tweets'):
+        yield (f'<blockquote class="twitter-tweet"><p lang="fr" dir="ltr">{_sentence(rng)}</p>'
+               f'&mdash; Someone (@someone) <a href="https://twitter.com/someone/status/{slug}">1 janvier 2019</a></blockquote>')
+    if has.get('pre'):
+        yield f"<pre><code>if (a &lt; b &amp;&amp; c) {{\n  console.log(&quot;{rng.choice(WORDS)}&quot;);\n}}</code></pre>"
+    if has.get('indented_code'):
+        yield "    import os\n    print(os.getcwd())"
+    if has.get('gallery'):
+        yield f'[gallery ids="{slug},{slug + 1},{slug + 2}"]'
+
+
+def generate_post(rng: random.Random,
+                  index: int,
+                  size: int = 4000,
+                  mix: Optional[Dict[str, float]] = None) -> Tuple[str, str]:
+    """
+    Generate one WordPress-export style post
+
+    Args:
+        rng: Seeded random generator (the corpus is reproducible from its seed)
+        index: Post number, used for the filename and date
+        size: Approximate body size in characters
+        mix: Feature probabilities (default: DEFAULT_MIX)
+
+    Returns:
+        tuple: (filename, content)
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    date = datetime(2012, 1, 1) + timedelta(days=index % 4000, minutes=rng.randrange(1440))
+    title = _sentence(rng)[:-1]
+    slug = '-'.join(title.lower().split()[:5])
+
+    header = (
+        "---\n"
+        f"title: \"{title}\"\n"
+        f"date: \"{date.strftime('%Y-%m-%d')}\"\n"
+        "categories:\n"
+        f"  - \"{rng.choice(['Urbanisme', 'Mobilité', 'Transport'])}\"\n"
+        "tags:\n"
+        f"  - \"{rng.choice(WORDS)}\"\n"
+        f"coverImage: \"images/{index}-cover.jpg\"\n"
+        "---\n\n"
+    )
+
+    parts = []
+    extras = list(_blocks(rng, mix))
+    length = 0
+    while length < size or extras:
+        paragraph = _paragraph(rng, rng.random() < mix.get('entities', 0))
+        parts.append(paragraph)
+        length += len(paragraph)
+        if extras and rng.random() < 0.5:
+            block = extras.pop(0)
+            parts.append(block)
+            length += len(block)
+        if length >= size and not extras:
+            break
+        if rng.random() < 0.15:
+            parts.append(f"## {_sentence(rng)[:-1]}")
+
+    filename = f"{date.strftime('%Y-%m-%d')}-{index:06d}-{slug}.md"
+    return filename, header + '\n\n'.join(parts) + '\n'
+
+
+def iter_corpus(count: int,
+                seed: int = 0,
+                size: int = 4000,
+                mix: Optional[Dict[str, float]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (filename, content) for a reproducible synthetic corpus
+
+    Post sizes vary between half and twice `size`.
+    """
+    rng = random.Random(seed)
+    for index in range(count):
+        post_size = int(size * rng.choice([0.5, 0.75, 1, 1, 1.5, 2]))
+        yield generate_post(rng, index, post_size, mix)
+
+
+def write_corpus(directory: Path, count: int, seed: int = 0, size: int = 4000,
+                 mix: Optional[Dict[str, float]] = None) -> int:
+    """
+    Write a synthetic corpus to disk
+
+    Returns:
+        int: Total number of bytes written
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    total = 0
+    for filename, content in iter_corpus(count, seed, size, mix):
+        data = content.encode('utf-8')
+        (directory / filename).write_bytes(data)
+        total += len(data)
+
+    return total
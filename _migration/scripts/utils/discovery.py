@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Input Discovery
+Streams markdown files from an input tree with include/exclude filters
+"""
+
+import os
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, Optional
+
+# Suffix of files written by normalize.py
+GENERATED_SUFFIX = '.NORMALIZED.md'
+
+
+def _matches(rel_path: str, patterns: Iterable[str]) -> bool:
+    """Match a relative POSIX path against glob patterns (anchored at the right)"""
+    path = PurePosixPath(rel_path)
+    return any(path.match(pattern) for pattern in patterns)
+
+
+def accepts(root: Path,
+            path: Path,
+            is_dir: bool = False,
+            recursive: bool = True,
+            include: Optional[Iterable[str]] = None,
+            exclude: Optional[Iterable[str]] = None,
+            exclude_generated: bool = True) -> bool:
+    """
+    Apply the iter_markdown_files filters to a single path below root
+
+    Used to decide whether a file (or directory) reported by a watcher
+    belongs to the input set without walking the whole tree.
+
+    Returns:
+        bool: True if iter_markdown_files would yield (or descend into) the path
+    """
+    try:
+        parts = Path(path).relative_to(root).parts
+    except ValueError:
+        return False
+
+    include = list(include) if include else ['*.md']
+    exclude = list(exclude) if exclude else []
+
+    if any(part.startswith('.') for part in parts):
+        return False
+    if not recursive and len(parts) > (0 if is_dir else 1):
+        return False
+
+    # Every parent directory must have been descended into
+    for depth in range(1, len(parts)):
+        if _matches(PurePosixPath(*parts[:depth]).as_posix(), exclude):
+            return False
+
+    if not parts:
+        return is_dir
+
+    rel_path = PurePosixPath(*parts).as_posix()
+    if is_dir:
+        return not _matches(rel_path, exclude)
+    if exclude_generated and parts[-1].endswith(GENERATED_SUFFIX):
+        return False
+    return _matches(rel_path, include) and not _matches(rel_path, exclude)
+
+
+def iter_markdown_files(root: Path,
+                        recursive: bool = True,
+                        include: Optional[Iterable[str]] = None,
+                        exclude: Optional[Iterable[str]] = None,
+                        exclude_generated: bool = True) -> Iterator[Path]:
+    """
+    Yield markdown files under a directory as they are found
+
+    Directories are walked depth-first with os.scandir, one directory at a
+    time and in sorted order, so output is deterministic and memory stays
+    bounded by the size of the largest directory. Hidden files and
+    directories (like the normalization cache) are skipped.
+
+    Args:
+        root: Directory to walk
+        recursive: Descend into subdirectories
+        include: Glob patterns a file must match (default: *.md)
+        exclude: Glob patterns for files or directories to skip
+        exclude_generated: Skip *.NORMALIZED.md outputs of previous runs
+
+    Yields:
+        Path: Markdown file path
+    """
+    root = Path(root)
+    include = list(include) if include else ['*.md']
+    exclude = list(exclude) if exclude else []
+
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+
+            rel_path = Path(entry.path).relative_to(root).as_posix()
+
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and not _matches(rel_path, exclude):
+                    subdirs.append(Path(entry.path))
+                continue
+
+            if not entry.is_file():
+                continue
+            if exclude_generated and entry.name.endswith(GENERATED_SUFFIX):
+                continue
+            if not _matches(rel_path, include) or _matches(rel_path, exclude):
+                continue
+
+            yield Path(entry.path)
+
+        # Push in reverse so subdirectories are visited in sorted order
+        stack.extend(reversed(subdirs))
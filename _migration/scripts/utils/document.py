@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Shared post model for the normalization pipeline
+A post is parsed once and handed to every feature stage (A-H)
+"""
+
+from . import prescan
+from .blocks import BlockIndex
+from .frontmatter import split_frontmatter, load_frontmatter, serialize_frontmatter, patch_frontmatter
+
+
+class Document:
+    """
+    A markdown post split into header and body
+
+    Attributes:
+        header: Raw frontmatter block with delimiters and trailing blank lines
+                ('' when the post has no frontmatter)
+        body: Markdown body content
+        frontmatter: Parsed frontmatter dict, or None if missing/invalid
+        attachments: AttachmentIndex of the WordPress export, or None
+                     (see utils/attachments.py; set by the pipeline)
+        frontmatter_error: YAML error when the frontmatter could not be parsed
+    """
+
+    def __init__(self, header, body, frontmatter=None, attachments=None, frontmatter_error=None):
+        self.header = header
+        self.body = body
+        self.frontmatter = frontmatter
+        self.attachments = attachments
+        self.frontmatter_error = frontmatter_error
+
+        # Pre-scan state, valid for one version of the body
+        self._scanned_body = None
+        self._lowered = None
+        self._triggers = {}
+
+        # Block index, rebuilt when it no longer describes the body
+        self._blocks = None
+
+    @classmethod
+    def parse(cls, content):
+        """
+        Split content once and parse its YAML frontmatter
+
+        Returns:
+            Document: Parsed document
+        """
+        header, yaml_text, body = split_frontmatter(content)
+        errors = []
+        frontmatter = load_frontmatter(yaml_text, errors) if yaml_text is not None else None
+        return cls(header, body, frontmatter, frontmatter_error=errors[0] if errors else None)
+
+    def set_frontmatter(self, frontmatter):
+        """
+        Replace the frontmatter, updating the header text; the body is left untouched
+
+        Only changed keys are rewritten in the existing header (see
+        frontmatter.patch_frontmatter); the whole header is re-dumped when
+        there is none yet or it cannot be patched.
+
+        Returns:
+            str: 'unchanged', 'patched' or 'rewritten'
+        """
+        header = None
+        if self.header and self.frontmatter is not None:
+            header = patch_frontmatter(self.header, self.frontmatter, frontmatter)
+
+        if header is None:
+            self.header = serialize_frontmatter(frontmatter) + "\n\n"
+            mode = 'rewritten'
+        else:
+            mode = 'unchanged' if header is self.header else 'patched'
+            self.header = header
+
+        self.frontmatter = frontmatter
+        return mode
+
+    def has(self, *triggers):
+        """
+        Check the current body for pre-scan triggers (see utils/prescan.py)
+
+        Each trigger is looked up at most once per version of the body;
+        assigning a new body invalidates the results. The body is only
+        lowercased for triggers with letters (see prescan.CASELESS).
+
+        Returns:
+            bool: True if any of the given triggers is present
+        """
+        if self.body is not self._scanned_body:
+            self._scanned_body = self.body
+            self._lowered = None
+            self._triggers = {}
+
+        for name in triggers:
+            if name not in self._triggers:
+                if name in prescan.CASELESS:
+                    text = self.body
+                else:
+                    if self._lowered is None:
+                        self._lowered = self.body.lower()
+                    text = self._lowered
+                self._triggers[name] = prescan.contains(text, name)
+            if self._triggers[name]:
+                return True
+        return False
+
+    def blocks(self):
+        """
+        Block index of the current body (see utils/blocks.py)
+
+        Built at most once per version of the body. Stages that edit the
+        body through BlockIndex.sub keep the index in step, so it is only
+        re-scanned after edits made some other way.
+
+        Returns:
+            BlockIndex: Fences, raw HTML blocks and code spans of the body
+        """
+        if self._blocks is None or self._blocks.body is not self.body:
+            self._blocks = BlockIndex(self.body)
+        return self._blocks
+
+    def serialize(self):
+        """
+        Re-assemble the full markdown file content
+
+        Returns:
+            str: Header followed by body
+        """
+        return self.header + self.body
@@ -7,90 +7,98 @@ Detects and converts embedded content (YouTube, Twitter, etc.) to Jekyll format
 import re
 from typing import Tuple, Dict, List
 
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 2
 
-def normalize(content: str) -> Tuple[str, Dict]:
+
+def normalize(doc: "Document") -> Tuple["Document", Dict]:
     """
     Detect and convert embedded content in markdown
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (body is updated in place)
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Separate frontmatter from body
-    frontmatter, body = extract_frontmatter(content)
-
-    if not body:
+    if not doc.body:
         results['issues'].append("No body content found")
         results['status'] = 'error'
-        return content, results
+        return doc, results
 
     # 1. Convert YouTube embeds (iframes)
-    body, youtube_count, youtube_ids = convert_youtube_embeds(body)
-    if youtube_count > 0:
-        results['changes'].append(f"Converted {youtube_count} YouTube embed(s)")
-        for vid_id in youtube_ids:
-            results['warnings'].append(f"YouTube video {vid_id} - verify video is still available")
+    if doc.has('iframe'):
+        doc.body, youtube_count, youtube_ids = convert_youtube_embeds(doc.body, doc.blocks())
+        if youtube_count > 0:
+            results['changes'].append(f"Converted {youtube_count} YouTube embed(s)")
+            results['counts']['youtube_embeds'] = youtube_count
+            for vid_id in youtube_ids:
+                results['warnings'].append(f"YouTube video {vid_id} - verify video is still available")
+    else:
+        results['skipped'].append('youtube_embeds')
 
     # 1b. Convert plain YouTube URLs to markdown links
-    body, youtube_url_count = convert_youtube_urls(body)
-    if youtube_url_count > 0:
-        results['changes'].append(f"Converted {youtube_url_count} plain YouTube URL(s) to links")
+    if doc.has('youtube_url'):
+        doc.body, youtube_url_count = convert_youtube_urls(doc.body, doc.blocks())
+        if youtube_url_count > 0:
+            results['changes'].append(f"Converted {youtube_url_count} plain YouTube URL(s) to links")
+            results['counts']['youtube_urls'] = youtube_url_count
+    else:
+        results['skipped'].append('youtube_urls')
 
     # 2. Convert Vimeo embeds
-    body, vimeo_count, vimeo_ids = convert_vimeo_embeds(body)
-    if vimeo_count > 0:
-        results['changes'].append(f"Converted {vimeo_count} Vimeo embed(s)")
+    if doc.has('iframe'):
+        doc.body, vimeo_count, vimeo_ids = convert_vimeo_embeds(doc.body, doc.blocks())
+        if vimeo_count > 0:
+            results['changes'].append(f"Converted {vimeo_count} Vimeo embed(s)")
+            results['counts']['vimeo_embeds'] = vimeo_count
+    else:
+        results['skipped'].append('vimeo_embeds')
 
     # 3. Convert Twitter embeds (blockquotes)
-    body, twitter_count = convert_twitter_embeds(body)
-    if twitter_count > 0:
-        results['changes'].append(f"Converted {twitter_count} Twitter embed(s)")
-        results['warnings'].append("Twitter embeds converted to blockquotes - API access may be required for live embedding")
+    if doc.has('tweet'):
+        doc.body, twitter_count = convert_twitter_embeds(doc.body, doc.blocks())
+        if twitter_count > 0:
+            results['changes'].append(f"Converted {twitter_count} Twitter embed(s)")
+            results['counts']['twitter_embeds'] = twitter_count
+            results['warnings'].append("Twitter embeds converted to blockquotes - API access may be required for live embedding")
+    else:
+        results['skipped'].append('twitter_embeds')
 
     # 3b. Convert plain Twitter URLs to markdown links
-    body, twitter_url_count = convert_twitter_urls(body)
-    if twitter_url_count > 0:
-        results['changes'].append(f"Converted {twitter_url_count} plain Twitter URL(s) to links")
+    if doc.has('twitter_url'):
+        doc.body, twitter_url_count = convert_twitter_urls(doc.body, doc.blocks())
+        if twitter_url_count > 0:
+            results['changes'].append(f"Converted {twitter_url_count} plain Twitter URL(s) to links")
+            results['counts']['twitter_urls'] = twitter_url_count
+    else:
+        results['skipped'].append('twitter_urls')
 
     # 4. Detect and flag unknown embeds
-    unknown_embeds = detect_unknown_embeds(body)
-    if unknown_embeds:
-        results['warnings'].append(f"Found {len(unknown_embeds)} unknown embed(s) - manual review needed")
-        for embed in unknown_embeds[:3]:  # Show first 3
-            results['warnings'].append(f"  Unknown embed: {embed[:50]}...")
-
-    # Reconstruct content
-    normalized_content = frontmatter + body if frontmatter else body
+    if doc.has('embed'):
+        unknown_embeds = detect_unknown_embeds(doc.body, doc.blocks())
+        if unknown_embeds:
+            results['warnings'].append(f"Found {len(unknown_embeds)} unknown embed(s) - manual review needed")
+            results['counts']['unknown_embeds'] = len(unknown_embeds)
+            for embed in unknown_embeds[:3]:  # Show first 3
+                results['warnings'].append(f"  Unknown embed: {embed[:50]}...")
+    else:
+        results['skipped'].append('unknown_embeds')
 
     results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
+    return doc, results
 
 
-def extract_frontmatter(content: str) -> Tuple[str, str]:
-    """
-    Extract frontmatter and body from markdown content
-
-    Returns:
-        tuple: (frontmatter_with_delimiters, body_content)
-    """
-    pattern = r'^(---\s*\n.*?\n---\s*\n\n)(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
-
-    if match:
-        return match.group(1), match.group(2)
-    return '', content
-
-
-def convert_youtube_embeds(body: str) -> Tuple[str, int, List[str]]:
+def convert_youtube_embeds(body: str, blocks: "BlockIndex") -> Tuple[str, int, List[str]]:
     """
     Convert YouTube iframes to markdown links with preview note
 
@@ -114,7 +122,7 @@ def convert_youtube_embeds(body: str) -> Tuple[str, int, List[str]]:
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
         return f"\n> [YouTube Video: {youtube_url}]({youtube_url})\n"
 
-    body = re.sub(youtube_pattern, replace_youtube, body, flags=re.IGNORECASE | re.DOTALL)
+    body, _ = blocks.sub(youtube_pattern, replace_youtube, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
 
     # Also handle youtube-nocookie.com embeds
     youtube_nocookie_pattern = r'<iframe[^>]*src=["\']https?://(?:www\.)?youtube-nocookie\.com/embed/([^"\'?]+)[^>]*>.*?</iframe>'
@@ -128,12 +136,12 @@ def convert_youtube_embeds(body: str) -> Tuple[str, int, List[str]]:
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
         return f"\n> [YouTube Video: {youtube_url}]({youtube_url})\n"
 
-    body = re.sub(youtube_nocookie_pattern, replace_youtube_nocookie, body, flags=re.IGNORECASE | re.DOTALL)
+    body, _ = blocks.sub(youtube_nocookie_pattern, replace_youtube_nocookie, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
 
     return body, count, video_ids
 
 
-def convert_youtube_urls(body: str) -> Tuple[str, int]:
+def convert_youtube_urls(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Convert plain YouTube URLs to markdown links
     Handles: https://youtu.be/VIDEO_ID and https://www.youtube.com/watch?v=VIDEO_ID
@@ -162,12 +170,12 @@ def convert_youtube_urls(body: str) -> Tuple[str, int]:
             count += 1
             return f"\n[YouTube: {clean_url}]({clean_url})\n"
 
-        body = re.sub(pattern, replace_url, body, flags=re.MULTILINE)
+        body, _ = blocks.sub(pattern, replace_url, body, flags=re.MULTILINE)
 
     return body, count
 
 
-def convert_vimeo_embeds(body: str) -> Tuple[str, int, List[str]]:
+def convert_vimeo_embeds(body: str, blocks: "BlockIndex") -> Tuple[str, int, List[str]]:
     """
     Convert Vimeo iframes to markdown links
 
@@ -190,12 +198,12 @@ def convert_vimeo_embeds(body: str) -> Tuple[str, int, List[str]]:
         vimeo_url = f"https://vimeo.com/{video_id}"
         return f"\n> [Vimeo Video: {vimeo_url}]({vimeo_url})\n"
 
-    body = re.sub(vimeo_pattern, replace_vimeo, body, flags=re.IGNORECASE | re.DOTALL)
+    body, _ = blocks.sub(vimeo_pattern, replace_vimeo, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
 
     return body, count, video_ids
 
 
-def convert_twitter_embeds(body: str) -> Tuple[str, int]:
+def convert_twitter_embeds(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Convert Twitter blockquotes to simplified markdown
 
@@ -226,12 +234,12 @@ def convert_twitter_embeds(body: str) -> Tuple[str, int]:
             count += 1
             return f"\n> {clean_content}\n"
 
-    body = re.sub(twitter_pattern, replace_twitter, body, flags=re.IGNORECASE | re.DOTALL)
+    body, _ = blocks.sub(twitter_pattern, replace_twitter, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
 
     return body, count
 
 
-def convert_twitter_urls(body: str) -> Tuple[str, int]:
+def convert_twitter_urls(body: str, blocks: "BlockIndex") -> Tuple[str, int]:
     """
     Convert plain Twitter URLs to markdown links
     Handles: https://twitter.com/user/status/TWEET_ID
@@ -251,12 +259,12 @@ def convert_twitter_urls(body: str) -> Tuple[str, int]:
         count += 1
         return f"\n[Tweet: {url}]({url})\n"
 
-    body = re.sub(twitter_url_pattern, replace_url, body, flags=re.MULTILINE)
+    body, _ = blocks.sub(twitter_url_pattern, replace_url, body, flags=re.MULTILINE)
 
     return body, count
 
 
-def detect_unknown_embeds(body: str) -> List[str]:
+def detect_unknown_embeds(body: str, blocks: "BlockIndex") -> List[str]:
     """
     Detect iframes and other embed patterns that weren't converted
 
@@ -267,23 +275,28 @@ def detect_unknown_embeds(body: str) -> List[str]:
 
     # Find remaining iframes
     iframe_pattern = r'<iframe[^>]*>.*?</iframe>'
-    iframes = re.findall(iframe_pattern, body, re.IGNORECASE | re.DOTALL)
-    unknown.extend(iframes)
+    iframes = blocks.finditer(iframe_pattern, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
+    unknown.extend(match.group(0) for match in iframes)
 
     # Find WordPress [embed] shortcodes
     embed_shortcode_pattern = r'\[embed[^\]]*\].*?\[/embed\]'
-    embeds = re.findall(embed_shortcode_pattern, body, re.IGNORECASE | re.DOTALL)
-    unknown.extend(embeds)
+    embeds = blocks.finditer(embed_shortcode_pattern, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
+    unknown.extend(match.group(0) for match in embeds)
 
     # Find standalone <embed> or <object> tags
     object_pattern = r'<(?:embed|object)[^>]*>.*?</(?:embed|object)>'
-    objects = re.findall(object_pattern, body, re.IGNORECASE | re.DOTALL)
-    unknown.extend(objects)
+    objects = blocks.finditer(object_pattern, body, flags=re.IGNORECASE | re.DOTALL, linear=True)
+    unknown.extend(match.group(0) for match in objects)
 
     return unknown
 
 
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test
@@ -305,6 +318,6 @@ More text.
 <iframe src="https://unknown-embed.com/video/123"></iframe>
 """
 
-    normalized, results = normalize(sample)
+    doc, results = normalize(Document.parse(sample))
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Safe File Output
+Atomic writes that leave unchanged files (and their mtime) untouched
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+
+def file_hash(path: Path) -> Optional[str]:
+    """
+    Hash a file's bytes
+
+    Returns:
+        str: Hex SHA-256 digest, or None if the file cannot be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def atomic_write(path: Path, data: bytes, sync: bool = True):
+    """
+    Write bytes via a temp file in the same directory and rename it into place
+
+    Readers see either the old or the new file, never a partial one; the
+    existing file's permissions are kept. With sync=False the data is not
+    flushed to disk before the rename: faster, but a crash may leave an
+    empty or torn file (fine for caches that verify what they read).
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_name, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """
+    Atomically write text unless the file already holds exactly this content
+
+    The size is compared first, so only same-size files are hashed.
+
+    Returns:
+        bool: True if the file was written, False if it was already up to date
+    """
+    path = Path(path)
+    data = content.encode('utf-8')
+
+    try:
+        if os.stat(path).st_size == len(data) and file_hash(path) == hashlib.sha256(data).hexdigest():
+            return False
+    except FileNotFoundError:
+        pass
+
+    atomic_write(path, data)
+    return True
@@ -4,35 +4,52 @@ Feature A: Frontmatter Standardization
 Ensures all posts have complete, standardized frontmatter for Jekyll
 """
 
+import html
 import re
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
 import yaml
 
+# libyaml bindings are several times faster; fall back to pure Python without them
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
-def normalize(content):
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 9
+
+
+def normalize(doc):
     """
-    Normalize frontmatter in markdown content
+    Normalize frontmatter of a parsed post
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (frontmatter and header are updated)
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Parse frontmatter and body
-    frontmatter, body = parse_frontmatter(content)
+    frontmatter = doc.frontmatter
+    body = doc.body
 
     if not frontmatter:
-        results['issues'].append("No frontmatter found")
+        if doc.frontmatter_error:
+            results['issues'].append(f"Invalid frontmatter YAML: {doc.frontmatter_error}")
+        else:
+            results['issues'].append("No frontmatter found")
         results['status'] = 'error'
-        return content, results
+        return doc, results
 
     # Standardize frontmatter fields
     normalized_fm = {}
@@ -41,6 +58,7 @@ def normalize(content):
     normalized_fm['layout'] = 'post'
     if frontmatter.get('layout') != 'post':
         results['changes'].append(f"Set layout: post (was: {frontmatter.get('layout', 'missing')})")
+        results['counts']['layout_set'] = 1
 
     # 2. Title (required)
     if 'title' in frontmatter:
@@ -56,6 +74,7 @@ def normalize(content):
             normalized_fm['date'] = normalized_date
             if str(frontmatter['date']) != normalized_date:
                 results['changes'].append(f"Normalized date format: {normalized_date}")
+                results['counts']['date_normalized'] = 1
         else:
             results['issues'].append(f"Invalid date format: {frontmatter['date']}")
             normalized_fm['date'] = frontmatter['date']
@@ -63,6 +82,7 @@ def normalize(content):
         results['issues'].append("Missing date field")
         normalized_fm['date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         results['changes'].append("Added current date (missing)")
+        results['counts']['date_added'] = 1
 
     # 4. Description (generate if missing)
     if 'description' in frontmatter and frontmatter['description']:
@@ -72,21 +92,15 @@ def normalize(content):
         description = generate_description(body)
         normalized_fm['description'] = description
         results['changes'].append(f"Generated description: {description[:50]}...")
+        results['counts']['description_generated'] = 1
 
-    # 5. Tags (preserve and add 'transport' tag)
-    if 'tags' in frontmatter:
-        # Ensure it's a list
-        tags = frontmatter['tags']
-        if isinstance(tags, str):
-            tags = [tag.strip() for tag in tags.split(',')]
-        # Add 'transport' tag if not already present
-        if 'transport' not in tags:
-            tags.append('transport')
-            results['changes'].append("Added 'transport' tag")
-        normalized_fm['tags'] = tags if tags else ['transport']
-    else:
-        normalized_fm['tags'] = ['transport']
-        results['changes'].append("Set tags: ['transport']")
+    # 5. Tags (preserved as a list; Feature H infers site tags from the body)
+    tags = frontmatter.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        results['changes'].append("Converted tags to a list")
+        results['counts']['tags_listed'] = 1
+    normalized_fm['tags'] = list(tags)
 
     # 6. Categories (set to 'post' for WordPress blog migration)
     normalized_fm['categories'] = ['post']
@@ -97,11 +111,13 @@ def normalize(content):
         elif isinstance(old_cats, list):
             old_cats = ', '.join(old_cats)
         results['changes'].append(f"Set categories to ['post'] (was: {old_cats})")
+        results['counts']['categories_set'] = 1
 
     # 7. Language (hardcoded to French for WordPress import)
     normalized_fm['lang'] = 'fr'
     if 'lang' not in frontmatter:
         results['changes'].append("Added lang: fr (WordPress import)")
+        results['counts']['lang_added'] = 1
 
     # 8. Original URL (preserve if exists, indicates WordPress source)
     if 'original_url' in frontmatter:
@@ -117,11 +133,51 @@ def normalize(content):
     # 10. Translation status (default false)
     normalized_fm['translated'] = frontmatter.get('translated', False)
 
-    # Reconstruct content with normalized frontmatter
-    normalized_content = serialize_frontmatter(normalized_fm) + "\n\n" + body
+    # Patch the header in place (full re-dump only for structural changes)
+    if doc.set_frontmatter(normalized_fm) == 'rewritten':
+        results['counts']['header_rewritten'] = 1
 
     results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
+    return doc, results
+
+
+FRONTMATTER_PATTERN = re.compile(r'^---\s*\n(.*?)\n---\s*\n', re.DOTALL)
+
+
+def split_frontmatter(content):
+    """
+    Split the raw frontmatter block from the body without parsing YAML
+
+    Only the header is matched; the body is sliced off once.
+
+    Returns:
+        tuple: (header_with_delimiters, yaml_text, body_content)
+               header is '' and yaml_text is None when there is no frontmatter
+    """
+    match = FRONTMATTER_PATTERN.match(content)
+
+    if not match:
+        return '', None, content
+
+    return match.group(0), match.group(1), content[match.end():]
+
+
+def load_frontmatter(yaml_text, errors=None):
+    """
+    Parse the YAML text of a frontmatter block
+
+    Nothing is printed (stdout may carry NDJSON records); the parse error
+    is appended to errors when a list is given.
+
+    Returns:
+        dict: Parsed frontmatter or None if invalid
+    """
+    try:
+        return yaml.load(yaml_text, Loader=SafeLoader)
+    except yaml.YAMLError as e:
+        if errors is not None:
+            errors.append(' '.join(str(e).split()))
+        return None
 
 
 def parse_frontmatter(content):
@@ -131,101 +187,249 @@ def parse_frontmatter(content):
     Returns:
         tuple: (frontmatter_dict, body_content)
     """
-    # Match frontmatter pattern: ---\n...\n---
-    pattern = r'^---\s*\n(.*?)\n---\s*\n(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
+    header, yaml_text, body = split_frontmatter(content)
 
-    if not match:
+    if yaml_text is None:
         return None, content
 
-    try:
-        frontmatter = yaml.safe_load(match.group(1))
-        body = match.group(2)
-        return frontmatter, body
-    except yaml.YAMLError as e:
-        print(f"YAML parsing error: {e}")
+    frontmatter = load_frontmatter(yaml_text)
+    if frontmatter is None:
         return None, content
 
+    return frontmatter, body
+
+
+def read_frontmatter(filepath):
+    """
+    Read and parse only the frontmatter of a file
+
+    Lines are read up to the closing '---' and the rest of the file is
+    never loaded, so corpus-wide metadata scans cost a fraction of the I/O.
+
+    Args:
+        filepath: Path to a markdown file
+
+    Returns:
+        dict: Parsed frontmatter or None if missing/invalid
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if f.readline().rstrip() != '---':
+            return None
+
+        lines = []
+        for line in f:
+            if line.rstrip() == '---':
+                return load_frontmatter(''.join(lines))
+            lines.append(line)
+
+    # No closing delimiter: not a frontmatter block
+    return None
+
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+FRENCH_MONTHS = {
+    'janvier': 1, 'janv': 1, 'février': 2, 'fevrier': 2, 'févr': 2, 'fevr': 2, 'mars': 3,
+    'avril': 4, 'avr': 4, 'mai': 5, 'juin': 6, 'juillet': 7, 'juil': 7, 'août': 8, 'aout': 8,
+    'septembre': 9, 'sept': 9, 'octobre': 10, 'oct': 10, 'novembre': 11, 'nov': 11,
+    'décembre': 12, 'decembre': 12, 'déc': 12, 'dec': 12,
+}
+
+# One pattern per supported shape; the matching group decides the conversion
+DATE_PATTERN = re.compile(
+    # ISO-8601 / Jekyll: 2020-01-15, 2020/01/15, 2020-01-15T10:30:00.123+02:00, 2020-01-15 10:30:00 +0200
+    r'(?P<iso>(?P<y>\d{4})[-/](?P<m>\d{1,2})[-/](?P<d>\d{1,2})'
+    r'(?:[T ](?P<H>\d{1,2}):(?P<M>\d{2})(?::(?P<S>\d{2})(?:[.,]\d+)?)?)?'
+    r'\s*(?P<tz>Z|[+-]\d{2}:?\d{2})?)'
+    # Day first: 15/01/2020
+    r'|(?P<dmy>(?P<d2>\d{1,2})/(?P<m2>\d{1,2})/(?P<y2>\d{4}))'
+    # RFC-2822 (WXR pubDate): Wed, 15 Jan 2020 10:30:00 +0000
+    r'|(?P<rfc>(?:[A-Za-z]{3},\s*)?\d{1,2}\s+[A-Za-z]{3}\s+\d{4}\s+\d{1,2}:\d{2}(?::\d{2})?\s+(?:[+-]\d{4}|[A-Za-z]+))'
+    # French: 15 janvier 2020, mercredi 1er avril 2020 à 10h30
+    r'|(?P<fr>(?:[^\W\d_]+\.?,?\s+)?(?P<d3>\d{1,2})(?:er)?\s+(?P<month>[^\W\d_]+)\.?\s+(?P<y3>\d{4})'
+    r'(?:,?\s+(?:à\s+)?(?P<H3>\d{1,2})[:h](?P<M3>\d{2})?)?)',
+    re.IGNORECASE
+)
+
+
+def _format_datetime(dt):
+    """Format as YYYY-MM-DD HH:MM:SS, keeping an explicit UTC offset (Jekyll accepts both)"""
+    if dt.utcoffset() is None:
+        return dt.strftime(DATE_FORMAT)
+    return dt.strftime(DATE_FORMAT + ' %z')
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_string(value):
+    """
+    Classify a date string once and convert it directly
+
+    Returns:
+        str: Normalized date string or None if invalid
+    """
+    match = DATE_PATTERN.fullmatch(value.strip())
+    if not match:
+        return None
+
+    try:
+        if match.group('iso'):
+            dt = datetime(int(match.group('y')), int(match.group('m')), int(match.group('d')),
+                          int(match.group('H') or 0), int(match.group('M') or 0), int(match.group('S') or 0))
+            offset = match.group('tz')
+            if offset and offset != 'Z':
+                # 'Z' stays naive (UTC), as WordPress exports write it
+                sign = -1 if offset[0] == '-' else 1
+                digits = offset[1:].replace(':', '')
+                dt = dt.replace(tzinfo=timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))))
+            return _format_datetime(dt)
+
+        if match.group('dmy'):
+            return datetime(int(match.group('y2')), int(match.group('m2')), int(match.group('d2'))).strftime(DATE_FORMAT)
+
+        if match.group('rfc'):
+            return _format_datetime(parsedate_to_datetime(value.strip()))
+
+        month = FRENCH_MONTHS.get(match.group('month').lower())
+        if month is None:
+            return None
+        dt = datetime(int(match.group('y3')), month, int(match.group('d3')),
+                      int(match.group('H3') or 0), int(match.group('M3') or 0))
+        return dt.strftime(DATE_FORMAT)
+    except (ValueError, TypeError, IndexError):
+        # Impossible values (month 13, bad offset...) or an unparsable RFC-2822 date
+        return None
+
 
 def normalize_date(date_value):
     """
     Normalize date to YYYY-MM-DD HH:MM:SS format
 
+    Strings are matched against a single pattern that identifies their shape
+    (ISO-8601 with optional fractional seconds and offset, day-first, RFC-2822,
+    French month names) and converted without trial parsing; repeated values
+    are memoized. Explicit offsets are kept as a trailing +HHMM.
+
     Args:
         date_value: Date in various formats (string, date object)
 
     Returns:
         str: Normalized date string or None if invalid
     """
+    if isinstance(date_value, str):
+        return _parse_date_string(date_value)
+
     if isinstance(date_value, datetime):
-        return date_value.strftime('%Y-%m-%d %H:%M:%S')
+        return _format_datetime(date_value)
 
-    if isinstance(date_value, str):
-        # Try various date formats
-        formats = [
-            '%Y-%m-%d %H:%M:%S',
-            '%Y-%m-%d',
-            '%Y/%m/%d',
-            '%d/%m/%Y',
-            '%Y-%m-%dT%H:%M:%S',
-            '%Y-%m-%dT%H:%M:%SZ',
-        ]
-
-        for fmt in formats:
-            try:
-                dt = datetime.strptime(date_value, fmt)
-                return dt.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                continue
-
-    # Try parsing datetime object
-    try:
-        if hasattr(date_value, 'strftime'):
-            return date_value.strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        pass
+    # date objects (YAML dates without a time)
+    if hasattr(date_value, 'strftime'):
+        try:
+            return date_value.strftime(DATE_FORMAT)
+        except ValueError:
+            pass
 
     return None
 
 
-def generate_description(body):
-    """
-    Generate description from first paragraph of body content
+DESCRIPTION_LENGTH = 160
 
-    Args:
-        body: Markdown body content
+# A paragraph shorter than this is continued with the next one
+DESCRIPTION_MIN_LENGTH = 80
 
-    Returns:
-        str: Generated description (max 160 chars)
-    """
-    # Remove markdown formatting
-    text = body.strip()
+# Longest element (caption, figure, HTML heading, comment) skipped as a whole;
+# an unclosed one is not searched for past this many characters (the rest of
+# the line of an unclosed comment is dropped)
+DESCRIPTION_SPAN = 2000
 
-    # Remove headers
-    text = re.sub(r'^#{1,6}\s+.*$', '', text, flags=re.MULTILINE)
+# WordPress shortcodes dropped from descriptions; other bracketed text
+# ('[sic]', '[voir plus]') is kept
+DESCRIPTION_SHORTCODES = ('caption', 'wp_caption', 'gallery', 'embed', 'audio', 'video',
+                          'playlist', 'code', 'sourcecode')
 
-    # Remove images
-    text = re.sub(r'!\[.*?\]\(.*?\)', '', text)
+# Markup skipped by generate_description; plain text lies between matches
+DESCRIPTION_TOKEN = re.compile(
+    r'(?P<fence>^(?:```|~~~)[^\n]*\n.*?(?:^(?:```|~~~)[ \t]*$|\Z))'
+    r'|(?P<heading>^#{1,6}\s[^\n]*'
+    rf'|<h(?P<level>[1-6])\b[^>]{{0,{DESCRIPTION_SPAN}}}>.{{0,{DESCRIPTION_SPAN}}}?</h(?P=level)\s*>)'
+    rf'|(?P<caption>\[(?P<block>caption|wp_caption|embed|code|sourcecode)\b.{{0,{DESCRIPTION_SPAN}}}?\[/(?P=block)\]'
+    rf'|<figure\b.{{0,{DESCRIPTION_SPAN}}}?</figure>)'
+    r'|(?P<image>!\[[^\]\n]*\]\([^)\n]*\))'
+    r'|\[(?P<link>[^\]\n]+)\]\([^)\n]*\)'
+    rf'|(?P<tag></?[A-Za-z][^>]{{0,{DESCRIPTION_SPAN}}}>|<!--.{{0,{DESCRIPTION_SPAN}}}?-->|<!--[^\n]*'
+    r'|\[/?(?:' + '|'.join(DESCRIPTION_SHORTCODES) + r')(?![\w-])[^\]\n]*\])'
+    r'|(?P<emphasis>\*{1,3}|_{2,3}|`+)'
+    r'|(?P<paragraph>\n[ \t]*\n\s*)'
+    r'|(?P<space>\s+)',
+    re.MULTILINE | re.DOTALL | re.IGNORECASE
+)
 
-    # Remove links but keep text
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+# End of a sentence, with closing quotes or parentheses, before a space
+SENTENCE_END = re.compile(r'[.!?…]+[»)"”’]*(?=\s)')
 
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
 
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+def generate_description(body):
+    """
+    Generate description from the first paragraph(s) of body content
+
+    The body is tokenized in a single pass that skips headings (Markdown
+    and HTML, with their text), images, captions, figures, HTML tags,
+    WordPress shortcodes, code fences and emphasis markers, keeps link
+    text and decodes entities. Scanning stops as soon
+    as enough text is collected, so the cost does not depend on the length
+    of the post.
 
-    # Get first sentence or 160 chars
-    first_para = text.split('\n\n')[0] if '\n\n' in text else text
+    Args:
+        body: Markdown body content
 
-    # Truncate to 160 chars (SEO best practice)
-    if len(first_para) > 160:
-        description = first_para[:157] + '...'
+    Returns:
+        str: Generated description (max 160 chars; text cut off ends at the
+             last sentence end past 80 chars, else at a word with '...')
+    """
+    parts = []
+    length = 0
+    position = 0
+    truncated = False
+
+    def add(text):
+        nonlocal length
+        text = html.unescape(text).replace('\xa0', ' ')
+        parts.append(text)
+        length += len(text)
+
+    for match in DESCRIPTION_TOKEN.finditer(body):
+        add(body[position:match.start()])
+        position = match.end()
+
+        kind = match.lastgroup
+        if kind == 'link':
+            add(match.group('link'))
+        elif kind == 'paragraph':
+            if length >= DESCRIPTION_MIN_LENGTH:
+                break
+            add(' ')
+        elif kind == 'space':
+            add(' ')
+
+        if length > DESCRIPTION_LENGTH:
+            truncated = True
+            break
     else:
-        description = first_para
+        add(body[position:])
 
-    return description if description else "Article de blog"
+    text = ' '.join(''.join(parts).split())
+
+    if truncated or len(text) > DESCRIPTION_LENGTH:
+        cut = 0
+        for end in SENTENCE_END.finditer(text[:DESCRIPTION_LENGTH + 1]):
+            cut = end.end()
+        if cut >= DESCRIPTION_MIN_LENGTH:
+            text = text[:cut]
+        else:
+            if len(text) > DESCRIPTION_LENGTH - 3:
+                text = text[:DESCRIPTION_LENGTH - 2].rsplit(' ', 1)[0]
+            text = text.rstrip(' ,;:-–—') + '...'
+
+    return text if text else "Article de blog"
 
 
 def serialize_frontmatter(frontmatter):
@@ -240,6 +444,7 @@ def serialize_frontmatter(frontmatter):
     """
     yaml_str = yaml.dump(
         frontmatter,
+        Dumper=SafeDumper,
         default_flow_style=False,
         allow_unicode=True,
         sort_keys=False
@@ -248,7 +453,128 @@ def serialize_frontmatter(frontmatter):
     return f"---\n{yaml_str}---"
 
 
+# Top-level mapping key at the start of a header line (plain or quoted)
+HEADER_KEY = re.compile(r'''^(?:"(?P<dq>[^"\\]*)"|'(?P<sq>[^']*)'|(?P<plain>[A-Za-z0-9_][\w.\- ]*?))[ \t]*:(?:[ \t]|$)''')
+
+
+def _same(a, b):
+    """
+    Equal values of the same type (True == 1 must count as a change)
+
+    An unquoted YAML timestamp (loaded as a datetime) matches the string it
+    reads as, which is what normalize() keeps for it: its line stays as is.
+    """
+    if isinstance(a, datetime) and isinstance(b, str):
+        return str(a) == b
+    return type(a) is type(b) and a == b
+
+
+def _header_blocks(yaml_text):
+    """
+    Split frontmatter YAML into top-level blocks
+
+    Each block is [key, lines]: a key line with its indented or '- '
+    continuation lines, or [None, lines] for blank and comment lines.
+
+    Returns:
+        list: Blocks in order, or None if the structure is not a plain mapping
+    """
+    blocks = []
+    for line in yaml_text.splitlines(keepends=True):
+        if line[:1] in (' ', '\t') or (line.startswith('-') and not line.startswith('---')):
+            # Continuation of the last key (blank/comment lines in between belong to it)
+            while blocks and blocks[-1][0] is None and len(blocks) > 1:
+                blocks[-2][1].extend(blocks.pop()[1])
+            if not blocks or blocks[-1][0] is None:
+                return None
+            blocks[-1][1].append(line)
+        elif not line.strip() or line.startswith('#'):
+            blocks.append([None, [line]])
+        else:
+            match = HEADER_KEY.match(line)
+            if not match:
+                return None
+            key = next(group for group in match.group('dq', 'sq', 'plain') if group is not None)
+            blocks.append([key, [line]])
+
+    keys = [key for key, _ in blocks if key is not None]
+    if len(keys) != len(set(keys)):
+        return None
+    return blocks
+
+
+def _dump_key(key, value):
+    return yaml.dump({key: value}, Dumper=SafeDumper, default_flow_style=False,
+                     allow_unicode=True, sort_keys=False)
+
+
+def patch_frontmatter(header, original, updated):
+    """
+    Rewrite only the changed keys of a raw frontmatter header
+
+    Unchanged keys keep their original text (quoting, line wrapping,
+    comments); changed keys are re-dumped in place, removed keys are
+    dropped and new keys are inserted after the key preceding them in
+    `updated`. The result is re-parsed to check it matches `updated`.
+
+    Args:
+        header: Raw header with '---' delimiters (as in Document.header)
+        original: Dict parsed from that header
+        updated: New frontmatter dict
+
+    Returns:
+        str: Patched header (the same object when nothing changed), or None
+             when the header cannot be patched and must be fully re-dumped
+    """
+    match = FRONTMATTER_PATTERN.match(header)
+    if not match or not isinstance(original, dict):
+        return None
+
+    blocks = _header_blocks(match.group(1) + '\n')
+    if blocks is None or {key for key, _ in blocks if key is not None} != set(map(str, original)):
+        return None
+
+    if original.keys() == updated.keys() and all(_same(original[key], updated[key]) for key in updated):
+        return header
+
+    # Keep, replace or drop existing keys in their original order
+    output = []
+    for key, lines in blocks:
+        if key is None:
+            output.append([None, lines])
+        elif key in updated:
+            if _same(original[key], updated[key]):
+                output.append([key, lines])
+            else:
+                output.append([key, [_dump_key(key, updated[key])]])
+
+    # Insert new keys after their predecessor in the updated order
+    previous = None
+    for key in updated:
+        if key not in original:
+            position = 0
+            for index, (block_key, _) in enumerate(output):
+                if block_key is not None and block_key == previous:
+                    position = index + 1
+                    break
+            output.insert(position, [key, [_dump_key(key, updated[key])]])
+        previous = key
+
+    yaml_text = ''.join(''.join(lines) for _, lines in output)
+    reparsed = load_frontmatter(yaml_text)
+    if (not isinstance(reparsed, dict) or reparsed.keys() != updated.keys()
+            or not all(_same(reparsed[key], updated[key]) for key in updated)):
+        return None
+
+    return header[:match.start(1)] + yaml_text.rstrip('\n') + header[match.end(1):]
+
+
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test Post
@@ -258,6 +584,6 @@ categories: test
 
 This is a test post content."""
 
-    normalized, results = normalize(sample)
+    doc, results = normalize(Document.parse(sample))
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
@@ -5,263 +5,355 @@ Ensures proper heading hierarchy and formatting in markdown
 """
 
 import re
+import html
+import unicodedata
 from typing import Tuple, Dict, List
 
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 4
 
-def normalize(content: str) -> Tuple[str, Dict]:
+ATX_HEADING = re.compile(r'(#{1,6})[ \t]+(\S.*)')
+SETEXT_UNDERLINE = re.compile(r'(=+|-+)[ \t]*')
+
+# Posts with fewer headings get no outline in their frontmatter
+MIN_OUTLINE_HEADINGS = 2
+
+# Explicit kramdown header ID at the end of a heading: '## Title {#title}'
+HEADER_ID = re.compile(r'\s*\{#([A-Za-z][\w:-]*)\}\s*$')
+CLOSING_HASHES = re.compile(r'\s+#+\s*$')
+
+# Inline markup removed from heading titles
+INLINE_MARKUP = re.compile(r'!\[[^\]]*\]\([^)]*\)|\[([^\]]*)\]\([^)]*\)|<[^>]+>|`+|\*+|(?<!\w)_+|_+(?!\w)')
+
+# Letters NFKD does not decompose
+LIGATURES = str.maketrans({'œ': 'oe', 'Œ': 'Oe', 'æ': 'ae', 'Æ': 'Ae', 'ß': 'ss'})
+
+# Regions whose lines are never headings (see utils/blocks.py)
+BLOCK_KINDS = frozenset(('fence', 'html'))
+
+# Lines that cannot be the text of a Setext heading
+NOT_SETEXT_TEXT = re.compile(r'\s*(?:[-*+>]\s|\d+[.)]\s|#|<|\||`{3}|~{3})')
+
+
+def normalize(doc: "Document") -> Tuple["Document", Dict]:
     """
     Normalize headings in markdown content
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (body is updated in place)
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Separate frontmatter from body
-    frontmatter, body = extract_frontmatter(content)
-
-    if not body:
+    if not doc.body:
         results['issues'].append("No body content found")
         results['status'] = 'error'
-        return content, results
-
-    original_body = body
-
-    # 1. Convert Setext headings to ATX style
-    body, setext_count = convert_setext_to_atx(body)
-    if setext_count > 0:
-        results['changes'].append(f"Converted {setext_count} Setext headings to ATX style")
-
-    # 2. Remove H1 headings from body (title should be in frontmatter)
-    body, h1_count = remove_h1_from_body(body)
-    if h1_count > 0:
-        results['warnings'].append(f"Removed {h1_count} H1 heading(s) from body (title is in frontmatter)")
-
-    # 3. Fix heading hierarchy (no skipped levels)
-    body, hierarchy_fixes = fix_heading_hierarchy(body)
-    if hierarchy_fixes:
-        results['changes'].append(f"Fixed heading hierarchy: {hierarchy_fixes} adjustments")
-
-    # 4. Ensure proper spacing around headings
-    body, spacing_fixes = normalize_heading_spacing(body)
-    if spacing_fixes > 0:
-        results['changes'].append(f"Normalized spacing around {spacing_fixes} headings")
-
-    # 5. Check for duplicate headings (warning only)
-    duplicate_headings = find_duplicate_headings(body)
+        return doc, results
+
+    if not doc.has('heading', 'setext', 'h1'):
+        # No heading of any style: nothing to convert, fix or check
+        results['skipped'].extend(['setext', 'h1', 'hierarchy', 'spacing', 'duplicates', 'anchors'])
+        _set_outline(doc, [], results)
+        results['status'] = 'success'
+        return doc, results
+
+    doc.body, stats = normalize_headings(doc.body, doc.blocks())
+
+    # 1. Setext headings converted to ATX style
+    if stats['setext']:
+        results['changes'].append(f"Converted {stats['setext']} Setext headings to ATX style")
+        results['counts']['setext_converted'] = stats['setext']
+
+    # 2. H1 headings removed from body (title should be in frontmatter)
+    if stats['h1']:
+        results['warnings'].append(f"Removed {stats['h1']} H1 heading(s) from body (title is in frontmatter)")
+        results['counts']['h1_removed'] = stats['h1']
+
+    # 3. Heading hierarchy fixed (no skipped levels)
+    if stats['hierarchy']:
+        results['changes'].append(f"Fixed heading hierarchy: {stats['hierarchy']} adjustments")
+        results['counts']['hierarchy_fixed'] = stats['hierarchy']
+
+    # 4. Blank lines added around headings
+    if stats['spacing']:
+        results['changes'].append(f"Normalized spacing around {stats['spacing']} headings")
+        results['counts']['spacing_fixed'] = stats['spacing']
+
+    # 5. Duplicate headings (warning only; their anchors get a suffix)
+    duplicate_headings = stats['duplicates']
     if duplicate_headings:
         results['warnings'].append(f"Found {len(duplicate_headings)} duplicate heading(s): {', '.join(duplicate_headings[:3])}")
+        results['counts']['duplicate_headings'] = len(duplicate_headings)
 
-    # Reconstruct content
-    normalized_content = frontmatter + body if frontmatter else body
+    # 6. Explicit anchors on headings
+    if stats['anchors']:
+        results['changes'].append(f"Added anchors to {stats['anchors']} heading(s)")
+        results['counts']['anchors_added'] = stats['anchors']
 
-    results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
+    # 7. Outline for the table of contents
+    _set_outline(doc, stats['outline'], results)
 
+    results['status'] = 'success' if not results['issues'] else 'warning'
+    return doc, results
 
-def extract_frontmatter(content: str) -> Tuple[str, str]:
-    """
-    Extract frontmatter and body from markdown content
 
-    Returns:
-        tuple: (frontmatter_with_delimiters, body_content)
-    """
-    pattern = r'^(---\s*\n.*?\n---\s*\n\n)(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
+def _is_heading(line: str) -> bool:
+    match = ATX_HEADING.match(line)
+    return bool(match) and len(match.group(1)) >= 2
 
-    if match:
-        return match.group(1), match.group(2)
-    return '', content
 
-
-def convert_setext_to_atx(body: str) -> Tuple[str, int]:
+def normalize_headings(body: str, blocks: "BlockIndex") -> Tuple[str, Dict]:
     """
-    Convert Setext-style headings to ATX style
+    Normalize all headings in a single pass over the lines
 
-    Setext examples:
-        Heading 1
-        =========
+    One state machine handles, line by line:
+    - Setext headings (text + === / --- underline) become ATX
+    - H1 headings are removed (the title is in frontmatter)
+    - Skipped levels are fixed; a heading keeps its place in the outline,
+      so its sub-headings shift together with it
+    - A blank line is ensured before and after each heading
+    - Duplicate heading texts are collected (not modified)
 
-        Heading 2
-        ---------
+    Every heading then gets an explicit anchor ('## Titre {#titre}'), and
+    the headings are returned as a nested outline (see build_outline).
 
-    ATX equivalents:
-        # Heading 1
-        ## Heading 2
+    Lines inside fenced code blocks and raw HTML blocks (<pre>, comments,
+    ...) are copied unchanged; blocks is the body's index (see utils/blocks.py).
 
     Returns:
-        tuple: (converted_body, count_of_conversions)
+        tuple: (normalized_body, stats) where stats has the counts
+               'setext', 'h1', 'hierarchy', 'spacing', 'anchors' and the lists
+               'duplicates' and 'outline'
     """
-    count = 0
-
-    # H1: Line followed by ===
-    def replace_h1(match):
-        nonlocal count
-        count += 1
-        return f"# {match.group(1).strip()}"
-
-    body = re.sub(r'^(.+)\n=+\s*$', replace_h1, body, flags=re.MULTILINE)
+    stats = {'setext': 0, 'h1': 0, 'hierarchy': 0, 'spacing': 0, 'anchors': 0,
+             'duplicates': [], 'outline': []}
 
-    # H2: Line followed by ---
-    def replace_h2(match):
-        nonlocal count
-        count += 1
-        return f"## {match.group(1).strip()}"
+    lines = body.split('\n')
+    out = []
+    outline = []               # Stack of (original_level, fixed_level)
+    seen = set()
+    headings = []              # (index in out, fixed_level, text) of each kept heading
+    blank_after = False        # Last emitted line is a heading that needs a blank line after
+    drop_blanks = False        # Swallow blank lines left behind by a removed H1
+
+    def emit(line):
+        nonlocal blank_after, drop_blanks
+        if not line.strip():
+            if drop_blanks:
+                return
+            blank_after = False
+        elif blank_after:
+            out.append('')
+            stats['spacing'] += 1
+            blank_after = False
+        drop_blanks = False
+        out.append(line)
+
+    def emit_heading(level, text, original):
+        nonlocal blank_after, drop_blanks
+        # Place in the outline: siblings share a level, children sit one below their parent
+        while outline and outline[-1][0] >= level:
+            outline.pop()
+        fixed = outline[-1][1] + 1 if outline else min(level, 3)
+        outline.append((level, fixed))
+
+        line = original if fixed == level and original is not None else f"{'#' * fixed} {text}"
+        if fixed != level:
+            stats['hierarchy'] += 1
+
+        if out and out[-1].strip() and not _is_heading(out[-1]):
+            out.append('')
+            stats['spacing'] += 1
+        blank_after = False
+        drop_blanks = False
+        headings.append((len(out), fixed, text))
+        out.append(line)
+        blank_after = True
+
+        key = text.strip().lower()
+        if key in seen and text.strip() not in stats['duplicates']:
+            stats['duplicates'].append(text.strip())
+        seen.add(key)
+
+    # Start offset of each line, to look lines up in the block index
+    has_blocks = any(region.kind in BLOCK_KINDS for region in blocks.regions)
+    offsets = []
+    if has_blocks:
+        offset = 0
+        for line in lines:
+            offsets.append(offset)
+            offset += len(line) + 1
+
+    index = 0
+    count = len(lines)
+    while index < count:
+        line = lines[index]
+
+        # Code and raw HTML blocks: copied verbatim
+        region = has_blocks and blocks.region_at(offsets[index], BLOCK_KINDS)
+        if region:
+            if region.start == offsets[index]:
+                emit(line)
+            else:
+                out.append(line)
+            index += 1
+            continue
+
+        # Setext heading: text line followed by an underline
+        if index + 1 < count and line.strip() and not NOT_SETEXT_TEXT.match(line):
+            underline = SETEXT_UNDERLINE.fullmatch(lines[index + 1])
+            if underline and not (has_blocks and blocks.protected(offsets[index + 1], BLOCK_KINDS)):
+                stats['setext'] += 1
+                if underline.group(1)[0] == '=':
+                    stats['h1'] += 1
+                    drop_blanks = not out or not out[-1].strip()
+                else:
+                    emit_heading(2, line.strip(), None)
+                index += 2
+                continue
+
+        atx = ATX_HEADING.match(line)
+        if atx:
+            level = len(atx.group(1))
+            if level == 1:
+                stats['h1'] += 1
+                drop_blanks = not out or not out[-1].strip()
+            else:
+                emit_heading(level, atx.group(2), line)
+            index += 1
+            continue
+
+        emit(line)
+        index += 1
+
+    # Anchors, once every heading is known: explicit IDs are reserved first
+    taken = set()
+    for _, _, text in headings:
+        explicit = HEADER_ID.search(text)
+        if explicit:
+            taken.add(explicit.group(1))
+
+    entries = []
+    for position, level, text in headings:
+        explicit = HEADER_ID.search(text)
+        if explicit:
+            anchor = explicit.group(1)
+        else:
+            anchor = unique_anchor(slugify(heading_title(text)), taken)
+            out[position] = f"{'#' * level} {CLOSING_HASHES.sub('', text).strip()} {{#{anchor}}}"
+            stats['anchors'] += 1
+        entries.append((level, heading_title(text), anchor))
 
-    body = re.sub(r'^(.+)\n-+\s*$', replace_h2, body, flags=re.MULTILINE)
+    if len(entries) >= MIN_OUTLINE_HEADINGS:
+        stats['outline'] = build_outline(entries)
 
-    return body, count
+    return '\n'.join(out), stats
 
 
-def remove_h1_from_body(body: str) -> Tuple[str, int]:
+def heading_title(text: str) -> str:
     """
-    Remove H1 headings from body (title should be in frontmatter only)
+    Plain text of a heading: inline markup, closing hashes and ID removed
 
     Returns:
-        tuple: (body_without_h1, count_removed)
+        str: Title as shown in a table of contents
     """
-    # Find all H1 headings
-    h1_pattern = r'^# [^\n]+\n?'
-    h1_matches = re.findall(h1_pattern, body, flags=re.MULTILINE)
-    count = len(h1_matches)
-
-    if count > 0:
-        # Remove H1 headings
-        body = re.sub(h1_pattern, '', body, flags=re.MULTILINE)
-        # Clean up any resulting multiple blank lines
-        body = re.sub(r'\n{3,}', '\n\n', body)
-
-    return body, count
+    text = CLOSING_HASHES.sub('', HEADER_ID.sub('', text))
+    text = INLINE_MARKUP.sub(lambda match: match.group(1) or '', text)
+    return ' '.join(html.unescape(text).split())
 
 
-def fix_heading_hierarchy(body: str) -> Tuple[str, int]:
+def slugify(text: str) -> str:
     """
-    Fix heading hierarchy to ensure no skipped levels
-    (e.g., H2 → H4 should become H2 → H3)
+    ASCII anchor slug: accents folded ('Été' -> 'ete'), other characters
+    turned into single hyphens
+
+    kramdown IDs must start with a letter, so other slugs get a 'section-' prefix.
 
     Returns:
-        tuple: (fixed_body, count_of_fixes)
+        str: Slug (never empty)
     """
-    # Extract all headings with their levels
-    heading_pattern = r'^(#{2,6})\s+(.+)$'
-    headings = []
-
-    for match in re.finditer(heading_pattern, body, re.MULTILINE):
-        level = len(match.group(1))
-        text = match.group(2)
-        start, end = match.span()
-        headings.append({
-            'level': level,
-            'text': text,
-            'start': start,
-            'end': end,
-            'original': match.group(0)
-        })
-
-    if not headings:
-        return body, 0
-
-    # Determine correct levels
-    fixes = 0
-    current_level = 2  # Start at H2 (H1 is title)
-    replacements = []
-
-    for heading in headings:
-        expected_level = current_level
-        actual_level = heading['level']
-
-        # If heading jumps more than 1 level, adjust it
-        if actual_level > current_level + 1:
-            expected_level = current_level + 1
-            new_heading = f"{'#' * expected_level} {heading['text']}"
-            replacements.append((heading['original'], new_heading))
-            fixes += 1
-            current_level = expected_level
-        elif actual_level <= current_level:
-            current_level = actual_level
-        else:
-            current_level = actual_level
+    folded = unicodedata.normalize('NFKD', text.translate(LIGATURES))
+    folded = folded.encode('ascii', 'ignore').decode('ascii').lower()
+    slug = re.sub(r'[^a-z0-9]+', '-', folded).strip('-')
+    if not slug[:1].isalpha():
+        slug = f"section-{slug}" if slug else 'section'
+    return slug
 
-    # Apply replacements
-    for old, new in replacements:
-        body = body.replace(old, new, 1)
 
-    return body, fixes
-
-
-def normalize_heading_spacing(body: str) -> Tuple[str, int]:
+def unique_anchor(slug: str, taken: set) -> str:
     """
-    Ensure headings have blank line before and after
-    (except at start of document or before/after other headings)
+    Reserve a slug, adding -1, -2, ... when it is already used in the post
 
     Returns:
-        tuple: (normalized_body, count_of_fixes)
+        str: Anchor not in taken (added to it)
     """
-    lines = body.split('\n')
-    normalized_lines = []
-    fixes = 0
-
-    for i, line in enumerate(lines):
-        is_heading = re.match(r'^#{2,6}\s+', line)
-        prev_line = lines[i-1] if i > 0 else ''
-        next_line = lines[i+1] if i < len(lines)-1 else ''
-
-        is_prev_heading = re.match(r'^#{2,6}\s+', prev_line)
-        is_next_heading = re.match(r'^#{2,6}\s+', next_line)
-
-        if is_heading:
-            # Add blank line before heading (if not at start and prev isn't blank or heading)
-            if i > 0 and prev_line.strip() and not is_prev_heading:
-                if not normalized_lines or normalized_lines[-1].strip():
-                    normalized_lines.append('')
-                    fixes += 1
-
-            normalized_lines.append(line)
-
-            # Add blank line after heading (if next isn't blank or heading)
-            if i < len(lines)-1 and next_line.strip() and not is_next_heading:
-                # Check if next iteration would add a line
-                if i+1 < len(lines) and lines[i+1].strip():
-                    normalized_lines.append('')
-                    fixes += 1
-        else:
-            normalized_lines.append(line)
-
-    return '\n'.join(normalized_lines), fixes
+    anchor = slug
+    suffix = 0
+    while anchor in taken:
+        suffix += 1
+        anchor = f"{slug}-{suffix}"
+    taken.add(anchor)
+    return anchor
 
 
-def find_duplicate_headings(body: str) -> List[str]:
+def build_outline(entries: List[Tuple[int, str, str]]) -> List[Dict]:
     """
-    Find duplicate heading texts (warning only, don't modify)
+    Nest (level, title, anchor) entries by level
 
     Returns:
-        list: Duplicate heading texts
+        list: Top-level items {'title', 'anchor', 'level'}, each with a
+              'children' list when it has sub-headings
     """
-    heading_pattern = r'^#{2,6}\s+(.+)$'
-    headings = re.findall(heading_pattern, body, re.MULTILINE)
+    outline = []
+    stack = []                 # (level, item) of the open parents
+    for level, title, anchor in entries:
+        item = {'title': title, 'anchor': anchor, 'level': level}
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        if stack:
+            stack[-1][1].setdefault('children', []).append(item)
+        else:
+            outline.append(item)
+        stack.append((level, item))
+    return outline
 
-    # Find duplicates
-    seen = set()
-    duplicates = []
 
-    for heading in headings:
-        heading_lower = heading.strip().lower()
-        if heading_lower in seen and heading.strip() not in duplicates:
-            duplicates.append(heading.strip())
-        seen.add(heading_lower)
+def _set_outline(doc: "Document", outline: List[Dict], results: Dict):
+    """Store the outline in the 'outline' frontmatter key (removed when empty)"""
+    if doc.frontmatter is None:
+        if outline:
+            results['warnings'].append("No frontmatter found - outline not stored")
+        return
 
-    return duplicates
+    if (doc.frontmatter.get('outline') or []) == outline:
+        return
+
+    frontmatter = dict(doc.frontmatter)
+    if outline:
+        frontmatter['outline'] = outline
+        results['changes'].append(f"Stored outline of {len(outline)} top-level heading(s) in frontmatter")
+        results['counts']['outline_stored'] = 1
+    else:
+        del frontmatter['outline']
+        results['changes'].append("Removed stale outline from frontmatter")
+    doc.set_frontmatter(frontmatter)
 
 
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test
@@ -284,6 +376,6 @@ Final content.
 ## Duplicate Section
 """
 
-    normalized, results = normalize(sample)
+    doc, results = normalize(Document.parse(sample))
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
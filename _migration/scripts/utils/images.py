@@ -8,76 +8,88 @@ import re
 import os
 import shutil
 from pathlib import Path
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional
 
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 4
 
-def normalize(content: str, filepath: Path) -> Tuple[str, Dict]:
+
+def normalize(doc: "Document", filepath: Path) -> Tuple["Document", Dict]:
     """
     Process images in markdown content
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (body is updated in place)
         filepath: Path to the markdown file being processed
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Separate frontmatter from body
-    frontmatter, body = extract_frontmatter(content)
+    body = doc.body
 
     if not body:
         results['issues'].append("No body content found")
         results['status'] = 'error'
-        return content, results
+        return doc, results
 
     # Extract post slug from filename
     post_slug = filepath.stem.replace('.NORMALIZED', '')
 
     # 1. Extract all image references
-    images = extract_image_urls(body)
+    if doc.has('image'):
+        images = extract_image_urls(body, doc.blocks())
+    else:
+        images = []
+        results['skipped'].append('images')
 
     if not images:
         results['status'] = 'success'
         results['warnings'].append("No images found in content")
-        return content, results
+        return doc, results
 
     # 2. Process each image
     processed_count = 0
     missing_count = 0
     alt_text_added = 0
+    alt_text_indexed = 0
+    replacements = []
 
     for img_match in images:
-        img_markdown = img_match['full']
         img_url = img_match['url']
         img_alt = img_match['alt']
 
-        # Determine source image path (relative to markdown file)
-        source_dir = filepath.parent
-        if img_url.startswith('images/'):
-            # Relative path like images/foo.jpg
-            source_path = source_dir / img_url
-        elif img_url.startswith('./'):
-            source_path = source_dir / img_url[2:]
-        elif img_url.startswith('../'):
-            source_path = source_dir / img_url
-        elif not img_url.startswith('http'):
-            # Assume it's relative
-            source_path = source_dir / img_url
-        else:
-            # External URL - skip
-            continue
+        # Alt text from the attachment index, for any image (external URLs
+        # and missing files too); matched by URL or file name
+        indexed_alt = None
+        if not img_alt.strip() and doc.attachments:
+            record = doc.attachments.find(img_url)
+            if record and record.get('alt'):
+                indexed_alt = ' '.join(record['alt'].replace('[', '').replace(']', '').split())
+
+        # Determine source image path (relative to markdown file); external
+        # URLs keep their path, alt text is still filled in
+        source = local_source(img_url)
+        source_path = filepath.parent / source if source is not None else None
 
         # Check if source image exists
-        if not source_path.exists():
+        if source_path is not None and not source_path.exists():
             results['warnings'].append(f"Image not found: {img_url}")
             missing_count += 1
+            source_path = None
+
+        if source_path is None:
+            if indexed_alt:
+                replacements.append((img_match['start'], img_match['end'], f"![{indexed_alt}]({img_url})"))
+                alt_text_indexed += 1
             continue
 
         # Target: /assets/img/posts/{post-slug}/{filename}
@@ -86,70 +98,109 @@ def normalize(content: str, filepath: Path) -> Tuple[str, Dict]:
         # Update markdown with new path
         new_path = f"/assets/img/posts/{post_slug}/{img_filename}"
 
-        # Generate alt text if missing
+        # Generate alt text if missing: the attachment's, else from the filename
         if not img_alt or img_alt.strip() == '':
-            # Generate from filename
-            alt_text = generate_alt_text(img_filename)
+            if indexed_alt:
+                alt_text = indexed_alt
+                alt_text_indexed += 1
+            else:
+                alt_text = generate_alt_text(img_filename)
+                alt_text_added += 1
             new_markdown = f"![{alt_text}]({new_path})"
-            alt_text_added += 1
         else:
             new_markdown = f"![{img_alt}]({new_path})"
 
-        # Replace in body
-        body = body.replace(img_markdown, new_markdown)
+        # Replace this occurrence (copies inside code are left alone)
+        replacements.append((img_match['start'], img_match['end'], new_markdown))
         processed_count += 1
 
+    if replacements:
+        pieces = []
+        last = 0
+        for start, end, new_markdown in replacements:
+            pieces.append(body[last:start])
+            pieces.append(new_markdown)
+            last = end
+        pieces.append(body[last:])
+        body = ''.join(pieces)
+
     # 3. Report results
     if processed_count > 0:
         results['changes'].append(f"Updated {processed_count} image path(s) to /assets/img/posts/{post_slug}/")
+        results['counts']['image_paths_updated'] = processed_count
 
     if missing_count > 0:
         results['warnings'].append(f"Found {missing_count} missing image(s) - paths updated but files not found")
+        results['counts']['images_missing'] = missing_count
+
+    if alt_text_indexed > 0:
+        results['changes'].append(f"Took alt text for {alt_text_indexed} image(s) from the attachment index")
+        results['counts']['alt_text_indexed'] = alt_text_indexed
 
     if alt_text_added > 0:
         results['changes'].append(f"Generated alt text for {alt_text_added} image(s)")
+        results['counts']['alt_text_generated'] = alt_text_added
 
     results['warnings'].append(f"Note: Images not physically copied - run separate image copy script after normalization")
 
-    # Reconstruct content
-    normalized_content = frontmatter + body if frontmatter else body
+    doc.body = body
 
     results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
+    return doc, results
 
 
-def extract_frontmatter(content: str) -> Tuple[str, str]:
+def local_source(img_url: str) -> Optional[str]:
     """
-    Extract frontmatter and body from markdown content
+    Path of a referenced image relative to the markdown file
 
     Returns:
-        tuple: (frontmatter_with_delimiters, body_content)
+        str or None: Relative path ('images/foo.jpg', '../foo.jpg'), None for an external URL
+    """
+    if img_url.startswith('http'):
+        return None
+    return img_url[2:] if img_url.startswith('./') else img_url
+
+
+def local_sources(doc: "Document", filepath: Path) -> Dict[str, bool]:
     """
-    pattern = r'^(---\s*\n.*?\n---\s*\n\n)(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
+    Local images referenced by a document and whether each exists
 
-    if match:
-        return match.group(1), match.group(2)
-    return '', content
+    The output of this stage depends on these files, so the cache records
+    them with the stage (see utils/cache.py).
+
+    Returns:
+        dict: Path relative to the markdown file -> True if the file exists
+    """
+    if not doc.has('image'):
+        return {}
+    sources = {}
+    for img_match in extract_image_urls(doc.body, doc.blocks()):
+        source = local_source(img_match['url'])
+        if source is not None and source not in sources:
+            sources[source] = (filepath.parent / source).exists()
+    return sources
 
 
-def extract_image_urls(body: str) -> List[Dict]:
+def extract_image_urls(body: str, blocks: "BlockIndex") -> List[Dict]:
     """
-    Extract all image references from markdown
+    Extract all image references from markdown, outside code and raw HTML blocks
 
     Returns:
         list: List of dicts with 'full' (full markdown), 'alt' (alt text), 'url' (image URL)
+              and 'start'/'end' (offsets in body)
     """
     images = []
 
     # Pattern: ![alt text](url)
     pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
 
-    for match in re.finditer(pattern, body):
+    for match in blocks.finditer(pattern, body):
         images.append({
             'full': match.group(0),
             'alt': match.group(1),
-            'url': match.group(2)
+            'url': match.group(2),
+            'start': match.start(),
+            'end': match.end()
         })
 
     return images
@@ -182,6 +233,11 @@ def generate_alt_text(filename: str) -> str:
 
 
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test
@@ -198,9 +254,8 @@ Some text.
 More text.
 """
 
-    from pathlib import Path
     test_path = Path('/tmp/test-post.md')
 
-    normalized, results = normalize(sample, test_path)
+    doc, results = normalize(Document.parse(sample), test_path)
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
@@ -4,44 +4,51 @@ Feature G: Link Checking & Wayback Integration
 Checks external links and replaces broken ones with Wayback Machine archives
 """
 
-import re
 import requests
 from typing import Tuple, Dict, List
 from urllib.parse import urlparse
 
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 2
 
-def normalize(content: str) -> Tuple[str, Dict]:
+
+def normalize(doc: "Document") -> Tuple["Document", Dict]:
     """
     Check and normalize links in markdown content
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (body is updated in place)
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Separate frontmatter from body
-    frontmatter, body = extract_frontmatter(content)
+    body = doc.body
 
     if not body:
         results['issues'].append("No body content found")
         results['status'] = 'error'
-        return content, results
+        return doc, results
 
     # 1. Extract all external links
-    links = extract_external_links(body)
+    if doc.has('link'):
+        links = extract_external_links(body, doc.blocks())
+    else:
+        links = []
+        results['skipped'].append('links')
 
     if not links:
         results['status'] = 'success'
         results['warnings'].append("No external links found")
-        return content, results
+        return doc, results
 
     # 2. Check each link
     checked_count = 0
@@ -58,39 +65,25 @@ def normalize(content: str) -> Tuple[str, Dict]:
 
     # Report results
     results['warnings'].append(f"Found {checked_count} external link(s) - manual verification recommended")
+    results['counts']['external_links'] = checked_count
     results['warnings'].append("Link checking disabled in normalization (use separate validation script)")
 
     # Note about Wayback Machine
     if broken_count > 0:
         results['changes'].append(f"Replaced {replaced_count} broken link(s) with Wayback Machine archives")
+        results['counts']['links_replaced'] = replaced_count
         if replaced_count < broken_count:
             results['warnings'].append(f"{broken_count - replaced_count} broken link(s) have no Wayback archive")
 
-    # Reconstruct content
-    normalized_content = frontmatter + body if frontmatter else body
+    doc.body = body
 
     results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
+    return doc, results
 
 
-def extract_frontmatter(content: str) -> Tuple[str, str]:
+def extract_external_links(body: str, blocks: "BlockIndex") -> List[Dict]:
     """
-    Extract frontmatter and body from markdown content
-
-    Returns:
-        tuple: (frontmatter_with_delimiters, body_content)
-    """
-    pattern = r'^(---\s*\n.*?\n---\s*\n\n)(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
-
-    if match:
-        return match.group(1), match.group(2)
-    return '', content
-
-
-def extract_external_links(body: str) -> List[Dict]:
-    """
-    Extract all external HTTP(S) links from markdown
+    Extract all external HTTP(S) links from markdown, outside code and raw HTML blocks
 
     Returns:
         list: List of dicts with 'full' (full markdown) and 'url'
@@ -100,7 +93,7 @@ def extract_external_links(body: str) -> List[Dict]:
     # Pattern: [text](url)
     pattern = r'\[([^\]]+)\]\((https?://[^)]+)\)'
 
-    for match in re.finditer(pattern, body):
+    for match in blocks.finditer(pattern, body):
         url = match.group(2)
 
         # Filter out common domains that are unlikely to break
@@ -166,6 +159,11 @@ def query_wayback_machine(url: str) -> str:
 
 
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test
@@ -178,6 +176,6 @@ More text with [another link](https://broken-link.example.com/404).
 And [YouTube](https://youtube.com/watch?v=test) which we skip.
 """
 
-    normalized, results = normalize(sample)
+    doc, results = normalize(Document.parse(sample))
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
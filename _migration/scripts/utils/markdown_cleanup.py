@@ -5,373 +5,1136 @@ Cleans up WordPress-specific HTML and formatting issues
 """
 
 import re
-from typing import Tuple, Dict
+import html
+from collections import Counter, namedtuple
+from functools import lru_cache
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Cache version of this stage's output (see utils/cache.py)
+STAGE_VERSION = 8
+
+# Decoded characters written as their plain equivalents
+ENTITY_OVERRIDES = {
+    '\xa0': ' ',     # &nbsp;
+    '…': '...',      # &hellip;
+    '’': "'",        # &rsquo; &#8217;
+    '‘': "'",        # &lsquo; &#8216;
+    '”': '"',        # &rdquo; &#8221;
+    '“': '"',        # &ldquo; &#8220;
+}
+
+# Named entities (html5 also lists legacy spellings without ';', not decoded here)
+NAMED_ENTITIES = {f'&{name}': value for name, value in html5.items() if name.endswith(';')}
+
+# Named, decimal and hex entities
+ENTITY_PATTERN = r'&(?:#[0-9]{1,7}|#[xX][0-9A-Fa-f]{1,6}|[A-Za-z][A-Za-z0-9]{1,31});'
+
+# '&lt;' and '&amp;' (any spelling) whose decoded character would start a tag or another entity
+_LEGACY_NAMES = sorted((name for name in html5 if not name.endswith(';')), key=len, reverse=True)
+LIVE_ENTITY_PATTERN = (
+    r'&(?:(?:lt|LT|#0*60|#[xX]0*3[cC]);(?=[A-Za-z/!?])'
+    r'|(?:amp|AMP|#0*38|#[xX]0*26);(?=#[0-9xX]|[A-Za-z][A-Za-z0-9]{0,31};|' + '|'.join(_LEGACY_NAMES) + '))'
+)
+
+
+@lru_cache(maxsize=4096)
+def decode_entity(entity: str) -> Optional[str]:
+    """
+    Decode one entity ('&eacute;', '&#233;', '&#xE9;'), applying ENTITY_OVERRIDES
 
+    Returns:
+        str or None: Decoded text, or None if entity is not a known entity
+    """
+    value = NAMED_ENTITIES.get(entity)
+    if value is None and entity[1] == '#':
+        hexadecimal = entity[2] in 'xX'
+        code_point = int(entity[3:-1], 16) if hexadecimal else int(entity[2:-1])
+        # html.unescape maps Windows-1252 code points (&#150;) like browsers
+        # do; invalid code points, which it turns into U+FFFD, are left as is
+        value = html.unescape(entity)
+        if value == '\ufffd' and code_point != 0xFFFD:
+            return None
+    if value is None or value == entity:
+        return None
+    return ''.join(ENTITY_OVERRIDES.get(ch, ch) for ch in value)
+
+
+def figure_to_html(text: str, groups: Tuple) -> str:
+    """
+    Convert a <figure> containing a markdown image to an HTML <img> tag
 
-def normalize(content: str) -> Tuple[str, Dict]:
+    Markdown inside HTML tags isn't processed, so we need to convert:
+        <figure>
+        ![alt](/path/to/image.jpg)
+        <figcaption>Caption text</figcaption>
+        </figure>
+
+    To:
+        <figure>
+        <img src="/path/to/image.jpg" alt="alt" class="img-fluid">
+        <figcaption>Caption text</figcaption>
+        </figure>
+    """
+    alt_text, img_url, figcaption = groups
+    html_img = f'<img src="{img_url}" alt="{alt_text}" class="img-fluid">'
+
+    if figcaption:
+        return f'<figure>\n{html_img}\n{figcaption}\n</figure>'
+    else:
+        return f'<figure>\n{html_img}\n</figure>'
+
+
+# A cleanup rule: hits of pattern are replaced by a template (\1 refers to the
+# rule's own groups), by the result of a callable (text, groups) -> str (None
+# keeps the text and is not a hit), or only counted when replace is None.
+# Rules of one phase run in a single combined pass; earlier rules win when
+# several match at the same position. trigger is a prescan trigger
+# (see utils/prescan.py): rules whose trigger is absent are left out.
+#
+# Patterns start with a literal character ('<', '\[', ...) so the combined
+# pattern keeps the regex engine's fast literal search; flags are scoped
+# after it ('<(?i:br...)'). Line rules start with the '\n' ending the
+# previous line instead of '^' (the body's first line is handled too).
+Rule = namedtuple('Rule', 'name phase trigger pattern replace')
+
+RULES = [
+    # Phase 1: entities, decoded once (so '&amp;lt;' stays literal text)
+    Rule('entity_kept', 1, 'entity', LIVE_ENTITY_PATTERN, None),
+    Rule('entity', 1, 'entity', ENTITY_PATTERN, lambda text, groups: decode_entity(text)),
+
+    # Phase 2: HTML tags
+    Rule('br', 2, 'br_p', r'<(?i:br\s*/?>)', '\n'),
+    Rule('empty_p', 2, 'br_p', r'<(?i:p>\s*</p>)', ''),
+    Rule('p_tag', 2, 'br_p', r'<(?i:/?p>)', ''),
+
+    # Phase 3: figures (after <p> removal; shortcodes are left to convert_shortcodes)
+    Rule('figure', 3, 'figure',
+         r'<(?s:figure>\s*!\[([^\]]*)\]\(([^)]+)\)\s*(<figcaption>.*?</figcaption>)?\s*</figure>)',
+         figure_to_html),
+    # Escaped brackets are only counted: unescaping could break legitimate escapes
+    Rule('escaped_bracket', 3, 'escape', r'\\[\[\]]', None),
+
+    # Phase 4: layout (after <br> became newlines and HTML was converted)
+    Rule('bullet_star', 4, 'bullet', r'\n([ \t]*)\*[ \t]+(?=\S)(?!(?:\*[ \t]*)+(?:\n|\Z))', r'\n\1- '),
+    Rule('bullet_plus', 4, 'bullet', r'\n([ \t]*)\+[ \t]+(?=\S)', r'\n\1- '),
+    # The last newline is left for a list item on the next line
+    Rule('blank_lines', 4, 'blank_lines', r'\n\n\n+(?=\n)', '\n\n'),
+]
+
+RULES_BY_NAME = {rule.name: rule for rule in RULES}
+
+# HTML is converted to markdown (convert_html) before this phase
+LAYOUT_PHASE = 4
+
+# How rule hits are reported: (step, rules, count key, change message)
+REPORTS = [
+    ('entities', ('entity',), 'entities_decoded', "Decoded {} HTML entities (&nbsp;, &amp;, etc.)"),
+    ('html_tags', ('br', 'empty_p', 'p_tag'), 'html_tags_cleaned', "Cleaned up {} HTML tags (<br>, <p>, etc.)"),
+    ('figures', ('figure',), 'figures_converted', "Converted {} figure tags with markdown images to HTML"),
+    ('escapes', ('escaped_bracket',), 'escapes_fixed', "Fixed {} unnecessary escape sequences"),
+    ('lists', ('bullet_star', 'bullet_plus'), 'list_items_normalized', "Normalized {} list items"),
+    ('blank_lines', ('blank_lines',), 'blank_lines_removed', "Removed {} excessive blank lines"),
+]
+
+
+def normalize(doc: "Document") -> Tuple["Document", Dict]:
     """
     Clean up markdown content
 
     Args:
-        content: Full markdown file content as string
+        doc: Document shared by all stages (body is updated in place)
 
     Returns:
-        tuple: (normalized_content, results_dict)
+        tuple: (document, results_dict)
     """
     results = {
         'status': 'pending',
         'changes': [],
         'issues': [],
-        'warnings': []
+        'warnings': [],
+        'counts': {},
+        'skipped': []
     }
 
-    # Separate frontmatter from body
-    frontmatter, body = extract_frontmatter(content)
-
-    if not body:
+    if not doc.body:
         results['issues'].append("No body content found")
         results['status'] = 'error'
-        return content, results
-
-    # 1. Remove HTML entities
-    body, entity_count = remove_html_entities(body)
-    if entity_count > 0:
-        results['changes'].append(f"Removed {entity_count} HTML entities (&nbsp;, &amp;, etc.)")
-
-    # 2. Remove/fix HTML tags
-    body, tag_count = cleanup_html_tags(body)
-    if tag_count > 0:
-        results['changes'].append(f"Cleaned up {tag_count} HTML tags (<br>, <p>, etc.)")
-
-    # 3. Fix WordPress caption tags
-    body, caption_count = fix_wordpress_captions(body)
-    if caption_count > 0:
-        results['changes'].append(f"Converted {caption_count} WordPress captions to markdown")
-
-    # 3b. Fix figure tags with markdown images (convert to HTML)
-    body, figure_count = fix_figure_markdown_images(body)
-    if figure_count > 0:
-        results['changes'].append(f"Converted {figure_count} figure tags with markdown images to HTML")
-
-    # 4. Fix escaped characters
-    body, escape_count = fix_escaped_characters(body)
-    if escape_count > 0:
-        results['changes'].append(f"Fixed {escape_count} unnecessary escape sequences")
-
-    # 5. Normalize list formatting
-    body, list_fixes = normalize_lists(body)
-    if list_fixes > 0:
-        results['changes'].append(f"Normalized {list_fixes} list items")
-
-    # 6. Remove excessive blank lines
-    body, blank_line_fixes = remove_excessive_blank_lines(body)
-    if blank_line_fixes > 0:
-        results['changes'].append(f"Removed {blank_line_fixes} excessive blank lines")
-
-    # 7. Convert WordPress shortcodes (if any)
-    body, shortcode_count = convert_wordpress_shortcodes(body)
-    if shortcode_count > 0:
-        results['changes'].append(f"Converted {shortcode_count} WordPress shortcodes")
-        results['warnings'].append("Review converted shortcodes manually")
-
-    # Reconstruct content
-    normalized_content = frontmatter + body if frontmatter else body
+        return doc, results
+
+    # 1. Apply the rules whose triggers are present, one combined pass per phase
+    hits, active = apply_rules(doc, [rule for rule in RULES if rule.phase < LAYOUT_PHASE])
+
+    # 2. Convert WordPress shortcodes, all of them in one pass
+    if doc.has('shortcode'):
+        converted, kept = convert_shortcodes(doc)
+        results['shortcode_hits'] = dict(converted)
+        if converted['caption']:
+            results['changes'].append(f"Converted {converted['caption']} WordPress captions to markdown")
+            results['counts']['captions_converted'] = converted['caption']
+        others = Counter({name: count for name, count in converted.items() if name != 'caption'})
+        if others:
+            details = ', '.join(f"{count} {name}" for name, count in others.most_common())
+            results['changes'].append(f"Converted {sum(others.values())} WordPress shortcodes ({details})")
+            results['counts']['shortcodes_converted'] = sum(others.values())
+        if converted['gallery'] and GALLERY_NOTE in doc.body:
+            results['warnings'].append("Review converted shortcodes manually (galleries not expanded from the attachment index)")
+        if kept:
+            details = ', '.join(f"{count} {name}" for name, count in kept.most_common())
+            results['warnings'].append(f"Kept {sum(kept.values())} WordPress shortcodes that could not be converted ({details})")
+            results['counts']['shortcodes_kept'] = sum(kept.values())
+    else:
+        results['skipped'].append('shortcodes')
+
+    # 3. Convert remaining HTML markup (<strong>, <a>, <ul>, <table>, ...) to markdown
+    if doc.has('html'):
+        converted, kept = convert_html(doc)
+        results['html_hits'] = dict(converted)
+        if converted:
+            details = ', '.join(f"{count} {kind}" for kind, count in converted.most_common())
+            results['changes'].append(f"Converted {sum(converted.values())} HTML elements to markdown ({details})")
+            results['counts']['html_converted'] = sum(converted.values())
+        if kept:
+            results['warnings'].append(f"Kept {sum(kept.values())} HTML elements that markdown cannot express (unclosed, spanning cells, ...)")
+            results['counts']['html_kept'] = sum(kept.values())
+    else:
+        results['skipped'].append('html')
+
+    layout_hits, layout_active = apply_rules(doc, [rule for rule in RULES if rule.phase >= LAYOUT_PHASE])
+    hits.update(layout_hits)
+    active |= layout_active
+    results['rule_hits'] = dict(hits)
+
+    # 4. Report hits per step
+    for step, names, key, message in REPORTS:
+        if not any(name in active for name in names):
+            results['skipped'].append(step)
+            continue
+        count = sum(hits[name] for name in names)
+        if count > 0:
+            results['changes'].append(message.format(count))
+            results['counts'][key] = count
+
+    if hits['entity_kept']:
+        results['warnings'].append(f"Kept {hits['entity_kept']} escaped '<'/'&' that would otherwise become live HTML")
+        results['counts']['entities_kept'] = hits['entity_kept']
 
     results['status'] = 'success' if not results['issues'] else 'warning'
-    return normalized_content, results
-
+    return doc, results
 
-def extract_frontmatter(content: str) -> Tuple[str, str]:
-    """
-    Extract frontmatter and body from markdown content
 
-    Returns:
-        tuple: (frontmatter_with_delimiters, body_content)
-    """
-    pattern = r'^(---\s*\n.*?\n---\s*\n\n)(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
+# Leading literal of a pattern: a plain character or an escape like '\[' or '\n',
+# not followed by a quantifier
+LEAD = re.compile(r'(\\[^A-Za-z0-9]|\\[nt]|[^\\.^$*+?{}\[\]|()])(?![*+?{])')
 
-    if match:
-        return match.group(1), match.group(2)
-    return '', content
 
-
-def remove_html_entities(body: str) -> Tuple[str, int]:
+def _handler(replace, outer: int, size: int):
     """
-    Remove/replace common HTML entities
+    Build the function computing a rule's replacement from a combined-pass match
 
-    Returns:
-        tuple: (cleaned_body, count_of_replacements)
-    """
-    count = 0
-    entities = {
-        '&nbsp;': ' ',
-        '&amp;': '&',
-        '&lt;': '<',
-        '&gt;': '>',
-        '&quot;': '"',
-        '&apos;': "'",
-        '&hellip;': '...',
-        '&mdash;': '—',
-        '&ndash;': '–',
-        '&rsquo;': "'",
-        '&lsquo;': "'",
-        '&rdquo;': '"',
-        '&ldquo;': '"',
-    }
+    The rule's own groups are numbered from outer + 1 in the combined pattern.
+    """
+    if replace is None:
+        return lambda match: match.group(0)
 
-    for entity, replacement in entities.items():
-        occurrences = body.count(entity)
-        if occurrences > 0:
-            body = body.replace(entity, replacement)
-            count += occurrences
+    if callable(replace):
+        indexes = range(outer + 1, outer + 1 + size)
+        return lambda match: replace(match.group(0), tuple(match.group(i) for i in indexes))
 
-    # Also handle numeric entities like &#8217;
-    numeric_entity_pattern = r'&#\d+;'
-    numeric_matches = re.findall(numeric_entity_pattern, body)
-    if numeric_matches:
-        count += len(numeric_matches)
-        # Replace common numeric entities
-        body = re.sub(r'&#8217;', "'", body)  # Right single quote
-        body = re.sub(r'&#8216;', "'", body)  # Left single quote
-        body = re.sub(r'&#8220;', '"', body)  # Left double quote
-        body = re.sub(r'&#8221;', '"', body)  # Right double quote
-        body = re.sub(r'&#8211;', '–', body)  # En dash
-        body = re.sub(r'&#8212;', '—', body)  # Em dash
+    if '\\' not in replace:
+        return lambda match: replace
 
-    return body, count
+    # Shift group references to the rule's place in the combined pattern
+    template = re.sub(r'\\(\d+)|\\g<(\d+)>',
+                      lambda ref: f'\\g<{int(ref.group(1) or ref.group(2)) + outer}>', replace)
+    return lambda match: match.expand(template)
 
 
-def cleanup_html_tags(body: str) -> Tuple[str, int]:
+@lru_cache(maxsize=None)
+def compile_rules(names: Tuple[str, ...]):
     """
-    Remove or clean up HTML tags
+    Combine rules into one alternation of named groups
+
+    Rules sharing a leading literal are grouped behind it ('<(?:(?P<br>...)|
+    (?P<p_tag>...))'), so every alternative of the combined pattern starts
+    with a literal and the engine can skip ahead to candidate positions.
 
     Returns:
-        tuple: (cleaned_body, count_of_replacements)
+        tuple: (compiled_pattern, handlers by rule name, True if a rule starts with '\\n')
     """
-    count = 0
-
-    # Remove <br>, <br/>, <br />
-    br_pattern = r'<br\s*/?>'
-    br_count = len(re.findall(br_pattern, body, re.IGNORECASE))
-    if br_count > 0:
-        body = re.sub(br_pattern, '\n', body, flags=re.IGNORECASE)
-        count += br_count
+    groups = {}
+    for name in names:
+        pattern = RULES_BY_NAME[name].pattern
+        lead = LEAD.match(pattern)
+        if lead:
+            groups.setdefault(lead.group(1), []).append((name, pattern[lead.end():]))
+        else:
+            groups[None, name] = [(name, pattern)]
+
+    parts = []
+    for lead, members in groups.items():
+        alternation = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in members)
+        if isinstance(lead, tuple):
+            parts.append(alternation)
+        elif len(members) == 1:
+            parts.append(lead + alternation)
+        else:
+            parts.append(f'{lead}(?:{alternation})')
+    combined = re.compile('|'.join(parts))
 
-    # Remove empty <p> tags
-    empty_p_pattern = r'<p>\s*</p>'
-    empty_p_count = len(re.findall(empty_p_pattern, body, re.IGNORECASE))
-    if empty_p_count > 0:
-        body = re.sub(empty_p_pattern, '', body, flags=re.IGNORECASE)
-        count += empty_p_count
+    handlers = {}
+    for name in names:
+        rule = RULES_BY_NAME[name]
+        handlers[name] = _handler(rule.replace, combined.groupindex[name], re.compile(rule.pattern).groups)
+    return combined, handlers, '\\n' in groups
 
-    # Remove standalone <p> and </p> tags (but keep content)
-    p_tag_pattern = r'</?p>'
-    p_tag_count = len(re.findall(p_tag_pattern, body, re.IGNORECASE))
-    if p_tag_count > 0:
-        body = re.sub(p_tag_pattern, '', body, flags=re.IGNORECASE)
-        count += p_tag_count
 
-    return body, count
+def apply_rules(doc: "Document", rules: List[Rule] = RULES) -> Tuple[Counter, set]:
+    """
+    Apply rules to the document body, one combined pass per phase
 
+    Triggers are checked against the body as each phase starts, since
+    earlier phases can create matches (<br> removal leaves blank lines).
+    Code and raw HTML blocks are skipped (see utils/blocks.py). Hits are
+    counted from match.lastgroup, so adding a rule to a phase adds no pass
+    over the body. Passes run on the linear-time engine when it is
+    available and supports the phase's patterns (see utils/safety.py).
 
-def fix_wordpress_captions(body: str) -> Tuple[str, int]:
+    Returns:
+        tuple: (Counter of hits per rule name, set of rule names that ran)
     """
-    Convert WordPress [caption] shortcodes to markdown
-
-    Example:
-        [caption id="..." width="..." caption="Photo of cat"]
-        ![](image.jpg)
-        [/caption]
+    hits = Counter()
+    active = set()
+    for phase in sorted({rule.phase for rule in rules}):
+        names = tuple(rule.name for rule in rules if rule.phase == phase and doc.has(rule.trigger))
+        if not names:
+            continue
+        active.update(names)
+        pattern, handlers, line_rules = compile_rules(names)
+
+        def dispatch(match):
+            name = match.lastgroup
+            text = handlers[name](match)
+            if text is None:
+                return match.group(0)
+            hits[name] += 1
+            return text
+
+        # Line rules match the newline before a line; the first line has none
+        if line_rules and not doc.body.startswith('\n') and not doc.blocks().protected(0):
+            end = doc.body.find('\n')
+            match = pattern.match('\n' + (doc.body[:end] if end >= 0 else doc.body))
+            if match:
+                doc.body = dispatch(match)[1:] + doc.body[match.end() - 1:]
+
+        doc.body, _ = doc.blocks().sub(pattern, dispatch, doc.body, linear=True)
+    return hits, active
+
+
+# WordPress shortcodes ([caption], [gallery], [embed], ...): one tokenizer pass
+# finds every shortcode tag, a stack pairs them into a tree, and each
+# shortcode is handed to its handler in SHORTCODES with its content already
+# converted. A handler returns the replacement, or None to keep the shortcode.
+
+# Left for galleries that cannot be expanded from the attachment index
+GALLERY_NOTE = '> **Note:** Gallery shortcode removed - add images manually'
+
+# Attribute values like the WordPress attribute parser reads them:
+# name="value", name='value', name=value, or a bare positional value
+SHORTCODE_ATTRIBUTE = re.compile(r'''(?:([\w-]+)\s*=\s*)?(?:"([^"]*)"|'([^']*)'|([^\s"']+))''')
+
+# Values WordPress accepts for boolean attributes (autoplay="on", loop="1")
+TRUE_VALUES = frozenset(('on', '1', 'true', 'yes'))
+
+# Media file extensions, by the include that plays them (see _includes/)
+AUDIO_EXTENSIONS = ('mp3', 'm4a', 'ogg', 'oga', 'wav', 'wma', 'flac')
+VIDEO_EXTENSIONS = ('mp4', 'm4v', 'webm', 'ogv', 'mov', 'wmv', 'flv')
+
+URL = re.compile(r'''https?://[^\s"'<>\[\]()]+''')
+YOUTUBE_URL = re.compile(r'(?:youtube(?:-nocookie)?\.com/(?:watch\?v=|embed/)|youtu\.be/)([\w-]+)')
+VIMEO_URL = re.compile(r'vimeo\.com/(?:video/)?(\d+)')
+TWEET_URL = re.compile(r'(?:twitter|x)\.com/[^/]+/status/\d+')
+
+# Image of a caption: markdown, optionally linked, or an <img> tag, optionally in an <a>
+CAPTION_IMAGE = re.compile(
+    r'(?P<md>(?P<md_link>\[)?!\[(?P<alt>[^\]]*)\]\((?P<src>[^)\s]+)[^)]*\)(?(md_link)\]\((?P<md_href>[^)\s]+)[^)]*\)))'
+    r'|(?P<a><a\s[^>]*>\s*)?(?P<img><img\s[^>]*>)(?(a)\s*</a>)',
+    re.IGNORECASE
+)
+
+
+def _media_path(url: str) -> Optional[str]:
+    """A URL usable as an include path (no quotes, WordPress escapes removed)"""
+    url = url.strip().replace('\\', '')
+    if not url or '"' in url:
+        return None
+    return url
+
+
+def _extension(url: str) -> str:
+    return url.split('?')[0].rsplit('.', 1)[-1].lower()
+
+
+def _media_include(include: str, path: str, attrs: Dict[str, str], extra: Tuple[str, ...] = ()) -> str:
+    """{% include audio.liquid/video.liquid %} line for a media file"""
+    params = [f'path="{path}"']
+    if include == 'video':
+        params.append('class="img-fluid rounded z-depth-1"')
+    for name in extra:
+        value = attrs.get(name, '').replace('"', '')
+        if value:
+            params.append(f'{name}="{value}"')
+    params.append('controls=true')
+    for flag in ('autoplay', 'loop', 'muted'):
+        if attrs.get(flag, '').lower() in TRUE_VALUES:
+            params.append(f'{flag}=true')
+    return f"\n{{% include {include}.liquid {' '.join(params)} %}}\n"
+
+
+def _embed_markdown(url: str) -> Optional[str]:
+    """Markdown for an embedded URL, written like Feature E writes converted embeds"""
+    path = _media_path(url)
+    if not path:
+        return None
+
+    youtube = YOUTUBE_URL.search(path)
+    if youtube:
+        watch = f"https://www.youtube.com/watch?v={youtube.group(1)}"
+        return f"\n> [YouTube Video: {watch}]({watch})\n"
+    vimeo = VIMEO_URL.search(path)
+    if vimeo:
+        page = f"https://vimeo.com/{vimeo.group(1)}"
+        return f"\n> [Vimeo Video: {page}]({page})\n"
+    if TWEET_URL.search(path):
+        return f"\n> [Tweet: {path}]({path})\n"
+
+    extension = _extension(path)
+    if extension in VIDEO_EXTENSIONS:
+        return _media_include('video', path, {})
+    if extension in AUDIO_EXTENSIONS:
+        return _media_include('audio', path, {})
+    return f"\n[{path}]({path})\n"
+
+
+def _image_markdown(alt: str, src: str, caption: str = '', href: Optional[str] = None) -> str:
+    """Markdown image, linked when href is given, with its caption in italics below"""
+    caption = ' '.join(caption.split())
+    alt = ' '.join(alt.split()).replace('[', '').replace(']', '') or caption.replace('[', '').replace(']', '')
+    markdown = f"![{alt}]({src})"
+    if href:
+        markdown = f"[{markdown}]({href})"
+    return f"{markdown}\n*{caption}*" if caption else markdown
+
+
+def caption_shortcode(attrs: Dict[str, str], content: Optional[str], doc: "Document") -> Optional[str]:
+    """
+    [caption]<image> text[/caption] -> the image as markdown, the text in italics below
 
-    Becomes:
-        ![Photo of cat](image.jpg)
+    Older exports put the text in a caption="..." attribute. Images without
+    alt text get the attachment's (id="attachment_123"), or the caption.
+    """
+    if content is None:
+        return None
+    image = CAPTION_IMAGE.search(content)
+    if not image:
+        return None
+
+    if image.group('md'):
+        alt, src, href = image.group('alt'), image.group('src'), image.group('md_href')
+    else:
+        img = _attributes(image.group('img'))
+        alt, src = img.get('alt', ''), img.get('src')
+        href = _attributes(image.group('a').rstrip()).get('href') if image.group('a') else None
+        if not src:
+            return None
+
+    if not alt.strip() and doc.attachments and attrs.get('id'):
+        alt = (doc.attachments.get(attrs['id']) or {}).get('alt', '')
+    text = attrs.get('caption') or content[:image.start()] + ' ' + content[image.end():]
+    return _image_markdown(alt, src, text, href)
+
+
+def gallery_shortcode(attrs: Dict[str, str], content: Optional[str], doc: "Document") -> Optional[str]:
+    """
+    [gallery ids="1,2,3"] -> its images, from the attachment index
 
-    Returns:
-        tuple: (cleaned_body, count_of_conversions)
+    Each image is written like a caption; ids missing from the index are
+    listed in a note. Without an index, or ids, the gallery is replaced by
+    GALLERY_NOTE.
     """
-    count = 0
+    ids = [post_id.strip() for post_id in (attrs.get('ids') or attrs.get('include') or '').split(',')
+           if post_id.strip()]
+    records = [(post_id, doc.attachments.get(post_id)) for post_id in ids] if doc.attachments else []
+    images = [_image_markdown(record.get('alt') or record.get('title', ''), record['url'], record.get('caption', ''))
+              for _, record in records if record]
+    if not images:
+        return f"\n{GALLERY_NOTE}\n"
 
-    # Pattern for WordPress captions
-    # [caption ...]![alt](url)[/caption]
-    caption_pattern = r'\[caption[^\]]*\]\s*!\[([^\]]*)\]\(([^)]+)\)\s*\[/caption\]'
+    missing = [post_id for post_id, record in records if not record]
+    if missing:
+        images.append(f"{GALLERY_NOTE} (not in the attachment index: {', '.join(missing)})")
+    return '\n' + '\n\n'.join(images) + '\n'
 
-    def replace_caption(match):
-        nonlocal count
-        count += 1
-        alt_text = match.group(1)
-        image_url = match.group(2)
-        return f"![{alt_text}]({image_url})"
 
-    body = re.sub(caption_pattern, replace_caption, body, flags=re.IGNORECASE)
+def embed_shortcode(attrs: Dict[str, str], content: Optional[str], doc: "Document") -> Optional[str]:
+    """[embed]url[/embed] -> video/tweet link or media include (see _embed_markdown)"""
+    url = URL.search(content or '') or URL.search(attrs.get('src') or attrs.get('url') or '')
+    return _embed_markdown(url.group(0)) if url else None
 
-    # Also handle captions with caption attribute
-    # [caption caption="Text"]![](url)[/caption]
-    caption_attr_pattern = r'\[caption[^]]*caption=["\']([^"\']+)["\'][^\]]*\]\s*!\[[^\]]*\]\(([^)]+)\)\s*\[/caption\]'
 
-    def replace_caption_attr(match):
-        nonlocal count
-        count += 1
-        caption_text = match.group(1)
-        image_url = match.group(2)
-        return f"![{caption_text}]({image_url})"
+def audio_shortcode(attrs: Dict[str, str], content: Optional[str], doc: "Document") -> Optional[str]:
+    """[audio src="..."] or [audio mp3="..."] -> {% include audio.liquid %}"""
+    sources = [attrs.get('src')] + [attrs.get(extension) for extension in AUDIO_EXTENSIONS]
+    path = _media_path(next((source for source in sources if source), ''))
+    return _media_include('audio', path, attrs) if path else None
 
-    body = re.sub(caption_attr_pattern, replace_caption_attr, body, flags=re.IGNORECASE)
 
-    return body, count
+def video_shortcode(attrs: Dict[str, str], content: Optional[str], doc: "Document") -> Optional[str]:
+    """[video src="..."] or [video mp4="..."] -> {% include video.liquid %}"""
+    sources = [attrs.get('src')] + [attrs.get(extension) for extension in VIDEO_EXTENSIONS]
+    path = _media_path(next((source for source in sources if source), ''))
+    return _media_include('video', path, attrs, ('width', 'height', 'poster')) if path else None
 
 
-def fix_figure_markdown_images(body: str) -> Tuple[str, int]:
+def code_shortcode(attrs: Dict[str, str], content: Optional[str], doc: "Document") -> Optional[str]:
     """
-    Convert <figure> tags containing markdown images to HTML <img> tags
+    [code lang="..."]...[/code] -> fenced code block
 
-    Markdown inside HTML tags isn't processed, so we need to convert:
-        <figure>
-        ![alt](/path/to/image.jpg)
-        <figcaption>Caption text</figcaption>
-        </figure>
+    Entities the 'entity' rule kept because they would have become live
+    HTML are plain characters inside a fence.
+    """
+    if content is None:
+        return None
+    language = re.sub(r'[^\w+#.-]', '', (attrs.get('lang') or attrs.get('language') or '').lower())
+    code = re.sub(ENTITY_PATTERN, lambda match: decode_entity(match.group(0)) or match.group(0),
+                  content.strip('\n'))
+    fence = '```'
+    while fence in code:
+        fence += '`'
+    return f"\n\n{fence}{language}\n{code}\n{fence}\n\n"
+
+
+# Shortcode name -> handler (attrs, content or None when self-closing, document) -> replacement or None
+SHORTCODES = {
+    'caption': caption_shortcode,
+    'gallery': gallery_shortcode,
+    'embed': embed_shortcode,
+    'audio': audio_shortcode,
+    'video': video_shortcode,
+    'code': code_shortcode,
+    'sourcecode': code_shortcode,  # SyntaxHighlighter plugin spelling
+}
+
+# Shortcodes whose content is taken as written: tags inside them are not shortcodes
+RAW_SHORTCODES = frozenset(('code', 'sourcecode'))
+
+# Opening or closing tag of a registered shortcode: ('/', name, attributes)
+SHORTCODE_TAG = re.compile(r'\[(/?)(' + '|'.join(SHORTCODES) + r')(?![\w-])([^\[\]]*)\]', re.IGNORECASE)
+
+
+class _Shortcode:
+    """A shortcode of the body: its tags' offsets and the shortcodes it encloses"""
+
+    __slots__ = ('name', 'attrs', 'start', 'end', 'close_start', 'close_end', 'children')
+
+    def __init__(self, name, attrs, start, end):
+        self.name = name
+        self.attrs = attrs
+        self.start = start
+        self.end = end
+        self.close_start = None
+        self.close_end = end
+        self.children = []
+
+
+def parse_shortcode_attributes(text: str) -> Dict[str, str]:
+    """
+    Attributes of a shortcode tag (the text after its name)
 
-    To:
-        <figure>
-        <img src="/path/to/image.jpg" alt="alt" class="img-fluid">
-        <figcaption>Caption text</figcaption>
-        </figure>
+    Names are lowercased; positional values are stored under '0', '1', ...
 
     Returns:
-        tuple: (converted_body, count_of_conversions)
+        dict: name -> value
     """
-    count = 0
-
-    # Pattern to match <figure> with markdown image
-    # Handles optional blank lines and whitespace
-    figure_pattern = r'<figure>\s*!\[([^\]]*)\]\(([^)]+)\)\s*(<figcaption>.*?</figcaption>)?\s*</figure>'
-
-    def replace_figure(match):
-        nonlocal count
-        alt_text = match.group(1)
-        img_url = match.group(2)
-        figcaption = match.group(3) if match.group(3) else ''
-
-        count += 1
-
-        # Build HTML img tag
-        html_img = f'<img src="{img_url}" alt="{alt_text}" class="img-fluid">'
-
-        if figcaption:
-            return f'<figure>\n{html_img}\n{figcaption}\n</figure>'
+    attrs = {}
+    position = 0
+    for match in SHORTCODE_ATTRIBUTE.finditer(text):
+        value = next(group for group in match.groups()[1:] if group is not None)
+        if match.group(1):
+            attrs.setdefault(match.group(1).lower(), value)
         else:
-            return f'<figure>\n{html_img}\n</figure>'
-
-    body = re.sub(figure_pattern, replace_figure, body, flags=re.DOTALL)
+            attrs[str(position)] = value
+            position += 1
+    return attrs
 
-    return body, count
 
+def parse_shortcodes(doc: "Document") -> List[_Shortcode]:
+    """
+    Pair the shortcode tags of the body's free text into a tree
 
-def fix_escaped_characters(body: str) -> Tuple[str, int]:
-    r"""
-    Remove unnecessary escape characters
-
-    Common issues:
-    - Escaped brackets: \[ \]
-    - Escaped underscores: \_ (but keep in certain contexts)
+    A closing tag closes the innermost open shortcode of its name; shortcodes
+    opened inside it and never closed are self-closing ([gallery], [audio]),
+    and what followed them moves up to their parent. Stray closing tags and
+    escaped shortcodes ('[[gallery]]') are text.
 
     Returns:
-        tuple: (cleaned_body, count_of_fixes)
+        list: Top-level _Shortcode nodes in body order
     """
-    count = 0
-
-    # Count and remove unnecessary escapes
-    # Escaped brackets that aren't part of links
-    escaped_bracket_pattern = r'\\([\[\]])'
-    escaped_brackets = re.findall(escaped_bracket_pattern, body)
-    if escaped_brackets:
-        count += len(escaped_brackets)
-        # Only unescape if not part of a link pattern
-        # This is conservative - we keep the escapes
-        # Could be more aggressive if needed
-
-    # Note: Being conservative here to avoid breaking legitimate escapes
-    # Can be expanded based on actual issues found in testing
-
-    return body, count
-
-
-def normalize_lists(body: str) -> Tuple[str, int]:
+    body = doc.body
+    roots = []
+    stack = []
+
+    def unwind(depth):
+        while len(stack) > depth:
+            node = stack.pop()
+            (stack[-1].children if stack else roots).extend(node.children)
+            node.children = []
+
+    for match in doc.blocks().finditer(SHORTCODE_TAG, body):
+        closing, name, attributes = match.groups()
+        name = name.lower()
+        if stack and stack[-1].name in RAW_SHORTCODES and not (closing and name == stack[-1].name):
+            continue
+        if match.start() > 0 and body[match.start() - 1] == '[' and body.startswith(']', match.end()):
+            continue
+
+        if closing:
+            depth = next((i for i in range(len(stack) - 1, -1, -1) if stack[i].name == name), None)
+            if depth is not None:
+                unwind(depth + 1)
+                node = stack.pop()
+                node.close_start, node.close_end = match.span()
+            continue
+
+        self_closing = attributes.rstrip().endswith('/')
+        node = _Shortcode(name, parse_shortcode_attributes(attributes.rstrip().rstrip('/')),
+                          match.start(), match.end())
+        (stack[-1].children if stack else roots).append(node)
+        if not self_closing:
+            stack.append(node)
+
+    unwind(0)
+    return roots
+
+
+def convert_shortcodes(doc: "Document") -> Tuple[Counter, Counter]:
     """
-    Normalize list formatting
+    Convert the WordPress shortcodes of the body with their SHORTCODES handlers
 
-    Issues to fix:
-    - Inconsistent spacing before/after lists
-    - Mixed bullet styles (*, -, +)
-    - Inconsistent indentation
+    The body is scanned once for all shortcodes (see parse_shortcodes);
+    enclosed shortcodes are converted before the one enclosing them. Code
+    and raw HTML blocks are left alone (see utils/blocks.py).
 
     Returns:
-        tuple: (normalized_body, count_of_fixes)
+        tuple: (Counter of converted shortcodes, Counter of shortcodes kept as written)
     """
-    count = 0
+    body = doc.body
+    converted = Counter()
+    kept = Counter()
+
+    def splice(nodes, start, end):
+        pieces = []
+        pos = start
+        for node in nodes:
+            pieces.append(body[pos:node.start])
+            pieces.append(render(node))
+            pos = node.close_end
+        pieces.append(body[pos:end])
+        return ''.join(pieces)
+
+    def render(node):
+        content = None
+        if node.close_start is not None:
+            content = splice(node.children, node.end, node.close_start)
+        text = SHORTCODES[node.name](node.attrs, content, doc)
+        if text is None:
+            kept[node.name] += 1
+            if content is None:
+                return body[node.start:node.end]
+            return body[node.start:node.end] + content + body[node.close_start:node.close_end]
+        converted[node.name] += 1
+        return text
+
+    roots = parse_shortcodes(doc)
+    if roots:
+        text = splice(roots, 0, len(body))
+        if converted:
+            doc.body = text
+    return converted, kept
+
+
+# HTML elements converted to markdown (see HTMLConverter)
+INLINE_MARKERS = {'strong': '**', 'b': '**', 'em': '*', 'i': '*'}
+HEADING_LEVELS = {f'h{level}': level for level in range(2, 7)}  # H1s are Feature B's
+TABLE_SECTIONS = frozenset(('thead', 'tbody', 'tfoot'))
+
+# Elements copied with their content as written: code is Feature D's, embeds
+# are Feature E's (so are blockquotes with a class, like twitter-tweet), and
+# kramdown does not read markdown inside other block-level HTML
+RAW_ELEMENTS = frozenset(('pre', 'code', 'iframe', 'figure', 'script', 'style', 'textarea',
+                          'object', 'video', 'audio', 'svg', 'math',
+                          'div', 'section', 'article', 'aside', 'header', 'footer', 'nav',
+                          'center', 'dl', 'form', 'fieldset', 'details'))
+
+# Element kinds converted to markdown blocks, and the ones that can contain them
+BLOCK_KINDS = frozenset(('heading', 'blockquote', 'list', 'table'))
+BLOCK_PARENTS = frozenset(('root', 'blockquote', 'item'))
+
+# Element kinds that end at a paragraph break or a block when left open
+SPAN_KINDS = frozenset(('emphasis', 'link', 'heading'))
+
+# Element kinds whose own content is structure: only whitespace and these children
+CONTAINERS = {'list': ('li',), 'table': ('tr',), 'row': ('td', 'th')}
+
+# Attribute values as written: html.parser unescapes them, but entities were
+# already decoded by the 'entity' rule ('?a=1&copy=2' must stay as is)
+ATTRIBUTE = re.compile(r'''([^\s/>"'=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+)))?''')
+
+# Indentation of HTML source lines, meaningless once converted
+SOURCE_INDENT = re.compile(r'\n[ \t]+')
+
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+
+class _Element:
+    """An element open in HTMLConverter: its converted content and its source text"""
+
+    __slots__ = ('tag', 'kind', 'start', 'parts', 'raw', 'rows', 'depth', 'invalid',
+                 'after_block', 'converted')
+
+    def __init__(self, tag, kind, start):
+        self.tag = tag
+        self.kind = kind
+        self.start = start
+        self.parts = []
+        self.raw = [start]
+        self.rows = []
+        self.depth = 1
+        self.invalid = False
+        self.after_block = False
+        self.converted = Counter()
+
+
+class _SpanParser(HTMLParser):
+    """
+    Locates the constructs of a text: tags, text runs, references, comments
 
-    # Standardize bullet markers to -
-    bullet_patterns = [
-        (r'^(\s*)\*\s+', r'\1- '),   # * to -
-        (r'^(\s*)\+\s+', r'\1- '),   # + to -
-    ]
+    html.parser calls a handler at the start of every construct it
+    consumes, and getpos() points at that start while the handler runs;
+    text runs up to the next construct, a tag to its closing '>'.
+    """
 
-    for pattern, replacement in bullet_patterns:
-        matches = re.findall(pattern, body, re.MULTILINE)
-        if matches:
-            count += len(matches)
-            body = re.sub(pattern, replacement, body, flags=re.MULTILINE)
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.marks = []
 
-    return body, count
+    def _mark(self, event=None, tag=None, length=None):
+        line, column = self.getpos()
+        self.marks.append((line, column, event, tag, length))
 
+    def handle_starttag(self, tag, attrs):
+        self._mark('start', tag, len(self.get_starttag_text()))
 
-def remove_excessive_blank_lines(body: str) -> Tuple[str, int]:
-    """
-    Remove excessive consecutive blank lines (max 2)
+    def handle_endtag(self, tag):
+        self._mark('end', tag)
 
-    Returns:
-        tuple: (cleaned_body, count_of_fixes)
-    """
-    # Count how many times we have 3+ consecutive blank lines
-    excessive_pattern = r'\n{4,}'
-    excessive_matches = re.findall(excessive_pattern, body)
-    count = len(excessive_matches)
+    # Everything else is copied as text: self-closing tags, text, references, comments
+    def handle_startendtag(self, tag, attrs):
+        self._mark()
 
-    if count > 0:
-        # Replace 3+ blank lines with 2 blank lines (3 newlines)
-        body = re.sub(r'\n{4,}', '\n\n\n', body)
+    def handle_data(self, data):
+        self._mark()
 
-    return body, count
+    handle_entityref = handle_charref = handle_comment = handle_decl = handle_pi = unknown_decl = handle_data
 
 
-def convert_wordpress_shortcodes(body: str) -> Tuple[str, int]:
+def _html_spans(text: str) -> Iterator[Tuple[Optional[str], Optional[str], str]]:
     """
-    Convert common WordPress shortcodes to Jekyll/markdown equivalents
+    Split text into its HTML constructs, in order and byte for byte
 
-    Returns:
-        tuple: (converted_body, count_of_conversions)
+    Yields:
+        tuple: (event, tag, source) where event is 'start', 'end' or None for text
+    """
+    parser = _SpanParser()
+    parser.feed(text)
+    parser.close()
+
+    line_starts = [0]
+    line_starts.extend(match.end() for match in re.finditer('\n', text))
+    # Markup consumed without a handler call ('</>') is text, like what
+    # follows a tag up to the next construct
+    marks = [(0, None, None, 0)]
+    for line, column, event, tag, length in parser.marks:
+        start = line_starts[line - 1] + column
+        if event == 'end':
+            length = text.find('>', start) + 1 - start
+        marks.append((start, event, tag, length))
+    line, column = parser.getpos()
+    # Unclosed <script>/<style> content is held back by html.parser: it is text
+    marks.append((line_starts[line - 1] + column, None, None, 0))
+    marks.append((len(text), None, None, 0))
+
+    for (start, event, tag, length), (end, _, _, _) in zip(marks, marks[1:]):
+        if event is None:
+            if start < end:
+                yield None, None, text[start:end]
+            continue
+        yield event, tag, text[start:start + length]
+        if start + length < end:
+            yield None, None, text[start + length:end]
+
+
+class HTMLConverter:
+    """
+    Streaming HTML to markdown conversion of WordPress markup
+
+    Bold/italic, links, h2-h6 headings, lists, blockquotes and simple
+    tables are converted when they close. Anything else, and any of these
+    that is unclosed or cannot be written in markdown (a table cell
+    spanning columns, emphasis across paragraphs), is copied as written.
+    Each open element only buffers its own content, so memory is bounded
+    by the largest open element, not by the post.
+
+    The converter works from the source spans of the constructs (see
+    _html_spans) rather than from parsed data, so text, entities and
+    unknown markup come out byte for byte. Each run of free text gets a
+    fresh parser; open elements carry over from one run to the next.
+
+    Attributes:
+        converted: Counter of converted elements by kind
+        kept: Counter of known elements left as HTML
     """
-    count = 0
 
-    # [gallery] shortcode - convert to note
-    gallery_pattern = r'\[gallery[^\]]*\]'
-    gallery_matches = re.findall(gallery_pattern, body, re.IGNORECASE)
-    if gallery_matches:
-        count += len(gallery_matches)
-        body = re.sub(gallery_pattern, '\n> **Note:** Gallery shortcode removed - add images manually\n', body, flags=re.IGNORECASE)
+    def __init__(self):
+        self.root = _Element(None, 'root', '')
+        self.stack = [self.root]
+        self.kept = Counter()
+
+    @property
+    def converted(self) -> Counter:
+        return self.root.converted
+
+    def convert(self, text: str):
+        """Convert a run of free text (open elements carry over to the next run)"""
+        for event, tag, source in _html_spans(text):
+            if event is None:
+                self._text(source)
+            elif event == 'start':
+                self._start(tag, source)
+            else:
+                self._end(tag, source)
+
+    def verbatim(self, text: str):
+        """Copy protected text (code, raw HTML blocks) into the current element"""
+        self._append(self.stack[-1], text, text)
+
+    def finish(self) -> str:
+        """
+        Close the elements still open (they are kept as HTML)
+
+        Returns:
+            str: Converted text
+        """
+        while len(self.stack) > 1:
+            self._close(self.stack.pop(), '', None)
+        if self.root.after_block:
+            self.root.parts.append('\n')
+        return ''.join(self.root.parts)
+
+    def _append(self, element, text, raw):
+        if element.kind != 'root':
+            element.raw.append(raw)
+        if element.kind in CONTAINERS:
+            if text.strip():
+                element.invalid = True
+            return
+        if element.after_block and text:
+            stripped = text.lstrip(' \t\n')
+            if not stripped:
+                return
+            element.parts.append('\n' if element.kind == 'item' else '\n\n')
+            element.after_block = False
+            text = stripped
+        element.parts.append(text)
+
+    def _text(self, text):
+        element = self.stack[-1]
+        if element.kind in SPAN_KINDS:
+            paragraph = PARAGRAPH_BREAK.search(text)
+            if paragraph:
+                self._text(text[:paragraph.start()])
+                self._close_spans()
+                self._text(text[paragraph.start():])
+                return
+        if element.kind not in ('root', 'raw'):
+            text = SOURCE_INDENT.sub('\n', text)
+        self._append(element, text, text)
+
+    def _close_spans(self):
+        """Close the inline elements and headings left open (they are kept as HTML)"""
+        while self.stack[-1].kind in SPAN_KINDS:
+            self._close(self.stack.pop(), '', None)
+
+    def _start(self, tag, text):
+        element = self.stack[-1]
+        if element.kind == 'raw':
+            if tag == element.tag:
+                element.depth += 1
+            self._append(element, text, text)
+            return
+
+        # Omitted end tags: <li> closes the previous item, <tr> the previous row
+        if tag == 'li' and element.kind == 'item' \
+                or tag in ('td', 'th', 'tr') and element.kind == 'cell' \
+                or tag == 'tr' and element.kind == 'row':
+            self._close(self.stack.pop(), '', True)
+            return self._start(tag, text)
+
+        if element.kind == 'table' and tag in TABLE_SECTIONS:
+            element.raw.append(text)
+            return
+
+        kind = self._kind(tag, text, element)
+        if kind in BLOCK_KINDS and element.kind in SPAN_KINDS:
+            self._close_spans()
+            element = self.stack[-1]
+        if element.kind in CONTAINERS and tag not in CONTAINERS[element.kind]:
+            element.invalid = True
+        if kind is None:
+            self._append(element, text, text)
+        else:
+            self.stack.append(_Element(tag, kind, text))
+
+    def _kind(self, tag, text, parent):
+        """Kind of element a start tag opens, or None for a tag copied as is"""
+        if tag in RAW_ELEMENTS or tag == 'blockquote' and 'class' in _attributes(text):
+            return 'raw'
+        if tag in INLINE_MARKERS:
+            return 'emphasis'
+        if tag == 'a':
+            return 'link' if _attributes(text).get('href') else None
+        if tag in HEADING_LEVELS:
+            return 'heading'
+        if tag == 'blockquote':
+            return 'blockquote'
+        if tag in ('ul', 'ol'):
+            return 'list'
+        if tag == 'table':
+            return 'table'
+        if tag == 'li' and parent.kind == 'list':
+            return 'item'
+        if tag == 'tr' and parent.kind == 'table':
+            return 'row'
+        if tag in ('td', 'th') and parent.kind == 'row':
+            return 'cell'
+        return None
+
+    def _end(self, tag, text):
+        element = self.stack[-1]
+        if element.kind == 'raw':
+            if tag == element.tag:
+                element.depth -= 1
+                if not element.depth:
+                    self.stack.pop()
+                    self._close(element, text, False)
+                    return
+            self._append(element, text, text)
+            return
+
+        if element.kind == 'table' and tag in TABLE_SECTIONS:
+            element.raw.append(text)
+            return
+
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                break
+        else:
+            if element.kind in CONTAINERS:
+                element.invalid = True
+            self._append(element, text, text)
+            return
+
+        # Elements left open inside: items, rows and cells may omit their end tag
+        while len(self.stack) - 1 > index:
+            inner = self.stack.pop()
+            self._close(inner, '', inner.kind in ('item', 'row', 'cell'))
+        self._close(self.stack.pop(), text, True)
+
+    def _close(self, element, end, convert):
+        """Hand a closed element to its parent, converted or as written"""
+        element.raw.append(end)
+        parent = self.stack[-1]
+        result = None
+        if convert and not element.invalid:
+            result = self._render(element, parent)
+
+        if result is None:
+            if element.kind in ('emphasis', 'link'):
+                # Span-level HTML: markdown converted inside it still applies
+                source = element.start + ''.join(element.parts) + end
+                if element.converted:
+                    parent.converted.update(element.converted)
+            else:
+                source = ''.join(element.raw)
+            if element.kind not in ('raw', 'item', 'row', 'cell'):
+                self.kept[element.kind] += 1
+            if parent.kind in CONTAINERS:
+                parent.invalid = True
+            self._append(parent, source, source)
+            return
+
+        text, block = result
+        if element.converted:
+            parent.converted.update(element.converted)
+        if element.kind in ('item', 'row', 'cell'):
+            parent.raw.append(''.join(element.raw))
+            parent.rows.append(text)
+            return
+        parent.converted[element.kind] += 1
+        if not block:
+            self._append(parent, text, ''.join(element.raw))
+            return
+
+        parent.raw.append(''.join(element.raw))
+        if parent.kind not in BLOCK_PARENTS:
+            # Blocks cannot be nested in table cells
+            parent.invalid = True
+        parts = parent.parts
+        while parts and not parts[-1].strip():
+            parts.pop()
+        if parts:
+            parts[-1] = parts[-1].rstrip()
+            parts.append('\n' if parent.kind == 'item' else '\n\n')
+        parts.append(text)
+        parent.after_block = True
+
+    def _render(self, element, parent):
+        """
+        Markdown for a closed element
+
+        Returns:
+            tuple or None: (text, True if it is a block), None if it stays HTML
+        """
+        kind = element.kind
+        content = ''.join(element.parts)
+        core = content.strip()
+        if kind in ('emphasis', 'link', 'heading', 'cell') and PARAGRAPH_BREAK.search(core):
+            return None
+
+        if kind == 'emphasis':
+            if not core:
+                return content, False
+            marker = INLINE_MARKERS[element.tag]
+            lead = content[:len(content) - len(content.lstrip())]
+            trail = content[len(content.rstrip()):]
+            return f'{lead}{marker}{core}{marker}{trail}', False
+
+        if kind == 'link':
+            if not core:
+                return None
+            attributes = _attributes(element.start)
+            href = attributes['href'].strip()
+            if re.search(r'[\s()<>]', href):
+                href = f'<{href}>'
+            title = attributes.get('title')
+            title = f' "{title}"' if title and '"' not in title else ''
+            lead = content[:len(content) - len(content.lstrip())]
+            trail = content[len(content.rstrip()):]
+            return f'{lead}[{core}]({href}{title}){trail}', False
+
+        if kind == 'heading':
+            text = ' '.join(core.split())
+            if not text:
+                return None
+            anchor = _attributes(element.start).get('id')
+            suffix = f' {{#{anchor}}}' if anchor and re.fullmatch(r'[A-Za-z][\w:-]*', anchor) else ''
+            return '#' * HEADING_LEVELS[element.tag] + f' {text}{suffix}', True
+
+        if kind == 'blockquote':
+            if not core:
+                return None
+            return '\n'.join(f'> {line}' if line.strip() else '>' for line in core.split('\n')), True
+
+        if kind == 'item':
+            return core, False
+
+        if kind == 'list':
+            if not element.rows:
+                return None
+            start = _attributes(element.start).get('start', '1') if element.tag == 'ol' else ''
+            number = int(start) if start.isdigit() else 1
+            lines = []
+            for offset, item in enumerate(element.rows):
+                marker = f'{number + offset}. ' if element.tag == 'ol' else '- '
+                indent = ' ' * len(marker)
+                first, *rest = item.split('\n')
+                lines.append((marker + first).rstrip())
+                lines.extend(indent + line if line.strip() else '' for line in rest)
+            return '\n'.join(lines), True
+
+        if kind == 'cell':
+            if re.search(r'\b(?:col|row)span\s*=', element.start, re.IGNORECASE):
+                return None
+            return ' '.join(core.split()).replace('|', '\\|'), False
+
+        if kind == 'row':
+            return element.rows, False
+
+        if kind == 'table':
+            rows = [row for row in element.rows if row]
+            if not rows:
+                return None
+            width = max(len(row) for row in rows)
+            lines = ['| ' + ' | '.join(row + [''] * (width - len(row))) + ' |' for row in rows]
+            lines.insert(1, '|' + ' --- |' * width)
+            return '\n'.join(lines), True
+
+        return None
+
+
+def _attributes(start_tag: str) -> Dict[str, str]:
+    """Attributes of a start tag, lowercased names -> values as written"""
+    name_end = re.match(r'<[^\s/>]*', start_tag).end()
+    attributes = {}
+    for match in ATTRIBUTE.finditer(start_tag, name_end, len(start_tag) - 1):
+        value = next((group for group in match.groups()[1:] if group is not None), '')
+        attributes.setdefault(match.group(1).lower(), value)
+    return attributes
+
+
+def convert_html(doc: "Document") -> Tuple[Counter, Counter]:
+    """
+    Convert the HTML markup of the body's free text to markdown
 
-    # [embed] shortcode - will be handled by Feature E
-    # Just count them here for awareness
-    embed_pattern = r'\[embed[^\]]*\]'
-    embed_matches = re.findall(embed_pattern, body, re.IGNORECASE)
-    if embed_matches:
-        # Don't increment count - Feature E will handle this
-        pass
+    Code and raw HTML blocks are copied unchanged (see utils/blocks.py).
 
-    return body, count
+    Returns:
+        tuple: (Counter of converted elements, Counter of elements kept as HTML)
+    """
+    body = doc.body
+    converter = HTMLConverter()
+    pos = 0
+    for start, end in doc.blocks().segments():
+        if start > pos:
+            converter.verbatim(body[pos:start])
+        converter.convert(body[start:end])
+        pos = end
+    if pos < len(body):
+        converter.verbatim(body[pos:])
+
+    text = converter.finish()
+    if converter.converted:
+        doc.body = text
+    return converter.converted, converter.kept
 
 
 if __name__ == '__main__':
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
     # Test with sample content
     sample = """---
 title: Test
@@ -388,6 +1151,23 @@ With line breaks.<br/>
 
 [caption caption="A cat"]![](cat.jpg)[/caption]
 
+[caption id="attachment_12" width="640"]<a href="/big.jpg"><img src="/dog.jpg" alt=""></a> A dog[/caption]
+
+[embed]https://www.youtube.com/watch?v=dQw4w9WgXcQ[/embed]
+
+[audio mp3="/media/interview.mp3" autoplay="on"]
+
+[code lang="python"]
+if a &lt;b and c:
+    print("[gallery]")
+[/code]
+
+Some <strong>bold</strong> and <a href="https://example.com">linked</a> words.
+
+<ul>
+  <li>HTML item</li>
+</ul>
+
 - Item 1
 * Item 2
 + Item 3
@@ -402,6 +1182,6 @@ Blank
 Lines
 """
 
-    normalized, results = normalize(sample)
+    doc, results = normalize(Document.parse(sample))
     print("Results:", results)
-    print("\nNormalized:\n", normalized)
+    print("\nNormalized:\n", doc.serialize())
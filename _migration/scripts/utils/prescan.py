@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Stage Pre-scan
+Cheap substring triggers that decide which normalization steps can apply
+
+A step whose triggers are all absent from the body cannot match anything,
+so it is skipped instead of running its regexes over the whole post.
+Triggers are deliberately loose: a false positive only costs the normal
+regex pass, a false negative would skip a needed fix.
+"""
+
+import re
+from typing import FrozenSet
+
+# Trigger name -> substrings searched in the lowercased body (any one fires).
+# Needles starting with '\n' also match at the very start of the body. A
+# trigger with many needles is a compiled pattern instead: one search starting
+# with a literal costs less than a full scan per needle.
+TRIGGERS = {
+    # Feature B: headings
+    'heading': ('\n##',),
+    'setext': ('\n=', '\n-'),
+    'h1': ('\n# ',),
+    # Feature C: markdown cleanup
+    'entity': ('&',),
+    'br_p': ('<br', '<p'),
+    'figure': ('<figure',),
+    'escape': ('\\[', '\\]'),
+    'bullet': ('* ', '+ ', '*\t', '+\t'),
+    'blank_lines': ('\n\n\n\n',),
+    'shortcode': re.compile(r'\[/?(?:caption|gallery|embed|audio|video|code|sourcecode)\b', re.IGNORECASE),
+    'html': re.compile(r'<(?:strong|em|b|i|a|ul|ol|blockquote|h[2-6]|table)[\s>]', re.IGNORECASE),
+    # Feature D: code blocks
+    'indented': ('\n    ', '\n\t'),
+    'pre': ('<pre',),
+    'tilde': ('\n~~~',),
+    'fence': ('\n```',),
+    # Feature E: embeds
+    'iframe': ('<iframe',),
+    'youtube_url': ('youtu.be/', 'youtube.com/watch'),
+    'tweet': ('twitter-tweet',),
+    'twitter_url': ('twitter.com/', 'x.com/'),
+    'embed': ('<iframe', '[embed', '<embed', '<object'),
+    # Features F/G: images and links
+    'image': ('![',),
+    'link': ('](http',),
+}
+
+
+# Triggers without letters (or ignoring case): lowercasing the body cannot
+# change whether they match
+CASELESS = frozenset(name for name, needles in TRIGGERS.items()
+                     if (all(needle.lower() == needle.upper() for needle in needles)
+                         if isinstance(needles, tuple) else needles.flags & re.IGNORECASE))
+
+
+def contains(lowered: str, name: str) -> bool:
+    """
+    Check one trigger against an already lowercased body (or the body
+    itself, for CASELESS triggers)
+
+    Returns:
+        bool: True if any of the trigger's substrings is present
+    """
+    needles = TRIGGERS[name]
+    if not isinstance(needles, tuple):
+        return needles.search(lowered) is not None
+    for needle in needles:
+        if needle in lowered:
+            return True
+        if needle.startswith('\n') and lowered.startswith(needle[1:]):
+            return True
+    return False
+
+
+def scan(body: str) -> FrozenSet[str]:
+    """
+    Scan a body for every trigger at once
+
+    Returns:
+        frozenset: Names of the triggers present
+    """
+    lowered = body.lower()
+    return frozenset(name for name in TRIGGERS if contains(lowered, name))
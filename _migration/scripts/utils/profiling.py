@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Pipeline Profiling
+Aggregates per-stage wall times and writes Chrome trace files
+"""
+
+import heapq
+import json
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+
+    Returns:
+        float: Value at the given fraction (0.0 - 1.0), 0.0 if empty
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class StageProfiler:
+    """
+    Collect per-stage timings from normalize_post results
+
+    Every stage duration is kept (one float per file and stage) for the
+    percentiles; only the `top` slowest files and file/stage pairs are kept
+    for the detailed listing.
+    """
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.durations = {}
+        self.slowest_files = []
+        self.slowest_stages = []
+
+    def add(self, results: Dict):
+        timings = results.get('timings')
+        if not timings:
+            return
+
+        total = 0.0
+        for stage, timing in timings.items():
+            seconds = timing['seconds']
+            total += seconds
+            self.durations.setdefault(stage, []).append(seconds)
+            self._keep(self.slowest_stages, (seconds, results['file'], stage))
+
+        self._keep(self.slowest_files, (total, results['file']))
+
+    def _keep(self, heap, item):
+        if len(heap) < self.top:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def report(self, say=print):
+        """Print per-stage p50/p95/max and the slowest files and stages"""
+        if not self.durations:
+            say("No stage timings recorded (all stages cached?)")
+            return
+
+        say(f"{'Stage':<18} {'Files':>7} {'Total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for stage, values in self.durations.items():
+            values = sorted(values)
+            say(f"{stage:<18} {len(values):>7} {sum(values):>9.3f} "
+                f"{percentile(values, 0.50) * 1000:>9.2f} "
+                f"{percentile(values, 0.95) * 1000:>9.2f} "
+                f"{values[-1] * 1000:>9.2f}")
+
+        say("\nSlowest files:")
+        for seconds, filename in sorted(self.slowest_files, reverse=True):
+            say(f"  {seconds * 1000:>9.2f} ms  {filename}")
+
+        say("\nSlowest stages:")
+        for seconds, filename, stage in sorted(self.slowest_stages, reverse=True):
+            say(f"  {seconds * 1000:>9.2f} ms  {stage:<18} {filename}")
+
+
+class ChromeTraceWriter:
+    """
+    Stream stage timings as Chrome trace events (chrome://tracing, Perfetto)
+
+    Events are written as they arrive, one complete ('X') event per stage,
+    with one track per worker process.
+    """
+
+    def __init__(self, path: str):
+        self.stream = open(path, 'w', encoding='utf-8')
+        self.stream.write('[\n')
+        self.first = True
+
+    def add(self, results: Dict):
+        for stage, timing in results.get('timings', {}).items():
+            event = {
+                'name': stage,
+                'cat': 'normalize',
+                'ph': 'X',
+                'ts': round(timing['start'] * 1e6, 1),
+                'dur': round(timing['seconds'] * 1e6, 1),
+                'pid': results.get('pid', 0),
+                'tid': 0,
+                'args': {'file': results['file']},
+            }
+            self.stream.write(('' if self.first else ',\n') + json.dumps(event, ensure_ascii=False))
+            self.first = False
+
+    def close(self):
+        self.stream.write('\n]\n')
+        self.stream.close()
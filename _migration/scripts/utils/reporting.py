@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Result Reporting
+Streams per-file normalization results as NDJSON and keeps running totals
+"""
+
+import json
+import sys
+from collections import Counter
+from typing import Dict
+
+
+def compact_record(results: Dict) -> Dict:
+    """
+    Reduce a normalize_post results dict to a compact, machine-readable record
+
+    Per stage only the status, the number of changes/warnings/issues and the
+    structured change codes ('counts') are kept; human-readable messages are
+    dropped except for file-level issues.
+
+    Returns:
+        dict: Record ready for json.dumps
+    """
+    record = {
+        'file': results['file'],
+        'status': results['status'],
+        'output': results.get('output'),
+        'stages': {},
+    }
+
+    for name, feature_results in results['features'].items():
+        record['stages'][name] = {
+            'status': feature_results.get('status'),
+            'changes': len(feature_results.get('changes', [])),
+            'warnings': len(feature_results.get('warnings', [])),
+            'issues': len(feature_results.get('issues', [])),
+            'counts': feature_results.get('counts', {}),
+        }
+        if feature_results.get('skipped'):
+            record['stages'][name]['skipped'] = feature_results['skipped']
+
+    if results.get('timings'):
+        record['timings'] = {stage: round(timing['seconds'], 6) for stage, timing in results['timings'].items()}
+    if results.get('cached'):
+        record['cached'] = results['cached']
+    if results['issues']:
+        record['issues'] = results['issues']
+
+    return record
+
+
+class NDJSONWriter:
+    """Write one JSON record per line to a file or stdout ('-')"""
+
+    def __init__(self, path: str = '-'):
+        if path == '-':
+            self.stream = sys.stdout
+            self.owned = False
+        else:
+            self.stream = open(path, 'w', encoding='utf-8')
+            self.owned = True
+
+    def write(self, results: Dict):
+        self.stream.write(json.dumps(compact_record(results), ensure_ascii=False, separators=(',', ':')))
+        self.stream.write('\n')
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if self.owned:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class RunSummary:
+    """Running totals of file statuses, so results need not be kept in memory"""
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.total = 0
+
+    def add(self, results: Dict):
+        self.statuses[results['status']] += 1
+        self.total += 1
+
+    def count(self, status: str) -> int:
+        return self.statuses[status]
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Regex Safety
+Linear-time pattern engine (when available) and per-file processing deadlines
+
+Python's re backtracks: a lazy '.*?' looking for a closing tag that never
+comes rescans the rest of the body from every opening tag, so one malformed
+export can stall a batch. Patterns compiled with linear=True run on RE2
+(pip install google-re2) when it is installed and supports them; others,
+and every pattern without RE2, stay on re. The deadline is the backstop for
+both: it interrupts a file that runs too long, whatever it is doing.
+"""
+
+import re
+import signal
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+# RE2 guarantees linear-time matching; optional
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+ENGINE = 're2' if re2 else 're'
+
+# re flags with an inline RE2 equivalent
+INLINE_FLAGS = {re.IGNORECASE: 'i', re.DOTALL: 's', re.MULTILINE: 'm'}
+
+
+class Timeout(Exception):
+    """Raised in the processing thread when a deadline expires"""
+
+    def __init__(self, seconds: float):
+        super().__init__(f"Deadline of {seconds:g}s exceeded")
+        self.seconds = seconds
+
+
+@lru_cache(maxsize=None)
+def compile_linear(pattern: str, flags: int = 0):
+    """
+    Compile a pattern with the linear-time engine if possible
+
+    RE2 has no lookarounds or backreferences; patterns using them (or flags
+    without an inline equivalent) silently fall back to re. The returned
+    object supports the re calls made by the stages (finditer, search,
+    match objects with start/end/group/expand).
+
+    Returns:
+        Compiled pattern (RE2 or re)
+    """
+    if re2 is not None:
+        flags &= ~re.UNICODE
+        letters = ''.join(letter for flag, letter in INLINE_FLAGS.items() if flags & flag)
+        if not flags & ~(re.IGNORECASE | re.DOTALL | re.MULTILINE):
+            try:
+                return re2.compile(f'(?{letters}){pattern}' if letters else pattern)
+            except Exception:
+                pass
+    return re.compile(pattern, flags)
+
+
+def deadlines_supported() -> bool:
+    """Deadlines need SIGALRM, delivered to the main thread (POSIX only)"""
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Raise Timeout in the block if it runs longer than seconds
+
+    Uses a real-time interval timer; regex matching checks for signals, so
+    even a single runaway match is interrupted. A no-op when seconds is
+    falsy or deadlines are not supported here; an enclosing timer is
+    restored afterwards.
+
+    Raises:
+        Timeout: When the deadline expires
+    """
+    if not seconds or not deadlines_supported():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise Timeout(seconds)
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    outer, _ = signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        if outer:
+            signal.setitimer(signal.ITIMER_REAL, outer)
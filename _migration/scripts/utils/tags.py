@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Feature H: Tag Inference
+Proposes site tags (_data/tags.yml) from the post body with a single-pass keyword matcher
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+TAGS_PATH = REPO_ROOT / '_data' / 'tags.yml'
+SYNONYMS_PATH = REPO_ROOT / '_migration' / 'tag_synonyms.yml'
+
+# A tag is added once its keywords occur this many times; fewer hits are only proposed
+MIN_TAG_HITS = 2
+
+# Used when a post has no tags and none could be inferred
+DEFAULT_TAG = 'transport'
+
+# Heading anchors added by Feature B ('{#le-tramway}'), not part of the text
+HEADER_ID = re.compile(r'\{#[A-Za-z][\w:-]*\}')
+
+
+def _vocabulary_fingerprint() -> str:
+    digest = hashlib.sha256()
+    for path in (TAGS_PATH, SYNONYMS_PATH):
+        try:
+            digest.update(path.read_bytes())
+        except OSError:
+            digest.update(b'-')
+    return digest.hexdigest()[:12]
+
+
+# Cache version of this stage's output (see utils/cache.py); includes the
+# vocabulary so editing tags.yml or tag_synonyms.yml re-runs the stage
+STAGE_VERSION = f"4-{_vocabulary_fingerprint()}"
+
+
+def _strip_accent(ch: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', ch)
+    return ''.join(part for part in decomposed if not unicodedata.combining(part)) or ch
+
+
+# Accented Latin letters -> base letters, applied with one str.translate call
+ACCENT_TABLE = {code: _strip_accent(chr(code)) for code in range(0x00C0, 0x0250)
+                if _strip_accent(chr(code)) != chr(code)}
+
+
+# Base letter -> character class of its lowercase accented forms ('e' -> '[eéèêë...]')
+ACCENT_CLASSES = {}
+for _code, _base in ACCENT_TABLE.items():
+    if chr(_code).islower() and len(_base) == 1:
+        ACCENT_CLASSES.setdefault(_base, [_base]).append(chr(_code))
+ACCENT_CLASSES = {base: '[' + ''.join(forms) + ']' for base, forms in ACCENT_CLASSES.items()}
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents (keyword lookup key)"""
+    return text.lower().translate(ACCENT_TABLE)
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Build a regex alternation from a prefix trie of the words
+
+    Shared prefixes are factored out, so at each body position the engine
+    follows one branch per character instead of trying every keyword: the
+    cost per position depends on keyword length, not on vocabulary size.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = []
+        for ch in sorted(key for key in node if key):
+            if ch == ' ':
+                atom = r'\s+'
+            else:
+                atom = ACCENT_CLASSES.get(ch) or re.escape(ch)
+            branches.append(atom + build(node[ch]))
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            pattern = ('(?:' + pattern + ')' if len(branches) == 1 else pattern) + '?'
+        return pattern
+
+    return build(trie)
+
+
+class TagMatcher:
+    """
+    One compiled pattern for the whole tag vocabulary
+
+    Keywords are matched on word boundaries, ignoring case and accents,
+    with an optional plural 's'/'x'. Accents are handled by character
+    classes in the pattern, so the body is only lowercased before the
+    single scan; each hit is folded and mapped back to its tag.
+    """
+
+    def __init__(self, vocabulary: Dict[str, List[str]]):
+        self.keywords = {}
+        for tag, words in vocabulary.items():
+            for word in words:
+                key = ' '.join(fold(word).split())
+                if key:
+                    self.keywords.setdefault(key, tag)
+
+        if self.keywords:
+            # Optional trie suffixes are greedy, so 'tramway' wins over 'tram'
+            alternation = _trie_pattern(list(self.keywords))
+            self.pattern = re.compile(rf'(?<!\w)({alternation})[sx]?(?!\w)')
+        else:
+            self.pattern = None
+
+    def count(self, text: str) -> Counter:
+        """
+        Count keyword hits per tag
+
+        Returns:
+            Counter: tag -> number of hits
+        """
+        hits = Counter()
+        if self.pattern is None:
+            return hits
+        for match in self.pattern.finditer(text.lower()):
+            tag = self.keywords.get(' '.join(fold(match.group(1)).split()))
+            if tag:
+                hits[tag] += 1
+        return hits
+
+
+def load_vocabulary(tags_path: Path = TAGS_PATH, synonyms_path: Path = SYNONYMS_PATH) -> Dict[str, List[str]]:
+    """
+    Read site tags and their keywords
+
+    Each tag of tags.yml contributes its key (with '-' read as a space), its
+    fr/en labels and its synonyms; synonyms of unknown tags are ignored.
+
+    Returns:
+        dict: tag -> list of keywords
+    """
+    def read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError):
+            return {}
+
+    vocabulary = {}
+    for tag, labels in read(tags_path).items():
+        words = [str(tag).replace('-', ' ')]
+        if isinstance(labels, dict):
+            words += [str(label) for label in labels.values() if label]
+        vocabulary[str(tag)] = words
+
+    for tag, words in read(synonyms_path).items():
+        if str(tag) in vocabulary and isinstance(words, list):
+            vocabulary[str(tag)] += [str(word) for word in words if word]
+
+    return vocabulary
+
+
+@lru_cache(maxsize=1)
+def default_matcher() -> TagMatcher:
+    """Matcher for the site vocabulary, compiled once per process"""
+    return TagMatcher(load_vocabulary())
+
+
+def infer_tags(text: str, matcher: TagMatcher = None,
+               min_hits: int = MIN_TAG_HITS) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """
+    Infer tags from text
+
+    Returns:
+        tuple: (accepted, proposed) lists of (tag, hits), most hits first
+    """
+    hits = (matcher or default_matcher()).count(text)
+    ranked = hits.most_common()
+    accepted = [(tag, count) for tag, count in ranked if count >= min_hits]
+    proposed = [(tag, count) for tag, count in ranked if count < min_hits]
+    return accepted, proposed
+
+
+def normalize(doc: "Document") -> Tuple["Document", Dict]:
+    """
+    Merge inferred tags into the post's frontmatter tags
+
+    Args:
+        doc: Document shared by all stages (frontmatter and header are updated)
+
+    Returns:
+        tuple: (document, results_dict)
+    """
+    results = {
+        'status': 'pending',
+        'changes': [],
+        'issues': [],
+        'warnings': [],
+        'counts': {},
+        'skipped': []
+    }
+
+    if not doc.frontmatter:
+        results['warnings'].append("No frontmatter found - tags not inferred")
+        results['status'] = 'success'
+        return doc, results
+
+    frontmatter = dict(doc.frontmatter)
+    tags = frontmatter.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+    tags = list(tags)
+
+    # 1. Scan title and body once, skipping code and raw HTML blocks
+    text = ' '.join(doc.body[start:end] for start, end in doc.blocks().segments())
+    text = HEADER_ID.sub('', text)
+    accepted, proposed = infer_tags(f"{frontmatter.get('title') or ''}\n{text}")
+    results['tag_hits'] = dict(accepted + proposed)
+
+    # 2. Merge tags with enough hits
+    added = [(tag, count) for tag, count in accepted if tag not in tags]
+    if added:
+        tags += [tag for tag, _ in added]
+        results['changes'].append("Inferred tags: " + ', '.join(f"{tag} ({count} hits)" for tag, count in added))
+        results['counts']['tags_inferred'] = len(added)
+
+    # 3. Weak matches are only reported
+    weak = [(tag, count) for tag, count in proposed if tag not in tags]
+    if weak:
+        results['warnings'].append("Possible tags: " + ', '.join(f"{tag} ({count} hit{'s' if count > 1 else ''})" for tag, count in weak))
+        results['counts']['tags_proposed'] = len(weak)
+
+    # 4. Never leave a post without tags
+    if not tags:
+        tags = [DEFAULT_TAG]
+        results['changes'].append(f"Set default tag: {DEFAULT_TAG} (nothing inferred)")
+        results['counts']['tags_default'] = 1
+
+    if tags != frontmatter.get('tags'):
+        frontmatter['tags'] = tags
+        doc.set_frontmatter(frontmatter)
+
+    results['status'] = 'success' if not results['issues'] else 'warning'
+    return doc, results
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from utils.document import Document
+
+    # Test with sample content
+    sample = """---
+title: Le tramway de Bordeaux
+tags:
+- urbanisme
+---
+
+Le nouveau tramway remplace deux lignes de bus. Les usagers du métro
+et des vélos partagés y gagnent aussi en mobilité.
+
+Un modèle d'intelligence artificielle prédit les trajets.
+"""
+
+    doc, results = normalize(Document.parse(sample))
+    print("Results:", results)
+    print("\nNormalized:\n", doc.serialize())
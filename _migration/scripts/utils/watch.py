@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Input Watching
+Reports markdown files that changed on disk, via inotify or mtime polling
+
+Both watchers apply the same include/exclude filters as discovery, so
+*.NORMALIZED.md outputs, atomic-write temp files and the hidden cache
+directory never trigger a re-run.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import discovery
+
+# Seconds between two scans of the polling watcher
+POLL_INTERVAL = 1.0
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    """Detect changes by comparing (mtime, size) snapshots of the input set"""
+
+    name = 'polling'
+
+    def __init__(self, root: Path, recursive: bool = True,
+                 include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 interval: float = POLL_INTERVAL):
+        self.root = Path(root)
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for path in discovery.iter_markdown_files(self.root, self.recursive, self.include, self.exclude):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        Wait for changes
+
+        Args:
+            timeout: Seconds to wait at most (None = until something changes)
+
+        Returns:
+            set: New or modified files (empty on timeout)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(wait)
+
+            snapshot = self._scan()
+            changed = {path for path, stamp in snapshot.items() if self.snapshot.get(path) != stamp}
+            self.snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detect changes with Linux inotify (through libc, no extra dependency)
+
+    One watch per directory; directories created later are watched as they
+    appear. A file counts as changed once it is closed after writing or
+    moved into place, which covers editors that save via rename.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, root: Path, recursive: bool = True,
+                 include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+
+        self.root = Path(root)
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+
+        self.directories = {}
+        self._watch_tree(self.root)
+
+    def _accepts(self, path: Path, is_dir: bool) -> bool:
+        return discovery.accepts(self.root, path, is_dir, self.recursive, self.include, self.exclude)
+
+    def _add_watch(self, directory: Path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Cannot watch {directory}: {os.strerror(errno)}")
+        self.directories[wd] = directory
+
+    def _watch_tree(self, top: Path):
+        """Watch a directory and every accepted directory below it"""
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            self._add_watch(directory)
+            if not self.recursive:
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        path = Path(entry.path)
+                        if entry.is_dir(follow_symlinks=False) and self._accepts(path, is_dir=True):
+                            stack.append(path)
+            except OSError:
+                continue
+
+    def _all_files(self, top: Path) -> Set[Path]:
+        return {path for path in discovery.iter_markdown_files(top, self.recursive, exclude=self.exclude)
+                if self._accepts(path, is_dir=False)}
+
+    def _read_events(self) -> Set[Path]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: treat every file as changed (the cache keeps this cheap)
+                    changed |= self._all_files(self.root)
+                    continue
+                if mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                    continue
+
+                directory = self.directories.get(wd)
+                if directory is None or not name:
+                    continue
+                path = directory / os.fsdecode(name)
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive and self._accepts(path, is_dir=True):
+                        try:
+                            self._watch_tree(path)
+                        except OSError:
+                            continue
+                        # Files may have landed before the watch was in place
+                        changed |= self._all_files(path)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._accepts(path, is_dir=False):
+                    changed.add(path)
+
+    def poll(self, timeout: Optional[float] = None) -> Set[Path]:
+        """
+        Wait for changes
+
+        Args:
+            timeout: Seconds to wait at most (None = until something changes)
+
+        Returns:
+            set: New or modified files (empty on timeout)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], wait)
+            if ready:
+                changed = self._read_events()
+                if changed:
+                    return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(root: Path, recursive: bool = True,
+                 include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 polling: bool = False):
+    """
+    Create the best available watcher for an input tree
+
+    Falls back to polling when inotify is unavailable (non-Linux systems,
+    watch limit reached, ...).
+
+    Returns:
+        InotifyWatcher or PollingWatcher
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root, recursive, include, exclude)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, recursive, include, exclude)
+
+
+def iter_batches(watcher, debounce: float = 0.5) -> Iterator[List[Path]]:
+    """
+    Yield batches of changed files, once changes have settled
+
+    A batch is emitted when no further change arrived for `debounce`
+    seconds, so a burst of saves (or a git checkout) triggers one run.
+
+    Yields:
+        list: Sorted paths of changed files that still exist
+    """
+    while True:
+        changed = watcher.poll()
+        while True:
+            more = watcher.poll(debounce)
+            if not more:
+                break
+            changed |= more
+
+        batch = sorted(path for path in changed if path.is_file())
+        if batch:
+            yield batch